@@ -0,0 +1,34 @@
+import { type NextRequest, NextResponse } from "next/server"
+import { queryStore } from "@/lib/analysis-store"
+
+// Return the decimation level and time range a chart viewport needs (see scripts/decimation.py query_pyramid)
+export async function GET(request: NextRequest, { params }: { params: { id: string } }) {
+  try {
+    const { id: analysisId } = await Promise.resolve(params)
+    const searchParams = request.nextUrl.searchParams
+    const startParam = searchParams.get("start")
+    const endParam = searchParams.get("end")
+
+    const window = await queryStore({
+      task: "window",
+      analysis: analysisId,
+      signal: searchParams.get("signal") || "cleaned",
+      start: startParam ? Number(startParam) : null,
+      end: endParam ? Number(endParam) : null,
+      points: Number(searchParams.get("points") || 2000),
+      channel: Number(searchParams.get("channel") || 0),
+    })
+
+    if (!window) {
+      return NextResponse.json({ error: "Analysis results not found" }, { status: 404 })
+    }
+    if (window.error) {
+      return NextResponse.json({ error: window.error }, { status: 400 })
+    }
+
+    return NextResponse.json(window)
+  } catch (error) {
+    console.error("Error querying signal:", error)
+    return NextResponse.json({ error: "Error retrieving signal data" }, { status: 500 })
+  }
+}
@@ -1,7 +1,5 @@
 import { type NextRequest, NextResponse } from "next/server"
-import { readFile } from "fs/promises"
-import { join } from "path"
-import { existsSync } from "fs"
+import { queryStore } from "@/lib/analysis-store"
 
 export async function GET(request: NextRequest, { params }: { params: { id: string } }) {
   try {
@@ -11,19 +9,15 @@ export async function GET(request: NextRequest, { params }: { params: { id: stri
       return NextResponse.json({ error: "Correlation ID is required" }, { status: 400 })
     }
 
-    const resultsPath = join(process.cwd(), "results", `correlation_${correlationId}.json`)
+    const results = await queryStore({ task: "get", analysis: `correlation_${correlationId}` })
 
-    if (!existsSync(resultsPath)) {
+    if (!results) {
       return NextResponse.json({ error: "Correlation results not found" }, { status: 404 })
     }
 
-    const resultsData = await readFile(resultsPath, "utf-8")
-    const results = JSON.parse(resultsData)
-
     return NextResponse.json(results)
   } catch (error) {
     console.error("Error retrieving correlation:", error)
     return NextResponse.json({ error: "Error retrieving correlation results" }, { status: 500 })
   }
 }
-
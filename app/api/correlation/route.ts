@@ -1,11 +1,8 @@
 import { type NextRequest, NextResponse } from "next/server"
-import { exec } from "child_process"
-import { promisify } from "util"
 import { join } from "path"
-import { writeFile, readFile } from "fs/promises"
 import { v4 as uuidv4 } from "uuid"
-
-const execPromise = promisify(exec)
+import { queryStore } from "@/lib/analysis-store"
+import { runSignalJob } from "@/lib/signal-worker"
 
 export async function POST(request: NextRequest) {
   try {
@@ -16,36 +13,31 @@ export async function POST(request: NextRequest) {
       return NextResponse.json({ error: "Both ECG and EEG analysis IDs are required" }, { status: 400 })
     }
 
-    // Check if both analysis results exist
-    const ecgPath = join(process.cwd(), "results", `${ecgAnalysisId}.json`)
-    const eegPath = join(process.cwd(), "results", `${eegAnalysisId}.json`)
-
-    try {
-      await readFile(ecgPath, "utf-8")
-      await readFile(eegPath, "utf-8")
-    } catch (error) {
-      return NextResponse.json({ error: "One or both analysis files not found" }, { status: 404 })
+    // Check if both analyses exist in the analysis store
+    const [ecgEntry, eegEntry] = await Promise.all([
+      queryStore({ task: "find", analysis: ecgAnalysisId }),
+      queryStore({ task: "find", analysis: eegAnalysisId }),
+    ])
+    if (!ecgEntry || !eegEntry) {
+      return NextResponse.json({ error: "One or both analyses not found" }, { status: 404 })
     }
 
-    // Generate correlation ID
+    // Generate correlation ID; its output path names the correlation in the store next to it
     const correlationId = uuidv4()
-    const configPath = join(process.cwd(), "uploads", `correlation_${correlationId}.json`)
     const outputPath = join(process.cwd(), "results", `correlation_${correlationId}.json`)
 
-    // Create config file for correlation script
+    // The config is passed inline, so nothing is written for it
     const config = {
       ecgAnalysisId,
       eegAnalysisId,
       outputPath,
     }
 
-    await writeFile(configPath, JSON.stringify(config))
-
-    // Run correlation script
+    // Run correlation script; the IDs were found in the store, so the config quotes safely in single quotes
     const scriptPath = join(process.cwd(), "scripts", "correlate_signals.py")
-    const command = `python ${scriptPath} --config "${configPath}"`
+    const command = `python ${scriptPath} --config '${JSON.stringify(config)}'`
 
-    const { stdout, stderr } = await execPromise(command)
+    const { stdout, stderr } = await runSignalJob({ task: "correlate", config }, command)
 
     if (stderr) {
       console.error("Python script error:", stderr)
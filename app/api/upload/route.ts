@@ -3,10 +3,7 @@ import { writeFile } from "fs/promises"
 import { join } from "path"
 import { v4 as uuidv4 } from "uuid"
 import { mkdir } from "fs/promises"
-import { exec } from "child_process"
-import { promisify } from "util"
-
-const execPromise = promisify(exec)
+import { runSignalJob } from "@/lib/signal-worker"
 
 // Ensure upload directories exist
 async function ensureDirectories() {
@@ -53,31 +50,32 @@ export async function POST(request: NextRequest) {
     const scriptPath = join(process.cwd(), "scripts", "process_signal.py")
     const outputPath = join(process.cwd(), "results", `${analysisId}.json`)
 
-    const command = `python ${scriptPath} --file "${filePath}" --type "${signalType}" --output "${outputPath}"`
-
-    // Execute Python script
-    const { stdout, stderr } = await execPromise(command)
+    // ECG is answered at the quick level (heart rate) and deepened to full HRV in the background
+    const level = signalType === "ecg" ? "quick" : "full"
+    const command = `python ${scriptPath} --file "${filePath}" --type "${signalType}" --output "${outputPath}" --level ${level}`
 
     try {
-      const { stdout } = await execPromise(command)
+      const { stdout } = await runSignalJob(
+        { task: "process", file: filePath, type: signalType, output: outputPath, level },
+        command,
+      )
+      if (level !== "full") {
+        const upgradeCommand = `python ${scriptPath} --upgrade "${outputPath}" --level full`
+        runSignalJob({ task: "upgrade", output: outputPath, level: "full" }, upgradeCommand).catch((error) =>
+          console.error("Analysis upgrade failed:", error.stderr || error.message),
+        )
+      }
       return NextResponse.json({
         success: true,
         message: "File uploaded and processed successfully",
         analysisId,
+        analysisLevel: level,
         details: stdout,
       })
     } catch (execError: any) {
       console.error("Python script failed:", execError.stderr || execError.message)
       return NextResponse.json({ error: "Signal processing failed" }, { status: 500 })
     }
-    
-
-    return NextResponse.json({
-      success: true,
-      message: "File uploaded and processed successfully",
-      analysisId,
-      details: stdout,
-    })
   } catch (error) {
     console.error("Upload error:", error)
     return NextResponse.json({ error: "Error uploading file" }, { status: 500 })
@@ -127,7 +127,7 @@ export default function ResultsPage() {
 
           <TabsContent value="ecg">
             {ecgData ? (
-              <ECGResultsView data={ecgData} />
+              <ECGResultsView data={ecgData} analysisId={ecgId!} />
             ) : (
               <Card>
                 <CardHeader>
@@ -142,7 +142,7 @@ export default function ResultsPage() {
 
           <TabsContent value="eeg">
             {eegData ? (
-              <EEGResultsView data={eegData} />
+              <EEGResultsView data={eegData} analysisId={eegId!} />
             ) : (
               <Card>
                 <CardHeader>
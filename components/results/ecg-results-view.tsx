@@ -2,21 +2,24 @@
 
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card"
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, ReferenceDot } from "recharts"
+import { useSignalWindow } from "@/hooks/use-signal-window"
 
 interface ECGResultsViewProps {
   data: any
+  analysisId: string
 }
 
-export function ECGResultsView({ data }: ECGResultsViewProps) {
-  // Prepare chart data
-  const chartData = data.signal.cleaned.map((value: number, index: number) => ({
-    index,
-    value,
-    isPeak: data.peaks.r_peaks.includes(index),
+export function ECGResultsView({ data, analysisId }: ECGResultsViewProps) {
+  // The whole recording, decimated to at most 2000 points; R-peak markers come as a separate list
+  const signalWindow = useSignalWindow(analysisId, "cleaned", 2000)
+  const displayData = (signalWindow?.time || []).map((time: number, index: number) => ({
+    time,
+    value: signalWindow!.value[index],
+  }))
+  const peakMarkers = (signalWindow?.peaks.time || []).map((time: number, index: number) => ({
+    time,
+    value: signalWindow!.peaks.value[index],
   }))
-
-  // For better visualization, limit to 2000 points
-  const displayData = chartData.slice(0, 2000)
 
   // Format features for display
   const features = data.features
@@ -40,11 +43,17 @@ export function ECGResultsView({ data }: ECGResultsViewProps) {
               }}
             >
               <CartesianGrid strokeDasharray="3 3" vertical={false} opacity={0.3} />
-              <XAxis dataKey="index" label={{ value: "Time (samples)", position: "insideBottom", offset: -10 }} />
+              <XAxis
+                dataKey="time"
+                type="number"
+                domain={["dataMin", "dataMax"]}
+                tickFormatter={(time: number) => time.toFixed(0)}
+                label={{ value: "Time (s)", position: "insideBottom", offset: -10 }}
+              />
               <YAxis domain={["auto", "auto"]} label={{ value: "Amplitude", angle: -90, position: "insideLeft" }} />
               <Tooltip
                 formatter={(value: number) => [value.toFixed(3), "Amplitude"]}
-                labelFormatter={(label) => `Sample: ${label}`}
+                labelFormatter={(label: number) => `Time: ${label.toFixed(3)} s`}
               />
               <Line
                 type="monotone"
@@ -54,18 +63,16 @@ export function ECGResultsView({ data }: ECGResultsViewProps) {
                 dot={false}
                 isAnimationActive={false}
               />
-              {displayData
-                .filter((point) => point.isPeak)
-                .map((point, index) => (
-                  <ReferenceDot
-                    key={`peak-${index}`}
-                    x={point.index}
-                    y={point.value}
-                    r={4}
-                    fill="#ef4444"
-                    stroke="none"
-                  />
-                ))}
+              {peakMarkers.map((point, index) => (
+                <ReferenceDot
+                  key={`peak-${index}`}
+                  x={point.time}
+                  y={point.value}
+                  r={4}
+                  fill="#ef4444"
+                  stroke="none"
+                />
+              ))}
             </LineChart>
           </ResponsiveContainer>
         </CardContent>
@@ -2,25 +2,30 @@
 
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card"
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, BarChart, Bar } from "recharts"
+import { useSignalWindow } from "@/hooks/use-signal-window"
 
 interface EEGResultsViewProps {
   data: any
+  analysisId: string
 }
 
-export function EEGResultsView({ data }: EEGResultsViewProps) {
-  // Prepare time domain chart data
-  const timeChartData = data.signal.cleaned.map((value: number, index: number) => ({
-    index,
-    value,
-  }))
+// Multichannel recordings store (channels x samples) arrays; show the first channel
+function firstChannel(values: any[]) {
+  return Array.isArray(values[0]) ? values[0] : values
+}
 
-  // For better visualization, limit to 2000 points
-  const displayData = timeChartData.slice(0, 2000)
+export function EEGResultsView({ data, analysisId }: EEGResultsViewProps) {
+  // First channel over the whole recording, decimated to at most 2000 points
+  const signalWindow = useSignalWindow(analysisId, "cleaned", 2000, 0)
+  const displayData = (signalWindow?.time || []).map((time: number, index: number) => ({
+    time,
+    value: signalWindow!.value[index],
+  }))
 
   // Prepare frequency domain chart data
   const freqChartData = data.frequency.freqs.map((freq: number, index: number) => ({
     freq,
-    power: data.frequency.psd[index],
+    power: firstChannel(data.frequency.psd)[index],
   }))
 
   // Prepare band power data
@@ -51,11 +56,17 @@ export function EEGResultsView({ data }: EEGResultsViewProps) {
               }}
             >
               <CartesianGrid strokeDasharray="3 3" vertical={false} opacity={0.3} />
-              <XAxis dataKey="index" label={{ value: "Time (samples)", position: "insideBottom", offset: -10 }} />
+              <XAxis
+                dataKey="time"
+                type="number"
+                domain={["dataMin", "dataMax"]}
+                tickFormatter={(time: number) => time.toFixed(0)}
+                label={{ value: "Time (s)", position: "insideBottom", offset: -10 }}
+              />
               <YAxis domain={["auto", "auto"]} label={{ value: "Amplitude", angle: -90, position: "insideLeft" }} />
               <Tooltip
                 formatter={(value: number) => [value.toFixed(3), "Amplitude"]}
-                labelFormatter={(label) => `Sample: ${label}`}
+                labelFormatter={(label: number) => `Time: ${label.toFixed(3)} s`}
               />
               <Line
                 type="monotone"
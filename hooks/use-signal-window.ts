@@ -0,0 +1,32 @@
+import * as React from "react"
+
+export interface SignalWindow {
+  level: number
+  bucket_size: number
+  time: number[]
+  value: number[]
+  // Peak markers in the window (ECG R-peaks), drawn on top of the trace
+  peaks: { time: number[]; value: number[] }
+}
+
+// Fetch a chart-sized slice of a stored signal from /api/analysis/[id]/signal (min/max decimated)
+export function useSignalWindow(analysisId: string | null | undefined, signal = "cleaned", points = 2000, channel = 0) {
+  const [signalWindow, setSignalWindow] = React.useState<SignalWindow | null>(null)
+
+  React.useEffect(() => {
+    if (!analysisId) return
+    let cancelled = false
+    const query = new URLSearchParams({ signal, points: String(points), channel: String(channel) })
+    fetch(`/api/analysis/${analysisId}/signal?${query}`)
+      .then((response) => (response.ok ? response.json() : null))
+      .then((data) => {
+        if (!cancelled) setSignalWindow(data)
+      })
+      .catch((error) => console.error("Error fetching signal:", error))
+    return () => {
+      cancelled = true
+    }
+  }, [analysisId, signal, points, channel])
+
+  return signalWindow
+}
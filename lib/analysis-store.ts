@@ -0,0 +1,42 @@
+import { execFile } from "child_process"
+import { join } from "path"
+import { promisify } from "util"
+import { requestWorker, type StoreQuery } from "@/lib/signal-worker"
+
+const execFilePromise = promisify(execFile)
+
+export const STORE_PATH = join(process.cwd(), "results", "analyses.sqlite")
+
+type QueryOptions =
+  | { task: "find" | "get"; analysis: string }
+  | {
+      task: "window"
+      analysis: string
+      signal: string
+      start: number | null
+      end: number | null
+      points: number
+      channel: number
+    }
+
+// Read from the analysis store (scripts/analysis_store.py), which holds every analysis and correlation.
+// Uses the warm worker pool when SIGNAL_WORKER_SOCKET is set, otherwise the store's command line.
+// Resolves to null when the ID is not stored.
+export async function queryStore(options: QueryOptions): Promise<any> {
+  const query: StoreQuery = { ...options, store: STORE_PATH }
+  const socketPath = process.env.SIGNAL_WORKER_SOCKET
+  if (socketPath) {
+    const reply = await requestWorker(socketPath, query)
+    return reply.result
+  }
+
+  const scriptPath = join(process.cwd(), "scripts", "analysis_store.py")
+  const args = [scriptPath, options.task, "--store", STORE_PATH, "--id", options.analysis]
+  if (options.task === "window") {
+    args.push("--signal", options.signal, "--points", String(options.points), "--channel", String(options.channel))
+    if (options.start !== null) args.push("--start", String(options.start))
+    if (options.end !== null) args.push("--end", String(options.end))
+  }
+  const { stdout } = await execFilePromise("python", args, { maxBuffer: 256 * 1024 * 1024 })
+  return JSON.parse(stdout)
+}
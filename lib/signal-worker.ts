@@ -0,0 +1,54 @@
+import { createConnection } from "net"
+import { exec } from "child_process"
+import { promisify } from "util"
+
+const execPromise = promisify(exec)
+
+export type SignalJob =
+  | { task: "process"; file: string; type: string; output: string; sampling_rate?: number; level?: string }
+  | { task: "upgrade"; output: string; level: string }
+  | { task: "correlate"; config: string | Record<string, unknown> }
+
+// Reads of the analysis store, answered by run_query in scripts/analysis_store.py
+export type StoreQuery = { task: "find" | "get" | "window"; store: string; analysis: string; [option: string]: unknown }
+
+export interface SignalJobResult {
+  stdout: string
+  stderr: string
+}
+
+// Send one job to the persistent worker (scripts/signal_worker.py --socket) and wait for its reply
+export function requestWorker(socketPath: string, job: SignalJob | StoreQuery): Promise<any> {
+  return new Promise((resolve, reject) => {
+    const socket = createConnection(socketPath)
+    let buffer = ""
+
+    socket.on("connect", () => {
+      socket.write(JSON.stringify({ id: Date.now(), ...job }) + "\n")
+    })
+    socket.on("data", (chunk) => {
+      buffer += chunk.toString()
+      const newline = buffer.indexOf("\n")
+      if (newline === -1) return
+
+      socket.end()
+      const reply = JSON.parse(buffer.slice(0, newline))
+      if (reply.status === "ok") {
+        resolve(reply)
+      } else {
+        reject(new Error(reply.error || "Signal worker job failed"))
+      }
+    })
+    socket.on("error", reject)
+  })
+}
+
+// Run a job on the warm worker pool when SIGNAL_WORKER_SOCKET is set, otherwise spawn the script
+export async function runSignalJob(job: SignalJob, command: string): Promise<SignalJobResult> {
+  const socketPath = process.env.SIGNAL_WORKER_SOCKET
+  if (socketPath) {
+    const reply = await requestWorker(socketPath, job)
+    return { stdout: JSON.stringify(reply), stderr: "" }
+  }
+  return execPromise(command)
+}
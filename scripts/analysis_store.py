@@ -0,0 +1,700 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Indexed Analysis Store for ECG, EEG and correlation results
+A single SQLite database holding every analysis; result files are only exported
+on request. Each analysis is one row of queryable metadata columns (kind,
+subject, source file, sampling rate, duration, summary features, ...), so
+listing and filtering never opens a result. The rest of the result is kept as a
+JSON header and its arrays as chunked .npy blobs, which the API reads through
+this module, down to the slice of a signal a chart viewport needs. A retention
+policy removes old and least-recently-used analyses together with any exported
+result files.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import time
+
+import numpy as np
+
+from decimation import query_pyramid
+from result_io import _drop_complex_arrays, _to_json_compatible, array_dir_for, load_results
+
+STORE_FILE_NAME = "analyses.sqlite"
+# Key used in the stored header to mark an array kept as a blob
+BLOB_REF_KEY = "$blob"
+# Arrays are split into blobs of at most this size (SQLite caps a blob at 1 GB)
+BLOB_CHUNK_BYTES = 64 * 1024 * 1024
+# Numeric lists (from JSON results) at least this long are stored as blobs
+MIN_BLOB_ELEMENTS = 64
+DEFAULT_RETENTION_DAYS = 90
+DEFAULT_MAX_STORE_MB = 8192
+# Reads record the access time at this resolution, so chart viewports do not write on every request
+ACCESS_RESOLUTION_SECONDS = 60
+# Minimum time between the retention passes done by store_analysis(); the prune CLI always runs one
+RETENTION_INTERVAL_SECONDS = 3600
+# Suffix of the file next to the store whose mtime records the last automatic retention pass
+RETENTION_MARKER_SUFFIX = ".last_prune"
+# Metadata columns of the analyses table, besides id and the JSON documents
+ANALYSIS_COLUMNS = ("kind", "subject", "source_file", "created", "accessed", "sampling_rate", "duration_seconds",
+                    "n_channels", "cache_key", "result_path", "ecg_id", "eeg_id", "size_bytes")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    subject TEXT,
+    source_file TEXT,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    sampling_rate REAL,
+    duration_seconds REAL,
+    n_channels INTEGER,
+    cache_key TEXT,
+    result_path TEXT,
+    ecg_id TEXT,
+    eeg_id TEXT,
+    size_bytes INTEGER NOT NULL DEFAULT 0,
+    features TEXT,
+    header TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS analyses_kind_subject ON analyses (kind, subject);
+CREATE INDEX IF NOT EXISTS analyses_accessed ON analyses (accessed);
+CREATE TABLE IF NOT EXISTS arrays (
+    analysis_id TEXT NOT NULL REFERENCES analyses (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    chunk INTEGER NOT NULL,
+    dtype TEXT NOT NULL,
+    shape TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (analysis_id, name, chunk)
+);
+"""
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Query, import into and prune the indexed analysis store')
+    parser.add_argument('command', choices=['list', 'find', 'get', 'window', 'import', 'prune'],
+                        help='list analyses, print one as JSON (find: metadata, get: without signal arrays, '
+                             'window: a chart viewport of a signal), import loose result files, or apply the '
+                             'retention policy')
+    parser.add_argument('--store', type=str, default=None,
+                        help=f'Store database (default: {STORE_FILE_NAME} in --results_dir)')
+    parser.add_argument('--results_dir', type=str, default='results', help='Directory of the result files')
+    parser.add_argument('--kind', type=str, default=None, choices=['ecg', 'eeg', 'correlation'],
+                        help='Only list analyses of this kind')
+    parser.add_argument('--subject', type=str, default=None, help='Only list analyses of this subject')
+    parser.add_argument('--id', type=str, default=None, help='Analysis ID for find, get and window')
+    parser.add_argument('--signal', type=str, default='cleaned', help='Signal name for window')
+    parser.add_argument('--start', type=float, default=None, help='Viewport start in seconds for window')
+    parser.add_argument('--end', type=float, default=None, help='Viewport end in seconds for window')
+    parser.add_argument('--points', type=int, default=2000, help='Maximum number of points for window')
+    parser.add_argument('--channel', type=int, default=0, help='Channel index for window')
+    parser.add_argument('--retention_days', type=float, default=DEFAULT_RETENTION_DAYS,
+                        help='Remove analyses not accessed for this many days')
+    parser.add_argument('--max_mb', type=float, default=DEFAULT_MAX_STORE_MB,
+                        help='Remove least-recently-used analyses beyond this total size')
+    args = parser.parse_args()
+    if args.command in ('find', 'get', 'window') and not args.id:
+        parser.error(f"{args.command} requires --id")
+    return args
+
+def default_store_path(output_path):
+    """Store database next to a result file."""
+    return os.path.join(os.path.dirname(os.path.abspath(output_path)), STORE_FILE_NAME)
+
+def open_store(store_path):
+    """
+    Open (and create if needed) the store database.
+
+    Write-ahead logging lets the worker processes read while one of them
+    writes; concurrent writers wait for each other. New stores use
+    incremental auto-vacuum, so retention can return freed pages to the file
+    system without rewriting the database.
+    """
+    directory = os.path.dirname(os.path.abspath(store_path))
+    os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(store_path, timeout=60)
+    # Only takes effect before the first table is created
+    connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA foreign_keys=ON")
+    connection.executescript(SCHEMA)
+    return connection
+
+def _as_blob_array(value):
+    """The value as an array to store as a blob, or None to keep it in the header."""
+    if isinstance(value, np.ndarray):
+        return value if value.ndim > 0 else None
+    if isinstance(value, list) and len(value) >= MIN_BLOB_ELEMENTS:
+        try:
+            array = np.asarray(value)
+        except ValueError:
+            return None
+        return array if array.dtype.kind in 'biuf' else None
+    return None
+
+def _split_arrays(node, arrays, prefix):
+    """Replace every array in nested dicts/lists with a blob reference, collecting the arrays by name."""
+    if isinstance(node, dict):
+        return {key: _split_arrays(value, arrays, f"{prefix}.{key}" if prefix else key) for key, value in node.items()}
+    array = _as_blob_array(node)
+    if array is not None:
+        arrays[prefix] = array
+        reference = {BLOB_REF_KEY: prefix, "dtype": str(array.dtype), "shape": list(array.shape)}
+        # Lists come back as lists, so results round-trip with their types
+        if isinstance(node, list):
+            reference["list"] = True
+        return reference
+    if isinstance(node, list):
+        return [_split_arrays(value, arrays, f"{prefix}.{i}") for i, value in enumerate(node)]
+    return node
+
+def _array_chunks(array):
+    """Raw bytes of an array in blobs of about BLOB_CHUNK_BYTES; memory-mapped arrays are read block by block."""
+    flat = np.ascontiguousarray(array).reshape(-1)
+    step = max(1, BLOB_CHUNK_BYTES // max(flat.itemsize, 1))
+    for start in range(0, max(len(flat), 1), step):
+        yield np.ascontiguousarray(flat[start:start + step]).tobytes()
+
+def _join_arrays(node, arrays):
+    """Replace every blob reference in nested dicts/lists with its array."""
+    if isinstance(node, dict):
+        if BLOB_REF_KEY in node:
+            array = arrays[node[BLOB_REF_KEY]]
+            return array.tolist() if node.get("list") else array
+        return {key: _join_arrays(value, arrays) for key, value in node.items()}
+    if isinstance(node, list):
+        return [_join_arrays(value, arrays) for value in node]
+    return node
+
+def _summary(kind, results):
+    """
+    Scalar summary indexed with an analysis: ECG/EEG features, or the headline
+    correlation values. Non-finite values become null, so the column stays
+    valid JSON for SQLite's json_extract.
+    """
+    if kind == 'correlation':
+        values = {
+            "pearson_r": results.get("time_domain", {}).get("pearson", {}).get("correlation"),
+            "phase_locking_value": results.get("frequency_domain", {}).get("phase_locking_value")
+        }
+    else:
+        values = results.get("features", {})
+    return {key: float(value) if np.isfinite(value) else None for key, value in values.items()
+            if isinstance(value, (int, float, np.number)) and not isinstance(value, bool)}
+
+def put_analysis(connection, analysis_id, results, kind=None, subject=None, source_file=None, result_path=None,
+                 ecg_id=None, eeg_id=None):
+    """
+    Write an analysis to the store, replacing any earlier version with the same ID.
+
+    Parameters:
+    -----------
+    connection : sqlite3.Connection
+        From open_store
+    analysis_id : str
+        Analysis ID (the result file name without extension)
+    results : dict
+        Results dictionary; arrays may be NumPy arrays (memory-mapped ones
+        are copied in blocks) or, for JSON results, lists
+    kind : str, optional
+        'ecg', 'eeg' or 'correlation' (default: ``metadata.signal_type``)
+    subject : str, optional
+        Subject identifier to index the analysis under
+    source_file : str, optional
+        Uploaded recording the analysis came from
+    result_path : str, optional
+        Exported result file, removed along with the analysis
+    ecg_id, eeg_id : str, optional
+        Input analyses of a correlation
+
+    Returns:
+    --------
+    int
+        Stored size in bytes
+    """
+    metadata = results.get("metadata", {})
+    kind = kind or metadata.get("signal_type")
+    arrays = {}
+    header = _split_arrays(results, arrays, "")
+    # Describes the layout of the exported file, not of the stored copy
+    header.get("metadata", {}).pop("array_format", None)
+    now = time.time()
+    row = {
+        "kind": kind,
+        "subject": subject,
+        "source_file": source_file,
+        "created": now,
+        "accessed": now,
+        "sampling_rate": metadata.get("sampling_rate"),
+        "duration_seconds": metadata.get("duration_seconds"),
+        "n_channels": metadata.get("n_channels", 1 if kind in ('ecg', 'eeg') else None),
+        "cache_key": metadata.get("cache_key"),
+        "result_path": os.path.abspath(result_path) if result_path else None,
+        "ecg_id": ecg_id,
+        "eeg_id": eeg_id
+    }
+    header_text = json.dumps(header, default=_to_json_compatible)
+    size = len(header_text) + sum(int(array.nbytes) for array in arrays.values())
+
+    with connection:
+        connection.execute("DELETE FROM analyses WHERE id = ?", (analysis_id,))
+        connection.execute(
+            f"INSERT INTO analyses (id, {', '.join(ANALYSIS_COLUMNS)}, features, header) "
+            f"VALUES ({', '.join('?' * (len(ANALYSIS_COLUMNS) + 3))})",
+            (analysis_id, *[row.get(column) for column in ANALYSIS_COLUMNS[:-1]], size,
+             json.dumps(_summary(kind, results), default=_to_json_compatible), header_text)
+        )
+        for name, array in arrays.items():
+            dtype = array.dtype.str
+            shape = json.dumps(list(array.shape))
+            connection.executemany(
+                "INSERT INTO arrays (analysis_id, name, chunk, dtype, shape, data) VALUES (?, ?, ?, ?, ?, ?)",
+                ((analysis_id, name, chunk, dtype, shape, data) for chunk, data in enumerate(_array_chunks(array)))
+            )
+    return size
+
+def find_analysis(connection, analysis_id):
+    """Metadata columns of one analysis as a dict, or None if it is not stored."""
+    row = connection.execute(f"SELECT id, {', '.join(ANALYSIS_COLUMNS)}, features FROM analyses WHERE id = ?",
+                             (analysis_id,)).fetchone()
+    return _row_dict(row) if row else None
+
+def _row_dict(row):
+    """Row of (id, metadata columns, features) as a dict."""
+    entry = dict(zip(("id",) + ANALYSIS_COLUMNS, row[:-1]))
+    entry["features"] = json.loads(row[-1]) if row[-1] else {}
+    return entry
+
+def _exported_sidecars_current(entry):
+    """Whether a stored analysis was exported with .npy sidecars that are unchanged since it was stored."""
+    path = entry.get("result_path")
+    if not path or not os.path.exists(path) or not os.path.isdir(array_dir_for(path)):
+        return False
+    return os.path.getmtime(path) <= entry["created"] + 1.0
+
+def _record_access(connection, entry):
+    """Move an analysis to the front of the retention order."""
+    now = time.time()
+    if entry["accessed"] < now - ACCESS_RESOLUTION_SECONDS:
+        with connection:
+            connection.execute("UPDATE analyses SET accessed = ? WHERE id = ?", (now, entry["id"]))
+
+def _load_header(connection, analysis_id):
+    """Stored JSON header of an analysis, with blob references in place of its arrays."""
+    return json.loads(connection.execute("SELECT header FROM analyses WHERE id = ?", (analysis_id,)).fetchone()[0])
+
+def get_analysis(connection, analysis_id, prefer_exported=True, exclude=()):
+    """
+    Load a stored analysis.
+
+    Parameters:
+    -----------
+    connection : sqlite3.Connection
+        From open_store
+    analysis_id : str
+        Analysis ID
+    prefer_exported : bool
+        Memory-map the .npy sidecars of the exported result file instead of
+        reading the blobs, while it is unchanged since the analysis was stored.
+        JSON exports are never preferred: parsing them is slower than the blobs,
+        and they lack the complex segment spectra.
+    exclude : tuple of str
+        Top-level keys (e.g. 'signal') left out, without reading their blobs
+
+    Returns:
+    --------
+    dict or None
+        Results dictionary with NumPy arrays, or None if the ID is not stored
+    """
+    entry = find_analysis(connection, analysis_id)
+    if entry is None:
+        return None
+    _record_access(connection, entry)
+    if prefer_exported and not exclude and _exported_sidecars_current(entry):
+        return load_results(entry["result_path"])
+
+    header = {key: value for key, value in _load_header(connection, analysis_id).items() if key not in exclude}
+    arrays = {}
+    query = "SELECT name, dtype, shape, data FROM arrays WHERE analysis_id = ?"
+    values = [analysis_id]
+    for key in exclude:
+        query += " AND name != ? AND substr(name, 1, ?) != ?"
+        values += [key, len(key) + 1, key + "."]
+    rows = connection.execute(query + " ORDER BY name, chunk", values)
+    offsets = {}
+    for name, dtype, shape, data in rows:
+        if name not in arrays:
+            arrays[name] = np.empty(json.loads(shape), dtype=np.dtype(dtype))
+            offsets[name] = 0
+        flat = arrays[name].reshape(-1)
+        chunk = np.frombuffer(data, dtype=flat.dtype)
+        flat[offsets[name]:offsets[name] + len(chunk)] = chunk
+        offsets[name] += len(chunk)
+    return _join_arrays(header, arrays)
+
+def _read_elements(connection, analysis_id, name, dtype, start, stop):
+    """Elements ``start:stop`` of a stored array (flattened), reading only the blob bytes they occupy."""
+    dtype = np.dtype(dtype)
+    # Same chunking as _array_chunks
+    per_chunk = max(1, BLOB_CHUNK_BYTES // max(dtype.itemsize, 1))
+    values = np.empty(max(stop - start, 0), dtype=dtype)
+    position = start
+    while position < stop:
+        chunk, offset = divmod(position, per_chunk)
+        count = min(stop - position, per_chunk - offset)
+        data = connection.execute(
+            "SELECT substr(data, ?, ?) FROM arrays WHERE analysis_id = ? AND name = ? AND chunk = ?",
+            (offset * dtype.itemsize + 1, count * dtype.itemsize, analysis_id, name, chunk)
+        ).fetchone()[0]
+        values[position - start:position - start + count] = np.frombuffer(data, dtype=dtype)
+        position += count
+    return values
+
+class StoredArray:
+    """
+    A stored array read on demand.
+
+    Indexing a row of a 2-D array gives another StoredArray, and a contiguous
+    slice of a 1-D one reads only those elements; anything else (including
+    np.asarray) reads the whole array.
+    """
+
+    def __init__(self, connection, analysis_id, name, dtype, shape, offset=0):
+        self.connection = connection
+        self.analysis_id = analysis_id
+        self.name = name
+        self.dtype = np.dtype(dtype)
+        self.shape = tuple(shape)
+        self.ndim = len(self.shape)
+        self.offset = offset
+
+    def __len__(self):
+        return self.shape[0]
+
+    def _read(self, start, stop):
+        return _read_elements(self.connection, self.analysis_id, self.name, self.dtype,
+                              self.offset + start, self.offset + stop)
+
+    def __getitem__(self, key):
+        if self.ndim == 2 and isinstance(key, (int, np.integer)):
+            row_length = self.shape[1]
+            return StoredArray(self.connection, self.analysis_id, self.name, self.dtype, self.shape[1:],
+                               self.offset + int(key) * row_length)
+        if self.ndim == 1 and isinstance(key, slice) and key.step in (None, 1):
+            start, stop, _ = key.indices(self.shape[0])
+            return self._read(start, max(start, stop))
+        return np.asarray(self)[key]
+
+    def __array__(self, dtype=None, copy=None):
+        array = self._read(0, int(np.prod(self.shape))).reshape(self.shape)
+        return array if dtype is None else array.astype(dtype)
+
+def _lazy_arrays(node, connection, analysis_id):
+    """Replace every blob reference in nested dicts/lists with a StoredArray."""
+    if isinstance(node, dict):
+        if BLOB_REF_KEY in node:
+            return StoredArray(connection, analysis_id, node[BLOB_REF_KEY], node["dtype"], node["shape"])
+        return {key: _lazy_arrays(value, connection, analysis_id) for key, value in node.items()}
+    if isinstance(node, list):
+        return [_lazy_arrays(value, connection, analysis_id) for value in node]
+    return node
+
+def analysis_summary(connection, analysis_id):
+    """
+    A stored analysis without its signal arrays and pyramids, which charts
+    fetch per viewport (see signal_window); ``signals`` lists their names.
+
+    Returns:
+    --------
+    dict or None
+        Results dictionary, or None if the ID is not stored
+    """
+    results = get_analysis(connection, analysis_id, prefer_exported=False, exclude=("signal", "pyramid"))
+    if results is None:
+        return None
+    results["signals"] = list(_load_header(connection, analysis_id).get("signal", {}))
+    return results
+
+def signal_window(connection, analysis_id, signal_name, start_time=None, end_time=None, max_points=2000,
+                  channel=0):
+    """
+    The points of a stored signal a chart viewport needs (see decimation.query_pyramid).
+
+    Only the pyramid levels considered and the returned range of samples are
+    read from the store.
+
+    Returns:
+    --------
+    dict or None
+        ``level``, ``bucket_size``, ``index``, ``time`` and ``value``, or None
+        if the ID is not stored
+    """
+    entry = find_analysis(connection, analysis_id)
+    if entry is None:
+        return None
+    _record_access(connection, entry)
+    header = _load_header(connection, analysis_id)
+    if signal_name not in header.get("signal", {}):
+        raise ValueError(f"Unknown signal: {signal_name}")
+    results = {key: _lazy_arrays(header[key], connection, analysis_id)
+               for key in ("metadata", "signal", "pyramid") if key in header}
+    return query_pyramid(results, signal_name, start_time, end_time, max_points, channel)
+
+def to_json_safe(node):
+    """Nested results as plain JSON values: arrays as lists, non-finite floats as null, complex arrays dropped."""
+    if isinstance(node, dict):
+        return {key: to_json_safe(value) for key, value in _drop_complex_arrays(node).items()}
+    if isinstance(node, (list, tuple)):
+        return [to_json_safe(value) for value in node]
+    if isinstance(node, np.ndarray):
+        if node.dtype.kind == 'f':
+            return np.where(np.isfinite(node), node, None).tolist()
+        return node.tolist()
+    if isinstance(node, np.generic):
+        node = node.item()
+    if isinstance(node, float) and not np.isfinite(node):
+        return None
+    return node
+
+def list_analyses(connection, kind=None, subject=None, since=None, limit=None):
+    """
+    Metadata of stored analyses, newest first, without loading any result.
+
+    Parameters:
+    -----------
+    kind : str, optional
+        'ecg', 'eeg' or 'correlation'
+    subject : str, optional
+        Subject identifier
+    since : float, optional
+        Only analyses created after this Unix time
+    limit : int, optional
+        Maximum number of analyses
+
+    Returns:
+    --------
+    list
+        One dict of metadata columns and summary ``features`` per analysis
+    """
+    conditions = []
+    values = []
+    for column, value in (("kind", kind), ("subject", subject)):
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            values.append(value)
+    if since is not None:
+        conditions.append("created > ?")
+        values.append(since)
+    query = f"SELECT id, {', '.join(ANALYSIS_COLUMNS)}, features FROM analyses"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY created DESC"
+    if limit is not None:
+        query += f" LIMIT {int(limit)}"
+    return [_row_dict(row) for row in connection.execute(query, values)]
+
+def _remove_exported(result_path):
+    """Delete an exported result file and its .npy sidecar directory."""
+    if not result_path:
+        return
+    try:
+        os.remove(result_path)
+    except FileNotFoundError:
+        pass
+    shutil.rmtree(array_dir_for(result_path), ignore_errors=True)
+
+def delete_analysis(connection, analysis_id, remove_files=True):
+    """Remove an analysis and its arrays from the store and, optionally, its exported result file."""
+    entry = find_analysis(connection, analysis_id)
+    if entry is None:
+        return False
+    with connection:
+        connection.execute("DELETE FROM analyses WHERE id = ?", (analysis_id,))
+    if remove_files:
+        _remove_exported(entry["result_path"])
+    return True
+
+def apply_retention(connection, retention_days=DEFAULT_RETENTION_DAYS, max_mb=DEFAULT_MAX_STORE_MB,
+                    remove_files=True):
+    """
+    Remove analyses not accessed for ``retention_days``, then least-recently-used
+    analyses until the store holds at most ``max_mb``.
+
+    Reads through get_analysis, analysis_summary and signal_window (the API
+    routes) count as accesses. Freed pages are returned with an incremental
+    vacuum.
+
+    Returns:
+    --------
+    dict
+        Number of analyses removed and the remaining size in MB
+    """
+    rows = connection.execute("SELECT id, accessed, size_bytes FROM analyses ORDER BY accessed").fetchall()
+    total = sum(size for _, _, size in rows)
+    cutoff = time.time() - retention_days * 86400
+    max_bytes = max_mb * 1024 * 1024
+
+    removed = 0
+    # Oldest access first: expired analyses, then LRU until under the size limit
+    for analysis_id, accessed, size in rows:
+        if accessed < cutoff or total > max_bytes:
+            delete_analysis(connection, analysis_id, remove_files)
+            total -= size
+            removed += 1
+    if removed:
+        # executescript steps the pragma to completion; execute() frees a single page
+        connection.executescript("PRAGMA incremental_vacuum;")
+    return {"removed": removed, "remaining_mb": total / (1024 * 1024)}
+
+def run_query(connection, query):
+    """
+    Answer a read of the API routes.
+
+    Parameters:
+    -----------
+    connection : sqlite3.Connection
+        From open_store
+    query : dict
+        ``task`` ('find', 'get' or 'window') and the ``analysis`` ID; windows also take
+        ``signal``, ``start``, ``end``, ``points`` and ``channel``
+
+    Returns:
+    --------
+    dict or None
+        JSON-ready metadata (find), analysis_summary (get) or signal_window
+        (window, as ``{"error": ...}`` for an unknown signal); None if the
+        analysis is not stored
+    """
+    task = query.get("task")
+    if task == 'find':
+        result = find_analysis(connection, query["analysis"])
+    elif task == 'get':
+        result = analysis_summary(connection, query["analysis"])
+    elif task == 'window':
+        try:
+            result = signal_window(connection, query["analysis"], query.get("signal", "cleaned"), query.get("start"),
+                                   query.get("end"), query.get("points", 2000), query.get("channel", 0))
+        except ValueError as e:
+            return {"error": str(e)}
+        if result is not None:
+            # Charts plot against time; the sample index stays server-side
+            result.pop("index")
+    else:
+        raise ValueError(f"Unknown query: {task}")
+    return to_json_safe(result)
+
+def _claim_retention(store_path):
+    """Return True, and restart the interval, if an automatic retention pass of the store is due."""
+    marker = store_path + RETENTION_MARKER_SUFFIX
+    now = time.time()
+    try:
+        if now - os.path.getmtime(marker) < RETENTION_INTERVAL_SECONDS:
+            return False
+    except FileNotFoundError:
+        pass
+    with open(marker, 'a'):
+        pass
+    os.utime(marker, (now, now))
+    return True
+
+def store_analysis(store_path, analysis_id, results, retention_days=DEFAULT_RETENTION_DAYS,
+                   max_mb=DEFAULT_MAX_STORE_MB, **columns):
+    """
+    Open the store, write one analysis (see put_analysis) and apply the retention
+    policy if it has not run in the last RETENTION_INTERVAL_SECONDS.
+    """
+    connection = open_store(store_path)
+    try:
+        put_analysis(connection, analysis_id, results, **columns)
+        if _claim_retention(store_path):
+            apply_retention(connection, retention_days, max_mb)
+    finally:
+        connection.close()
+
+def load_stored_analysis(store_path, analysis_id):
+    """Load an analysis from the store at ``store_path``, or None if the store or the ID does not exist."""
+    if not store_path or not os.path.exists(store_path):
+        return None
+    connection = open_store(store_path)
+    try:
+        return get_analysis(connection, analysis_id)
+    finally:
+        connection.close()
+
+def import_results(connection, results_dir):
+    """
+    Index the loose result files of a results directory.
+
+    ``<id>.json`` files become ECG or EEG analyses and ``correlation_<id>.json``
+    files correlations; files already in the store are skipped.
+
+    Returns:
+    --------
+    int
+        Number of analyses imported
+    """
+    imported = 0
+    for name in sorted(os.listdir(results_dir)):
+        if not name.endswith(".json"):
+            continue
+        analysis_id = os.path.splitext(name)[0]
+        if find_analysis(connection, analysis_id) is not None:
+            continue
+        path = os.path.join(results_dir, name)
+        try:
+            results = load_results(path)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read {path}: {str(e)}")
+            continue
+        metadata = results.get("metadata", {})
+        if "ecg_analysis_id" in metadata or metadata.get("mode") == "matrix":
+            put_analysis(connection, analysis_id, results, kind='correlation', result_path=path,
+                         ecg_id=metadata.get("ecg_analysis_id"), eeg_id=metadata.get("eeg_analysis_id"))
+        elif metadata.get("signal_type") in ('ecg', 'eeg'):
+            put_analysis(connection, analysis_id, results, result_path=path)
+        else:
+            continue
+        imported += 1
+    return imported
+
+def main():
+    """Query or maintain the store from the command line."""
+    args = parse_arguments()
+    store_path = args.store or os.path.join(args.results_dir, STORE_FILE_NAME)
+    connection = open_store(store_path)
+    try:
+        if args.command in ('find', 'get', 'window'):
+            # JSON on stdout for the API routes
+            query = {"task": args.command, "analysis": args.id, "signal": args.signal, "start": args.start,
+                     "end": args.end, "points": args.points, "channel": args.channel}
+            print(json.dumps(run_query(connection, query)))
+        elif args.command == 'import':
+            count = import_results(connection, args.results_dir)
+            print(f"Imported {count} analyses from {args.results_dir} into {store_path}")
+        elif args.command == 'prune':
+            # Stores created before incremental auto-vacuum need one full VACUUM to switch
+            if connection.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                print(f"Converting {store_path} to incremental auto-vacuum...")
+                connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                connection.execute("VACUUM")
+            summary = apply_retention(connection, args.retention_days, args.max_mb)
+            print(f"Removed {summary['removed']} analyses; {summary['remaining_mb']:.1f} MB remaining")
+        else:
+            for entry in list_analyses(connection, args.kind, args.subject):
+                created = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["created"]))
+                duration = entry["duration_seconds"]
+                duration = f"{duration:.1f} s" if duration is not None else "-"
+                print(f"{entry['id']}  {entry['kind']:<11} {entry['subject'] or '-':<12} {created}  "
+                      f"{duration:>10}  {entry['size_bytes'] / 1e6:.1f} MB")
+    finally:
+        connection.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Batch Processing of ECG and EEG recordings
+Runs process_signal.process_file over a directory or manifest of recordings on
+a pool of worker processes and writes a summary of throughput, failures and
+per-file timing
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+# Extensions load_signal_data can read
+SIGNAL_EXTENSIONS = ('.csv', '.txt', '.edf')
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Process a directory or manifest of ECG/EEG recordings in parallel')
+    parser.add_argument('--input', type=str, required=True,
+                        help='Directory of recordings, a JSON manifest, or a text file with one path per line')
+    parser.add_argument('--output_dir', type=str, default='results',
+                        help='Directory of the analysis store, and of the result files with --export')
+    parser.add_argument('--type', type=str, default=None, choices=['ecg', 'eeg'],
+                        help='Signal type of every file (default: inferred from an ecg_/eeg_ file name prefix)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Number of worker processes')
+    parser.add_argument('--format', type=str, default='json', choices=['json', 'npy'],
+                        help='Layout of exported and cached results')
+    parser.add_argument('--summary', type=str, default=None,
+                        help='Path of the summary JSON (default: batch_summary.json in the output directory)')
+    parser.add_argument('--no_cache', action='store_true', help='Always reprocess, bypassing the result cache')
+    parser.add_argument('--no_store', action='store_true',
+                        help='Write the result files only, not the analysis store of the output directory')
+    parser.add_argument('--export', action='store_true',
+                        help='Also write a result file per recording next to the analysis store')
+    return parser.parse_args()
+
+def infer_signal_type(file_path):
+    """Infer 'ecg' or 'eeg' from an upload name such as ecg_<id>.csv, or None."""
+    prefix = os.path.basename(file_path).split('_', 1)[0].lower()
+    return prefix if prefix in ('ecg', 'eeg') else None
+
+def output_path_for(file_path, output_dir):
+    """Result path for a recording; uploads named <type>_<id>.<ext> map to <id>.json like the upload route."""
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    if infer_signal_type(file_path):
+        stem = stem.split('_', 1)[1]
+    return os.path.join(output_dir, f"{stem}.json")
+
+def collect_jobs(input_path, output_dir, signal_type=None):
+    """
+    Build the list of processing jobs for a directory or manifest.
+
+    Parameters:
+    -----------
+    input_path : str
+        A directory (every recording in it is processed), a JSON manifest holding
+        a list of {"file", "type", "output", "sampling_rate"} objects (only
+        ``file`` is required), or a text file listing one recording per line
+    output_dir : str
+        Directory for results without an explicit ``output``
+    signal_type : str, optional
+        Signal type for entries without one; otherwise inferred from the file name
+
+    Returns:
+    --------
+    tuple
+        List of job dictionaries and list of skipped entries with the reason
+    """
+    if os.path.isdir(input_path):
+        entries = [
+            {"file": os.path.join(input_path, name)}
+            for name in sorted(os.listdir(input_path))
+            if name.lower().endswith(SIGNAL_EXTENSIONS)
+        ]
+    elif input_path.endswith('.json'):
+        with open(input_path, 'r') as f:
+            entries = [entry if isinstance(entry, dict) else {"file": entry} for entry in json.load(f)]
+    else:
+        with open(input_path, 'r') as f:
+            entries = [{"file": line.strip()} for line in f if line.strip()]
+
+    jobs, skipped = [], []
+    for entry in entries:
+        file_type = entry.get("type") or signal_type or infer_signal_type(entry["file"])
+        if file_type not in ('ecg', 'eeg'):
+            skipped.append({"file": entry["file"], "error": "Unknown signal type"})
+            continue
+        jobs.append({
+            "file": entry["file"],
+            "type": file_type,
+            "output": entry.get("output") or output_path_for(entry["file"], output_dir),
+            "sampling_rate": entry.get("sampling_rate")
+        })
+
+    return jobs, skipped
+
+def init_worker():
+    """Send worker progress output to stderr and import the processing stack once."""
+    sys.stdout = sys.stderr
+
+    global process_signal
+    import process_signal
+
+def run_job(job):
+    """
+    Process one recording, capturing any failure instead of raising.
+
+    Returns:
+    --------
+    dict
+        The job with its ``status`` ('ok' or 'error'), ``error`` message,
+        input size and elapsed time
+    """
+    start_time = time.perf_counter()
+    record = dict(job)
+    try:
+        record["size_mb"] = os.path.getsize(job["file"]) / (1024 * 1024)
+        process_signal.process_file(job["file"], job["type"], job["output"], job["sampling_rate"],
+                                    job["array_format"], job["cache_dir"], store_path=job["store_path"],
+                                    export=job["export"])
+        record["status"] = "ok"
+    except Exception as e:
+        traceback.print_exc(file=sys.stderr)
+        record["status"] = "error"
+        record["error"] = str(e)
+
+    record["elapsed_seconds"] = time.perf_counter() - start_time
+    return record
+
+def run_isolated(job):
+    """
+    Process one recording in its own single-worker pool.
+
+    A worker that dies outright (killed for memory, a crash in native code)
+    is recorded as this job's failure instead of breaking other jobs.
+    """
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=1, initializer=init_worker) as executor:
+        try:
+            return executor.submit(run_job, job).result()
+        except BrokenProcessPool:
+            return dict(job, status="error", error="Worker process died",
+                        elapsed_seconds=time.perf_counter() - start_time)
+
+def run_batch(jobs, workers, array_format='json', cache_dir=None, store_path=None, export=False):
+    """
+    Process jobs on a pool of worker processes.
+
+    Largest files are dispatched first so a long recording does not start last
+    and leave the other workers idle. If a worker dies, every job it took down
+    with the pool is rerun in a pool of its own, so only the job that kills its
+    worker is recorded as failed.
+
+    Parameters:
+    -----------
+    jobs : list
+        Jobs from collect_jobs
+    workers : int
+        Number of worker processes
+    array_format : str
+        Layout of exported and cached results ('json' or 'npy')
+    cache_dir : str, optional
+        Result cache directory, or None to disable the cache
+    store_path : str, optional
+        Analysis store every result is written to, or None to export result files only
+    export : bool
+        Also write each result file at its job's ``output``
+
+    Returns:
+    --------
+    dict
+        Summary with throughput, failures and per-file records
+    """
+    def file_size(job):
+        return os.path.getsize(job["file"]) if os.path.exists(job["file"]) else 0
+
+    jobs = sorted(jobs, key=file_size, reverse=True)
+    for job in jobs:
+        job.update(array_format=array_format, cache_dir=cache_dir, store_path=store_path, export=export)
+        os.makedirs(os.path.dirname(os.path.abspath(job["output"])), exist_ok=True)
+
+    start_time = time.perf_counter()
+    records = []
+    broken = []
+
+    def report(record):
+        records.append(record)
+        print(f"[{len(records)}/{len(jobs)}] {record['status']}: {record['file']} "
+              f"({record['elapsed_seconds']:.2f} s)")
+
+    n_workers = max(1, min(workers, len(jobs) or 1))
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=init_worker) as executor:
+        futures = {executor.submit(run_job, job): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                report(future.result())
+            except BrokenProcessPool:
+                broken.append(futures[future])
+
+    if broken:
+        print(f"Warning: A worker process died; rerunning {len(broken)} interrupted recordings one per process")
+        with ThreadPoolExecutor(max_workers=min(n_workers, len(broken))) as threads:
+            for future in as_completed([threads.submit(run_isolated, job) for job in broken]):
+                report(future.result())
+    elapsed = time.perf_counter() - start_time
+
+    succeeded = [record for record in records if record["status"] == "ok"]
+    total_mb = sum(record.get("size_mb", 0.0) for record in succeeded)
+    for record in records:
+        record.pop("array_format", None)
+        record.pop("cache_dir", None)
+        record.pop("store_path", None)
+        record.pop("export", None)
+
+    return {
+        "n_files": len(records),
+        "succeeded": len(succeeded),
+        "failed": len(records) - len(succeeded),
+        "workers": workers,
+        "elapsed_seconds": elapsed,
+        "files_per_second": len(succeeded) / elapsed if elapsed > 0 else 0.0,
+        "mb_per_second": total_mb / elapsed if elapsed > 0 else 0.0,
+        "failures": [{"file": r["file"], "error": r["error"]} for r in records if r["status"] != "ok"],
+        "files": sorted(records, key=lambda r: r["file"])
+    }
+
+def main():
+    """Main function to process a batch of recordings."""
+    args = parse_arguments()
+
+    # One BLAS thread per worker: the pool already uses every core. Set before
+    # NumPy is first imported so forked workers inherit it.
+    for variable in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ.setdefault(variable, '1')
+
+    # Make the processing scripts importable regardless of the working directory
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from analysis_store import STORE_FILE_NAME
+    from result_cache import DEFAULT_CACHE_DIR
+
+    jobs, skipped = collect_jobs(args.input, args.output_dir, args.type)
+    print(f"Processing {len(jobs)} recordings with {args.workers} workers...")
+
+    store_path = None if args.no_store else os.path.join(args.output_dir, STORE_FILE_NAME)
+    summary = run_batch(jobs, args.workers, args.format, None if args.no_cache else DEFAULT_CACHE_DIR, store_path,
+                        args.export)
+    summary["skipped"] = skipped
+
+    summary_path = args.summary or os.path.join(args.output_dir, "batch_summary.json")
+    os.makedirs(os.path.dirname(os.path.abspath(summary_path)), exist_ok=True)
+    with open(summary_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"Batch complete: {summary['succeeded']} succeeded, {summary['failed']} failed, "
+          f"{len(skipped)} skipped in {summary['elapsed_seconds']:.1f} s "
+          f"({summary['files_per_second']:.2f} files/s). Summary saved to {summary_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark Suite for the ECG/EEG signal pipeline
+Sweeps recording duration, sampling rate and channel count over the synthetic
+generators in generate_signals.py, times every pipeline stage and its peak
+memory, and compares the run against a stored baseline to catch regressions
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(SCRIPTS_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from generate_signals import generate_synthetic_ecg, generate_synthetic_eeg
+from instrumentation import current_rss_mb, peak_rss_mb, reset_peak_rss
+from process_signal import load_signal_data, preprocess_ecg, preprocess_eeg
+from decimation import build_signal_pyramids
+from result_io import save_results
+from correlate_signals import (compute_frequency_domain_correlation, compute_sliding_window_correlation,
+                               compute_time_domain_correlation, resample_signals)
+
+DEFAULT_BASELINE = os.path.join(REPO_DIR, "benchmarks", "baseline.json")
+DEFAULT_OUTPUT = os.path.join(REPO_DIR, "benchmarks", "latest.json")
+# Multi-hour recording run with --long: (duration in seconds, ECG sampling rate in Hz)
+LONG_ECG_CASE = (4 * 3600, 250)
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Benchmark the signal pipeline across recording sizes')
+    parser.add_argument('--durations', type=str, default='10,60,600,3600',
+                        help='Comma-separated recording durations in seconds')
+    parser.add_argument('--ecg_rates', type=str, default='250,1000', help='Comma-separated ECG sampling rates in Hz')
+    parser.add_argument('--eeg_rates', type=str, default='250', help='Comma-separated EEG sampling rates in Hz')
+    parser.add_argument('--channels', type=str, default='1,4,32', help='Comma-separated EEG channel counts')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per stage; the fastest is reported')
+    parser.add_argument('--skip_io', action='store_true', help='Skip the CSV loading and result writing stages')
+    parser.add_argument('--long', action='store_true',
+                        help='Also benchmark a 4 h ECG at 250 Hz (takes several minutes)')
+    parser.add_argument('--output', type=str, default=DEFAULT_OUTPUT, help='Path to save this run')
+    parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE, help='Baseline to compare against')
+    parser.add_argument('--save_baseline', action='store_true', help='Store this run as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Relative slowdown or memory growth reported as a regression')
+    return parser.parse_args()
+
+def _parse_list(values, cast=float):
+    """Parse a comma-separated list of numbers."""
+    return [cast(value) for value in values.split(',') if value.strip()]
+
+def measure(function, repeat=1):
+    """
+    Run a stage and measure it.
+
+    Memory is the peak resident set size reached during the stage above the
+    size before it started, so stages can be compared independently.
+
+    Parameters:
+    -----------
+    function : callable
+        Stage to run, without arguments
+    repeat : int
+        Number of runs; the fastest time and the largest memory are kept
+
+    Returns:
+    --------
+    tuple
+        Return value of the last run and a dict with ``seconds``, ``cpu_seconds`` and ``peak_mb``
+    """
+    best = None
+    for _ in range(max(repeat, 1)):
+        reset_peak_rss()
+        start_rss = current_rss_mb()
+        start_cpu = time.process_time()
+        start_time = time.perf_counter()
+        # Stage progress messages would drown the report
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            value = function()
+        elapsed = time.perf_counter() - start_time
+        cpu = time.process_time() - start_cpu
+        peak = max(peak_rss_mb() - start_rss, 0.0)
+        if best is None:
+            best = {"seconds": elapsed, "cpu_seconds": cpu, "peak_mb": peak}
+        else:
+            best = {"seconds": min(best["seconds"], elapsed), "cpu_seconds": min(best["cpu_seconds"], cpu),
+                    "peak_mb": max(best["peak_mb"], peak)}
+    return value, best
+
+def benchmark_signal(signal_type, frame, sampling_rate, repeat, skip_io, work_dir):
+    """
+    Benchmark loading, preprocessing, pyramid building and saving of one recording.
+
+    Returns:
+    --------
+    tuple
+        Stage measurements keyed by stage name, and the cleaned signal
+    """
+    stages = {}
+    columns = [col for col in frame.columns if col != 'Time']
+    data = frame[columns].to_numpy().T
+    data = data[0] if data.shape[0] == 1 else data
+
+    if not skip_io:
+        csv_path = os.path.join(work_dir, f"{signal_type}.csv")
+        frame.to_csv(csv_path, index=False)
+        data, stages["load_csv"] = measure(lambda: load_signal_data(csv_path, signal_type)[0], repeat)
+
+    if signal_type == 'ecg':
+        results, stages["preprocess_ecg"] = measure(lambda: preprocess_ecg(data, sampling_rate), repeat)
+    else:
+        results, stages["preprocess_eeg"] = measure(lambda: preprocess_eeg(data, sampling_rate, columns), repeat)
+    # Sub-stage timings the preprocessing records itself
+    for name, timing in results["metadata"].get("timings", {}).items():
+        stages[f"preprocess_{signal_type}.{name}"] = {"seconds": timing["wall_seconds"],
+                                                      "cpu_seconds": timing["cpu_seconds"]}
+
+    pyramid, stages["build_pyramids"] = measure(lambda: build_signal_pyramids(results), repeat)
+    results["pyramid"] = pyramid
+
+    if not skip_io:
+        output_path = os.path.join(work_dir, f"{signal_type}_results.json")
+        _, stages["save_json"] = measure(lambda: save_results(results, output_path, 'json'), repeat)
+        _, stages["save_npy"] = measure(lambda: save_results(results, output_path, 'npy'), repeat)
+
+    cleaned = np.asarray(results["signal"]["cleaned"])
+    return stages, cleaned[0] if cleaned.ndim == 2 else cleaned
+
+def benchmark_correlation(ecg, eeg, ecg_fs, eeg_fs, repeat):
+    """Benchmark resampling and the correlation functions for one ECG-EEG pair."""
+    stages = {}
+    (ecg_resampled, eeg_resampled, target_fs), stages["resample_signals"] = measure(
+        lambda: resample_signals(ecg, eeg, ecg_fs, eeg_fs), repeat)
+    _, stages["time_domain"] = measure(
+        lambda: compute_time_domain_correlation(ecg_resampled, eeg_resampled), repeat)
+    _, stages["frequency_domain"] = measure(
+        lambda: compute_frequency_domain_correlation(ecg_resampled, eeg_resampled, target_fs), repeat)
+    if len(ecg_resampled) >= 20 * target_fs:
+        _, stages["sliding_window"] = measure(
+            lambda: compute_sliding_window_correlation(ecg_resampled, eeg_resampled, target_fs), repeat)
+    return stages
+
+def run_suite(durations, ecg_rates, eeg_rates, channel_counts, repeat=1, skip_io=False, long_ecg=False):
+    """
+    Run the benchmark sweep.
+
+    ``long_ecg`` adds the multi-hour LONG_ECG_CASE, on its own since a sweep
+    over every rate and channel count at that length would take hours.
+
+    Returns:
+    --------
+    dict
+        Measurements keyed by case (e.g. ``ecg/fs=1000/dur=60``), each mapping
+        stage names to ``seconds``, ``cpu_seconds`` and ``peak_mb``
+    """
+    cases = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for duration in durations:
+            cleaned_ecg = {}
+            for fs in ecg_rates:
+                np.random.seed(0)
+                frame = generate_synthetic_ecg(duration, fs)
+                case = f"ecg/fs={fs:g}/dur={duration:g}"
+                cases[case], cleaned_ecg[fs] = benchmark_signal('ecg', frame, fs, repeat, skip_io, work_dir)
+                print(f"{case}: {cases[case]['preprocess_ecg']['seconds']:.3f} s")
+
+            cleaned_eeg = {}
+            for fs in eeg_rates:
+                for n_channels in channel_counts:
+                    np.random.seed(0)
+                    frame = generate_synthetic_eeg(duration, fs, n_channels)
+                    case = f"eeg/fs={fs:g}/ch={n_channels}/dur={duration:g}"
+                    cases[case], cleaned = benchmark_signal('eeg', frame, fs, repeat, skip_io, work_dir)
+                    cleaned_eeg.setdefault(fs, cleaned)
+                    print(f"{case}: {cases[case]['preprocess_eeg']['seconds']:.3f} s")
+
+            for ecg_fs, ecg in cleaned_ecg.items():
+                for eeg_fs, eeg in cleaned_eeg.items():
+                    case = f"correlation/ecg_fs={ecg_fs:g}/eeg_fs={eeg_fs:g}/dur={duration:g}"
+                    cases[case] = benchmark_correlation(ecg, eeg, ecg_fs, eeg_fs, repeat)
+                    total = sum(stage["seconds"] for stage in cases[case].values())
+                    print(f"{case}: {total:.3f} s")
+
+        if long_ecg:
+            duration, fs = LONG_ECG_CASE
+            np.random.seed(0)
+            frame = generate_synthetic_ecg(duration, fs)
+            case = f"ecg/fs={fs:g}/dur={duration:g}"
+            cases[case], _ = benchmark_signal('ecg', frame, fs, repeat, skip_io, work_dir)
+            print(f"{case}: {cases[case]['preprocess_ecg']['seconds']:.3f} s")
+    return cases
+
+def _cpu_model():
+    """Processor model name, from /proc/cpuinfo where platform does not report it."""
+    try:
+        with open('/proc/cpuinfo', 'r') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or None
+
+def _memory_mb():
+    """Physical memory in MB, or None where sysconf does not report it."""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+def environment_info():
+    """Versions and hardware the run was measured on."""
+    import scipy
+    import neurokit2
+    import mne
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_model": _cpu_model(),
+        "cpu_count": os.cpu_count(),
+        "memory_mb": _memory_mb(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "neurokit2": neurokit2.__version__,
+        "mne": mne.__version__
+    }
+
+def compare_to_baseline(cases, baseline_cases, tolerance=0.25, min_seconds=0.01, min_mb=5.0):
+    """
+    Compare measurements against a baseline run.
+
+    Stages faster than ``min_seconds`` or smaller than ``min_mb`` in the
+    baseline are not flagged, since their noise exceeds any tolerance.
+
+    Returns:
+    --------
+    list
+        One entry per regressed (case, stage, metric) with the baseline and current values
+    """
+    regressions = []
+    for case, stages in cases.items():
+        for stage_name, current in stages.items():
+            previous = baseline_cases.get(case, {}).get(stage_name)
+            if not previous:
+                continue
+            for metric, floor in (("seconds", min_seconds), ("peak_mb", min_mb)):
+                if metric not in current or metric not in previous or previous[metric] < floor:
+                    continue
+                ratio = current[metric] / previous[metric]
+                if ratio > 1 + tolerance:
+                    regressions.append({"case": case, "stage": stage_name, "metric": metric,
+                                        "baseline": previous[metric], "current": current[metric],
+                                        "ratio": ratio})
+    return regressions
+
+def main():
+    """Main function to run the benchmark suite."""
+    args = parse_arguments()
+
+    cases = run_suite(_parse_list(args.durations), _parse_list(args.ecg_rates, int), _parse_list(args.eeg_rates, int),
+                      _parse_list(args.channels, int), args.repeat, args.skip_io, args.long)
+    run = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "environment": environment_info(), "cases": cases}
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(run, f, indent=2)
+    print(f"Benchmark results saved to {args.output}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save_baseline to create one")
+        return
+
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    baseline_machine = {key: baseline.get("environment", {}).get(key) for key in ("cpu_model", "cpu_count")}
+    if baseline_machine != {key: run["environment"][key] for key in ("cpu_model", "cpu_count")}:
+        print(f"Warning: baseline was recorded on a different machine ({baseline_machine['cpu_model']}, "
+              f"{baseline_machine['cpu_count']} CPUs); timings may not be comparable")
+
+    regressions = compare_to_baseline(cases, baseline.get("cases", {}), args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression['case']} {regression['stage']} {regression['metric']}: "
+              f"{regression['baseline']:.3f} -> {regression['current']:.3f} ({regression['ratio']:.2f}x)")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Nonlinear HRV Cross-Check for the ECG pipeline
+Compares the sample entropy, Poincaré and DFA indices of nonlinear_hrv.py with
+NeuroKit2's hrv_nonlinear on the same RR intervals, and times both
+"""
+
+import argparse
+import sys
+import time
+import warnings
+
+import numpy as np
+import neurokit2 as nk
+
+from nonlinear_hrv import nonlinear_indices
+from process_signal import load_signal_data
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Cross-check the nonlinear HRV indices against NeuroKit2')
+    parser.add_argument('--ecg', type=str, default=None, help='ECG recording to take the RR intervals from')
+    parser.add_argument('--beats', type=int, default=600, help='Length of the synthetic RR series')
+    parser.add_argument('--sampling_rate', type=float, default=250.0,
+                        help='Sampling rate the synthetic RR intervals are quantized to')
+    parser.add_argument('--rtol', type=float, default=1e-6, help='Relative tolerance')
+    return parser.parse_args()
+
+def synthetic_rri(n_beats, sampling_rate, seed=0):
+    """RR intervals (ms) with slow drift and beat-to-beat noise, quantized to the sampling period."""
+    rng = np.random.default_rng(seed)
+    rri = 800 + 0.3 * np.cumsum(rng.normal(scale=5.0, size=n_beats)) + rng.normal(scale=30.0, size=n_beats)
+    period = 1000.0 / sampling_rate
+    return np.round(rri / period) * period
+
+def recording_rri(file_path):
+    """RR intervals (ms) of an ECG recording, from the pipeline's cleaning and R-peak detection."""
+    ecg_signal, sampling_rate = load_signal_data(file_path, 'ecg')
+    cleaned = nk.ecg_clean(ecg_signal, sampling_rate=sampling_rate)
+    _, rpeaks = nk.ecg_peaks(cleaned, sampling_rate=sampling_rate)
+    return np.diff(rpeaks["ECG_R_Peaks"]) / sampling_rate * 1000
+
+def main():
+    """Main function to run the nonlinear HRV cross-check."""
+    args = parse_arguments()
+    # NeuroKit2 warns about its many other indices on short series
+    warnings.simplefilter('ignore')
+
+    rri = recording_rri(args.ecg) if args.ecg else synthetic_rri(args.beats, args.sampling_rate)
+    print(f"RR series: {len(rri)} beats")
+
+    start_time = time.perf_counter()
+    native = nonlinear_indices(rri)
+    native_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    reference = nk.hrv_nonlinear({"RRI": rri}).iloc[0]
+    reference_seconds = time.perf_counter() - start_time
+
+    mismatches = 0
+    for name, value in native.items():
+        expected = float(reference.get(name, np.nan))
+        ok = np.isclose(value, expected, rtol=args.rtol, atol=0.0, equal_nan=True)
+        mismatches += not ok
+        print(f"  {name:<16} {value:>14.8g} {expected:>14.8g}  {'ok' if ok else 'MISMATCH'}")
+    print(f"Native: {native_seconds * 1000:.1f} ms, NeuroKit2: {reference_seconds * 1000:.1f} ms")
+
+    if mismatches:
+        print(f"{mismatches} of {len(native)} indices differ beyond rtol={args.rtol:g}")
+        sys.exit(1)
+    print(f"All {len(native)} indices agree within rtol={args.rtol:g}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Out-of-Core Equivalence Check for the EEG pipeline
+Processes a recording in memory and out of core in several chunks, and
+compares the features, band powers, spectrum and cleaned signal, so the
+chunked pipeline can be trusted on recordings too large to check in memory
+"""
+
+import argparse
+import sys
+import tempfile
+import warnings
+
+import numpy as np
+
+from check_precision import compare_values, print_rows
+from out_of_core import chunk_length, chunk_ranges
+from process_signal import load_signal_data, preprocess_eeg, preprocess_eeg_chunked
+
+# Default tolerances on every compared value: |a - b| <= atol + rtol * |a|
+DEFAULT_RTOL = 1e-6
+DEFAULT_ATOL = 1e-9
+# Small enough that the bundled 2-minute recordings span several chunks
+DEFAULT_CHUNK_MB = 0.1
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Compare out-of-core and in-memory EEG processing')
+    parser.add_argument('--eeg', type=str, required=True, help='EEG recording to check')
+    parser.add_argument('--chunk_mb', type=float, default=DEFAULT_CHUNK_MB,
+                        help='Out-of-core chunk size in MB; the recording must span more than one chunk')
+    parser.add_argument('--rtol', type=float, default=DEFAULT_RTOL, help='Relative tolerance')
+    parser.add_argument('--atol', type=float, default=DEFAULT_ATOL, help='Absolute tolerance')
+    return parser.parse_args()
+
+def _compared_values(results):
+    """Channel-averaged and per-channel features and band powers, keyed by channel name."""
+    values = {"features": results["features"], "bands": results["bands"]}
+    channels = results.get("channels")
+    if channels:
+        for index, name in enumerate(channels["names"]):
+            values[name] = {section: {key: per_channel[index] for key, per_channel in channels[section].items()}
+                            for section in ("features", "bands")}
+    return values
+
+def compare_arrays(name, reference, chunked, rtol=DEFAULT_RTOL, atol=DEFAULT_ATOL):
+    """
+    Compare two arrays element-wise.
+
+    Returns:
+    --------
+    dict
+        Comparison row like compare_values, for the element that differs most
+    """
+    reference = np.asarray(reference, dtype=float)
+    chunked = np.asarray(chunked, dtype=float)
+    if reference.shape != chunked.shape:
+        return {"name": name, "float64": np.nan, "float32": np.nan, "abs_diff": np.inf, "rel_diff": np.inf,
+                "ok": False}
+    diff = np.abs(reference - chunked)
+    worst = np.unravel_index(np.argmax(diff), diff.shape) if diff.size else ()
+    expected = float(reference[worst]) if diff.size else 0.0
+    abs_diff = float(diff[worst]) if diff.size else 0.0
+    return {
+        "name": name,
+        "float64": expected,
+        "float32": float(chunked[worst]) if diff.size else 0.0,
+        "abs_diff": abs_diff,
+        "rel_diff": abs_diff / abs(expected) if expected else abs_diff,
+        "ok": bool(np.allclose(chunked, reference, rtol=rtol, atol=atol))
+    }
+
+def check_out_of_core(file_path, chunk_mb=DEFAULT_CHUNK_MB, rtol=DEFAULT_RTOL, atol=DEFAULT_ATOL):
+    """
+    Process an EEG recording in memory and out of core and compare the results.
+
+    Returns:
+    --------
+    tuple
+        Comparison rows from compare_values and compare_arrays, and the
+        number of chunks the out-of-core run used
+
+    Raises:
+    -------
+    ValueError
+        If the recording fits in a single chunk, which would not test the
+        state carried across chunk boundaries
+    """
+    stats = {}
+    data, sampling_rate = load_signal_data(file_path, 'eeg', stats=stats)
+    channel_names = stats.get("channels")
+    n_channels = data.shape[0] if data.ndim == 2 else 1
+    n_chunks = len(chunk_ranges(data.shape[-1], chunk_length(n_channels, chunk_mb)))
+    if n_chunks < 2:
+        raise ValueError(f"{file_path} fits in one chunk of {chunk_mb:g} MB; lower --chunk_mb")
+
+    reference = preprocess_eeg(data, sampling_rate, channel_names)
+    with tempfile.TemporaryDirectory() as work_dir:
+        # The chunked results are memory-mapped from the work directory
+        chunked = preprocess_eeg_chunked(data, sampling_rate, work_dir, channel_names, chunk_mb)
+        rows = compare_values(_compared_values(reference), _compared_values(chunked), rtol, atol)
+        rows.append(compare_arrays("frequency.psd", reference["frequency"]["psd"], chunked["frequency"]["psd"],
+                                   rtol, atol))
+        rows.append(compare_arrays("signal.cleaned", reference["signal"]["cleaned"], chunked["signal"]["cleaned"],
+                                   rtol, atol))
+    return rows, n_chunks
+
+def main():
+    """Main function to run the equivalence check."""
+    args = parse_arguments()
+    # Degenerate feature ratios on flat channels warn in both pipelines alike
+    warnings.simplefilter('ignore', RuntimeWarning)
+
+    try:
+        rows, n_chunks = check_out_of_core(args.eeg, args.chunk_mb, args.rtol, args.atol)
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        sys.exit(2)
+    print_rows(f"EEG in memory vs out of core in {n_chunks} chunks ({args.eeg})", rows)
+
+    mismatches = [row for row in rows if not row["ok"]]
+    if mismatches:
+        print(f"{len(mismatches)} of {len(rows)} values differ beyond rtol={args.rtol:g}, atol={args.atol:g}")
+        sys.exit(1)
+    print(f"All {len(rows)} values agree within rtol={args.rtol:g}, atol={args.atol:g}")
+
+if __name__ == "__main__":
+    main()
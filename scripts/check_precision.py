@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Reduced-Precision Equivalence Check for the ECG/EEG pipeline
+Processes recordings in float64 and in float32 and compares the extracted
+features (and, for an ECG-EEG pair, the correlation measures) so the float32
+mode can be trusted before it is used on large recordings
+"""
+
+import argparse
+import sys
+import warnings
+
+import numpy as np
+
+from process_signal import load_signal_data, preprocess_ecg, preprocess_eeg
+from correlate_signals import (compute_frequency_domain_correlation, compute_time_domain_correlation,
+                               resample_signals)
+
+# Default tolerances on every compared value: |a - b| <= atol + rtol * |a|
+DEFAULT_RTOL = 1e-3
+DEFAULT_ATOL = 1e-6
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Compare float32 and float64 processing of ECG/EEG recordings')
+    parser.add_argument('--ecg', type=str, default=None, help='ECG recording to check')
+    parser.add_argument('--eeg', type=str, default=None, help='EEG recording to check')
+    parser.add_argument('--rtol', type=float, default=DEFAULT_RTOL, help='Relative tolerance')
+    parser.add_argument('--atol', type=float, default=DEFAULT_ATOL, help='Absolute tolerance')
+    return parser.parse_args()
+
+def _scalars(node, prefix=""):
+    """Flatten the numeric scalars of nested dicts into {dotted.name: value}."""
+    values = {}
+    for key, value in node.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            values.update(_scalars(value, name))
+        elif isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+            values[name] = float(value)
+    return values
+
+def compare_values(reference, reduced, rtol=DEFAULT_RTOL, atol=DEFAULT_ATOL):
+    """
+    Compare float64 and float32 results value by value.
+
+    Parameters:
+    -----------
+    reference : dict
+        Nested dict of float64 results
+    reduced : dict
+        Same structure computed in float32
+    rtol, atol : float
+        Tolerances; NaN in both results counts as equal
+
+    Returns:
+    --------
+    list
+        One row per value with ``name``, ``float64``, ``float32``,
+        ``abs_diff``, ``rel_diff`` and ``ok``
+    """
+    reference_values = _scalars(reference)
+    reduced_values = _scalars(reduced)
+    rows = []
+    for name, expected in reference_values.items():
+        actual = reduced_values.get(name, np.nan)
+        abs_diff = abs(actual - expected)
+        both_nan = np.isnan(expected) and np.isnan(actual)
+        rows.append({
+            "name": name,
+            "float64": expected,
+            "float32": actual,
+            "abs_diff": 0.0 if both_nan else abs_diff,
+            "rel_diff": 0.0 if both_nan else abs_diff / abs(expected) if expected else abs_diff,
+            "ok": bool(both_nan or abs_diff <= atol + rtol * abs(expected))
+        })
+    return rows
+
+def check_signal(file_path, signal_type, rtol=DEFAULT_RTOL, atol=DEFAULT_ATOL):
+    """
+    Process a recording in both precisions and compare its features.
+
+    Returns:
+    --------
+    tuple
+        Comparison rows from compare_values, and the cleaned signals and
+        sampling rate of both runs for a follow-up correlation check
+    """
+    outputs = {}
+    for dtype in (np.float64, np.float32):
+        data, sampling_rate = load_signal_data(file_path, signal_type, dtype=dtype)
+        if signal_type == 'ecg':
+            outputs[dtype] = preprocess_ecg(data, sampling_rate)
+        else:
+            outputs[dtype] = preprocess_eeg(data, sampling_rate)
+
+    reference, reduced = outputs[np.float64], outputs[np.float32]
+    sections = ("features", "bands")
+    rows = compare_values({key: reference[key] for key in sections if key in reference},
+                          {key: reduced[key] for key in sections if key in reduced}, rtol, atol)
+
+    def first_channel(results):
+        cleaned = np.asarray(results["signal"]["cleaned"])
+        return cleaned[0] if cleaned.ndim == 2 else cleaned
+
+    return rows, (first_channel(reference), first_channel(reduced), sampling_rate)
+
+def check_correlation(ecg, eeg, rtol=DEFAULT_RTOL, atol=DEFAULT_ATOL):
+    """
+    Compare the time- and frequency-domain correlation measures of an ECG-EEG pair.
+
+    Parameters:
+    -----------
+    ecg, eeg : tuple
+        (float64 signal, float32 signal, sampling rate) from check_signal
+
+    Returns:
+    --------
+    list
+        Comparison rows from compare_values
+    """
+    outputs = []
+    for index in (0, 1):
+        ecg_resampled, eeg_resampled, fs = resample_signals(ecg[index], eeg[index], ecg[2], eeg[2])
+        outputs.append({
+            "time_domain": compute_time_domain_correlation(ecg_resampled, eeg_resampled),
+            "frequency_domain": compute_frequency_domain_correlation(ecg_resampled, eeg_resampled, fs)
+        })
+    return compare_values(outputs[0], outputs[1], rtol, atol)
+
+def print_rows(title, rows):
+    """Print a comparison table."""
+    print(title)
+    for row in rows:
+        status = "ok" if row["ok"] else "MISMATCH"
+        print(f"  {row['name']:<40} {row['float64']:>14.6g} {row['float32']:>14.6g} "
+              f"{row['rel_diff']:>10.2e}  {status}")
+
+def main():
+    """Main function to run the equivalence check."""
+    args = parse_arguments()
+    # Degenerate HRV ratios on short recordings warn in both precisions alike
+    warnings.simplefilter('ignore', RuntimeWarning)
+    if not args.ecg and not args.eeg:
+        print("Error: Pass --ecg and/or --eeg")
+        sys.exit(2)
+
+    all_rows = []
+    signals = {}
+    for signal_type, file_path in (('ecg', args.ecg), ('eeg', args.eeg)):
+        if file_path:
+            rows, signals[signal_type] = check_signal(file_path, signal_type, args.rtol, args.atol)
+            print_rows(f"{signal_type.upper()} features ({file_path})", rows)
+            all_rows.extend(rows)
+
+    if len(signals) == 2:
+        rows = check_correlation(signals['ecg'], signals['eeg'], args.rtol, args.atol)
+        print_rows("ECG-EEG correlation", rows)
+        all_rows.extend(rows)
+
+    mismatches = [row for row in all_rows if not row["ok"]]
+    if mismatches:
+        print(f"{len(mismatches)} of {len(all_rows)} values differ beyond rtol={args.rtol:g}, atol={args.atol:g}")
+        sys.exit(1)
+    print(f"All {len(all_rows)} values agree within rtol={args.rtol:g}, atol={args.atol:g}")
+
+if __name__ == "__main__":
+    main()
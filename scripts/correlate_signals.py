@@ -9,28 +9,201 @@ Analyzes the relationship between brain and heart signals
 import argparse
 import json
 import os
+from fractions import Fraction
+from functools import lru_cache
+from multiprocessing import Pool, current_process
+from multiprocessing.pool import ThreadPool
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import pandas as pd
 import neurokit2 as nk
 from scipy import signal
-from scipy.stats import pearsonr, spearmanr
-from scipy.signal import coherence
-import mne
+from scipy.stats import pearsonr, rankdata, spearmanr
+from scipy.stats import t as t_dist
+from scipy.fft import next_fast_len
 
-from mne_connectivity import spectral_connectivity_epochs as spectral_connectivity
+from analysis_store import default_store_path, load_stored_analysis, store_analysis
+from instrumentation import append_timing_log, profiled, stage
+from result_cache import DEFAULT_CACHE_DIR, correlation_key, load_cached, lookup, store, store_results
+from result_io import load_results, save_results
+from spectral import (EEG_BANDS, band_analytic_signal, band_means, band_phase_locking, coherence_from_spectra,
+                      psd_from_power, segment_spectra, stored_spectra, unit_phasors)
+from surrogates import DEFAULT_SURROGATES, surrogate_test
+
+# Frequency bands (Hz) summarized in the ECG-EEG coherence results
+COHERENCE_BANDS = {
+    "delta": (0.5, 4),
+    "theta": (4, 8),
+    "alpha": (8, 13),
+    "beta": (13, 30)
+}
+
+# Cross-correlation lag window (s) used when a config has no maxLagSeconds; heart-brain
+# coupling lags are well under this, and the full 2N-1 lag curve would bloat the result
+DEFAULT_MAX_LAG_SECONDS = 5.0
+
+# Frequency range (Hz) of the broadband phase-locking value
+PLV_BAND = (2.0, 45.0)
+
+# Frequency bands (Hz) of the per-band phase-locking values
+PLV_BANDS = dict(COHERENCE_BANDS, gamma=(30, 45))
 
 def parse_arguments():
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(description='Correlate ECG and EEG signals')
-    parser.add_argument('--config', type=str, required=True, help='Path to the configuration JSON file')
+    parser.add_argument('--config', type=str, required=True,
+                        help='Path to the configuration JSON file, or the configuration itself as JSON')
+    parser.add_argument('--profile', type=str, default=None, help='Write a cProfile dump of the run to this path')
+    parser.add_argument('--timing_log', type=str, default=None,
+                        help='Append per-stage timings as a JSON line to this file (default: $SIGNAL_TIMING_LOG)')
     return parser.parse_args()
 
 def load_analysis_results(file_path):
-    """Load analysis results from JSON file."""
-    with open(file_path, 'r') as f:
-        return json.load(f)
+    """Load analysis results, memory-mapping any arrays stored as .npy sidecars."""
+    return load_results(file_path, mmap=True)
+
+def resolve_analysis(analysis_id, store_path, results_dir):
+    """
+    Load an analysis by ID from the analysis store, or from its result file
+    for analyses made before the store existed.
+
+    Returns:
+    --------
+    tuple
+        (results, result file path or None when only the store holds it)
+    """
+    file_path = os.path.join(results_dir, f"{analysis_id}.json")
+    results = load_stored_analysis(store_path, analysis_id)
+    if results is not None:
+        return results, file_path if os.path.exists(file_path) else None
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Analysis {analysis_id} is neither in {store_path} nor at {file_path}")
+    return load_analysis_results(file_path), file_path
+
+def eeg_channel_index(eeg_results, channel=0):
+    """
+    Resolve an EEG channel name or index to an index.
+
+    Returns:
+    --------
+    int or None
+        Channel index, or None for a single-channel result
+    """
+    if np.ndim(eeg_results["signal"]["cleaned"]) == 1:
+        return None
+    if isinstance(channel, str):
+        names = eeg_results.get("channels", {}).get("names", [])
+        if channel not in names:
+            raise ValueError(f"Unknown EEG channel: {channel}")
+        return names.index(channel)
+    return channel
+
+def eeg_channel_spectral(eeg_results, channel=0):
+    """Stored segment spectra record (see spectral.spectra_record) of one EEG channel, or None."""
+    record = eeg_results.get("spectral")
+    index = eeg_channel_index(eeg_results, channel)
+    if not record or record.get("segment_spectra") is None or index is None:
+        return record
+    return dict(record, segment_spectra=record["segment_spectra"][index])
+
+def select_eeg_channel(eeg_results, channel=0, dtype=float):
+    """
+    Return one channel of the cleaned EEG signal.
+    
+    Parameters:
+    -----------
+    eeg_results : dict
+        EEG analysis results
+    channel : int or str
+        Channel index, or channel name as listed in ``eeg_results["channels"]["names"]``
+    dtype : numpy dtype
+        Float type of the returned signal
+        
+    Returns:
+    --------
+    array
+        1-D cleaned EEG signal
+    """
+    eeg_signal = np.asarray(eeg_results["signal"]["cleaned"], dtype=dtype)
+    index = eeg_channel_index(eeg_results, channel)
+    return eeg_signal if index is None else eeg_signal[index]
+
+def resampling_factors(from_fs, to_fs, max_denominator=1000):
+    """
+    Return the rational up/down factors that convert ``from_fs`` to ``to_fs``.
+    
+    Parameters:
+    -----------
+    from_fs : float
+        Original sampling rate in Hz
+    to_fs : float
+        Target sampling rate in Hz
+    max_denominator : int
+        Bound on the factors; non-integer rate ratios are approximated
+        
+    Returns:
+    --------
+    tuple
+        (up, down) integer factors
+    """
+    ratio = Fraction(float(to_fs)) / Fraction(float(from_fs))
+    ratio = ratio.limit_denominator(max_denominator)
+    return ratio.numerator, ratio.denominator
+
+@lru_cache(maxsize=32)
+def design_resampling_filter(up, down):
+    """
+    Design (once per up/down pair) the anti-aliasing FIR filter for polyphase resampling.
+    
+    This is the same Kaiser-windowed low-pass filter ``scipy.signal.resample_poly``
+    designs on every call by default.
+    
+    Parameters:
+    -----------
+    up : int
+        Upsampling factor
+    down : int
+        Downsampling factor
+        
+    Returns:
+    --------
+    array
+        Read-only FIR filter coefficients
+    """
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    taps = signal.firwin(2 * half_len + 1, 1.0 / max_rate, window=('kaiser', 5.0))
+    taps.setflags(write=False)
+    return taps
+
+def resample_polyphase(data, from_fs, to_fs):
+    """
+    Resample a signal with rational polyphase filtering.
+    
+    Parameters:
+    -----------
+    data : array
+        Signal data
+    from_fs : float
+        Original sampling rate in Hz
+    to_fs : float
+        Target sampling rate in Hz
+        
+    Returns:
+    --------
+    array
+        Resampled signal, float32 for float32 input
+    """
+    up, down = resampling_factors(from_fs, to_fs)
+    if up == down:
+        return data
+    taps = design_resampling_filter(up, down)
+    # Matching the filter to float32 data keeps the output in float32
+    if np.asarray(data).dtype == np.float32:
+        taps = taps.astype(np.float32)
+    return signal.resample_poly(data, up, down, window=taps)
 
-def resample_signals(ecg_data, eeg_data, ecg_fs, eeg_fs):
+def resample_signals(ecg_data, eeg_data, ecg_fs, eeg_fs, target_fs='max'):
     """
     Resample signals to the same sampling rate.
     
@@ -44,25 +217,23 @@ def resample_signals(ecg_data, eeg_data, ecg_fs, eeg_fs):
         ECG sampling rate
     eeg_fs : int
         EEG sampling rate
+    target_fs : str or float
+        Common analysis rate: 'max' upsamples to the higher rate, 'min'
+        downsamples to the lower rate, or a rate in Hz
         
     Returns:
     --------
     tuple
         Resampled ECG and EEG data, and the new sampling rate
     """
-    # Choose the higher sampling rate
-    target_fs = max(ecg_fs, eeg_fs)
+    if target_fs == 'max':
+        target_fs = max(ecg_fs, eeg_fs)
+    elif target_fs == 'min':
+        target_fs = min(ecg_fs, eeg_fs)
     
     # Resample signals if needed
-    if ecg_fs != target_fs:
-        ecg_resampled = signal.resample(ecg_data, int(len(ecg_data) * target_fs / ecg_fs))
-    else:
-        ecg_resampled = ecg_data
-        
-    if eeg_fs != target_fs:
-        eeg_resampled = signal.resample(eeg_data, int(len(eeg_data) * target_fs / eeg_fs))
-    else:
-        eeg_resampled = eeg_data
+    ecg_resampled = resample_polyphase(ecg_data, ecg_fs, target_fs) if ecg_fs != target_fs else ecg_data
+    eeg_resampled = resample_polyphase(eeg_data, eeg_fs, target_fs) if eeg_fs != target_fs else eeg_data
     
     # Ensure both signals have the same length (use the shorter one)
     min_length = min(len(ecg_resampled), len(eeg_resampled))
@@ -71,7 +242,52 @@ def resample_signals(ecg_data, eeg_data, ecg_fs, eeg_fs):
     
     return ecg_resampled, eeg_resampled, target_fs
 
-def compute_time_domain_correlation(ecg_data, eeg_data):
+def fft_cross_correlation(x, y, max_lag=None):
+    """
+    Compute the normalized cross-correlation of two signals with FFTs.
+    
+    Gives the same values as ``np.correlate(x, y, mode='full')`` divided by
+    ``sqrt(sum(x**2) * sum(y**2))`` in O(N log N). Bounding the lag also
+    shortens the transform, since only ``len(x) + max_lag`` points are needed
+    to avoid circular wrap-around.
+    
+    Parameters:
+    -----------
+    x : array
+        First signal
+    y : array
+        Second signal, same length as ``x``
+    max_lag : int, optional
+        Largest lag in samples to evaluate (default: every lag)
+        
+    Returns:
+    --------
+    tuple
+        Lags in samples (``x`` is shifted by ``lag`` relative to ``y``) and the
+        normalized correlation at each lag
+    """
+    n_samples = len(x)
+    if max_lag is None or max_lag > n_samples - 1:
+        max_lag = n_samples - 1
+    max_lag = max(int(max_lag), 0)
+    
+    n_fft = next_fast_len(n_samples + max_lag)
+    spectrum = np.fft.rfft(x, n_fft) * np.conj(np.fft.rfft(y, n_fft))
+    circular = np.fft.irfft(spectrum, n_fft)
+    
+    # Negative lags wrap around to the end of the circular correlation
+    values = np.concatenate([circular[n_fft - max_lag:], circular[:max_lag + 1]]) if max_lag > 0 else circular[:1]
+    lags = np.arange(-max_lag, max_lag + 1)
+    
+    norm_factor = np.sqrt(np.sum(x**2) * np.sum(y**2))
+    if norm_factor > 0:
+        values = values / norm_factor
+    else:
+        values = np.zeros_like(values)
+    
+    return lags, values
+
+def compute_time_domain_correlation(ecg_data, eeg_data, max_lag=None):
     """
     Compute time domain correlation between ECG and EEG signals.
     
@@ -81,6 +297,8 @@ def compute_time_domain_correlation(ecg_data, eeg_data):
         ECG signal data
     eeg_data : array
         EEG signal data
+    max_lag : int, optional
+        Largest cross-correlation lag in samples (default: every lag)
         
     Returns:
     --------
@@ -93,18 +311,9 @@ def compute_time_domain_correlation(ecg_data, eeg_data):
     # Spearman correlation
     spearman_corr, spearman_p = spearmanr(ecg_data, eeg_data)
     
-    # Cross-correlation
-    cross_corr = np.correlate(ecg_data, eeg_data, mode='full')
+    # Normalized cross-correlation over the lag window
+    lags, cross_corr = fft_cross_correlation(ecg_data, eeg_data, max_lag)
     max_corr_idx = np.argmax(np.abs(cross_corr))
-    lag = max_corr_idx - (len(ecg_data) - 1)
-    max_corr_value = cross_corr[max_corr_idx]
-    
-    # Normalize cross-correlation
-    norm_factor = np.sqrt(np.sum(ecg_data**2) * np.sum(eeg_data**2))
-    if norm_factor > 0:
-        max_corr_value_norm = max_corr_value / norm_factor
-    else:
-        max_corr_value_norm = 0
     
     return {
         "pearson": {
@@ -116,15 +325,23 @@ def compute_time_domain_correlation(ecg_data, eeg_data):
             "p_value": float(spearman_p)
         },
         "cross_correlation": {
-            "max_value": float(max_corr_value_norm),
-            "lag_samples": int(lag)
+            "max_value": float(cross_corr[max_corr_idx]),
+            "lag_samples": int(lags[max_corr_idx]),
+            "max_lag_samples": int(lags[-1]),
+            "lags": lags,
+            "values": cross_corr
         }
     }
 
-def compute_frequency_domain_correlation(ecg_data, eeg_data, sampling_rate):
+def compute_frequency_domain_correlation(ecg_data, eeg_data, sampling_rate, timings=None,
+                                         ecg_spectral=None, eeg_spectral=None):
     """
     Compute frequency domain correlation between ECG and EEG signals.
     
+    Coherence is derived from the segment spectra stored with the analyses
+    when they match this rate and segment length, so data already analysed
+    is not transformed again.
+    
     Parameters:
     -----------
     ecg_data : array
@@ -133,93 +350,339 @@ def compute_frequency_domain_correlation(ecg_data, eeg_data, sampling_rate):
         EEG signal data
     sampling_rate : int
         Sampling rate in Hz
+    timings : dict, optional
+        If given, receives the coherence and PLV stage measurements
+    ecg_spectral, eeg_spectral : dict, optional
+        ``spectral`` records of the ECG analysis and of the EEG channel
         
     Returns:
     --------
     dict
-        Dictionary containing frequency domain correlation results
+        Dictionary containing frequency domain correlation results: coherence,
+        the 2-45 Hz ``phase_locking_value`` and ``phase_locking_bands`` per band
     """
+    timings = {} if timings is None else timings
+    
     # Compute coherence
-    freqs, coh = coherence(ecg_data, eeg_data, fs=sampling_rate, nperseg=min(sampling_rate, len(ecg_data)//2))
-    
-    # Find frequency bands
-    delta_idx = np.logical_and(freqs >= 0.5, freqs <= 4)
-    theta_idx = np.logical_and(freqs >= 4, freqs <= 8)
-    alpha_idx = np.logical_and(freqs >= 8, freqs <= 13)
-    beta_idx = np.logical_and(freqs >= 13, freqs <= 30)
-    
-    # Compute mean coherence in each band
-    delta_coh = np.mean(coh[delta_idx]) if np.any(delta_idx) else 0
-    theta_coh = np.mean(coh[theta_idx]) if np.any(theta_idx) else 0
-    alpha_coh = np.mean(coh[alpha_idx]) if np.any(alpha_idx) else 0
-    beta_coh = np.mean(coh[beta_idx]) if np.any(beta_idx) else 0
-    
-    # Set a default PLV value
-    plv = 0
-    
-    # Attempt spectral connectivity only if we have enough data
-    data_duration_sec = len(ecg_data) / sampling_rate
-    
-    # Only attempt PLV calculation if we have enough data
-    if data_duration_sec >= 10.0:  # At least 10 seconds of data
-        try:
-            # Import here to ensure we have the right function
-            import warnings
-            from mne_connectivity import spectral_connectivity_epochs
-            
-            # Suppress specific warnings
-            with warnings.catch_warnings():
-                warnings.filterwarnings("ignore", category=RuntimeWarning)
-                
-                # Create MNE-compatible data for connectivity analysis
-                data = np.vstack([ecg_data, eeg_data])
-                info = mne.create_info(ch_names=['ECG', 'EEG'], sfreq=sampling_rate, ch_types=['misc', 'misc'])
-                raw = mne.io.RawArray(data, info)
-                
-                # Create epochs from the raw data
-                # Use the entire signal as one epoch
-                events = np.array([[0, 0, 1]])
-                epoch_duration = int(data_duration_sec)  # in seconds
-                tmax = epoch_duration - 1/sampling_rate  # Adjust for sampling rate
-                epochs = mne.Epochs(raw, events, tmin=0, tmax=tmax, baseline=None, preload=True)
-                
-                # Calculate minimum frequency based on epoch duration
-                min_freq = max(2.0, 5.0 / data_duration_sec)
-                
-                # Compute spectral connectivity
-                con = spectral_connectivity(
-                    epochs,
-                    method='plv',
-                    mode='multitaper',
-                    sfreq=sampling_rate,
-                    fmin=min_freq,
-                    fmax=45,
-                    faverage=True
-                )
-                
-                # Extract PLV between ECG and EEG
-                plv = con.get_data('plv')[0, 1]
-        except Exception as e:
-            print(f"Error computing PLV: {str(e)}")
-            plv = 0
-    else:
-        print(f"Skipping PLV calculation - insufficient data length ({data_duration_sec:.2f} sec)")
+    with stage(timings, "coherence"):
+        nperseg = int(min(sampling_rate, len(ecg_data) // 2))
+        n_segments = (len(ecg_data) - nperseg) // (nperseg - nperseg // 2) + 1
+        freqs = np.fft.rfftfreq(nperseg, 1.0 / sampling_rate)
+        spectra = []
+        for data, record in ((ecg_data, ecg_spectral), (eeg_data, eeg_spectral)):
+            stored = stored_spectra(record, sampling_rate, nperseg, n_segments)
+            spectra.append(stored if stored is not None else segment_spectra(data, sampling_rate, nperseg)[1])
+        coh = coherence_from_spectra(*spectra)
+        
+        # Compute mean coherence in each band
+        band_coh = band_means(coh, freqs, COHERENCE_BANDS)
+    
+    # Phase locking per band and over the whole PLV range, one FFT per signal
+    with stage(timings, "plv"):
+        plv = band_phase_locking(ecg_data, eeg_data, sampling_rate, dict(PLV_BANDS, broadband=PLV_BAND))
     
     return {
         "coherence": {
             "frequencies": freqs.tolist(),
             "values": coh.tolist(),
-            "delta_band": float(delta_coh),
-            "theta_band": float(theta_coh),
-            "alpha_band": float(alpha_coh),
-            "beta_band": float(beta_coh)
+            "delta_band": float(band_coh["delta"]),
+            "theta_band": float(band_coh["theta"]),
+            "alpha_band": float(band_coh["alpha"]),
+            "beta_band": float(band_coh["beta"])
         },
-        "phase_locking_value": float(plv)
+        "phase_locking_value": plv.pop("broadband"),
+        "phase_locking_bands": plv
     }
 
-def compute_hrv_eeg_correlation(ecg_results, eeg_results):
+def _window_sums(cumulative, starts, length):
+    """Sum of each window [start, start + length) from a cumulative sum with a leading zero."""
+    return cumulative[starts + length] - cumulative[starts]
+
+def compute_sliding_window_correlation(ecg_data, eeg_data, sampling_rate, window_seconds=10.0,
+                                       step_seconds=1.0, max_lag_seconds=2.0, segment_seconds=1.0,
+                                       batch_size=256):
     """
-    Compute correlation between HRV metrics and EEG frequency bands.
+    Compute time series of correlation, lag and band coherence over sliding windows.
+    
+    Nothing is recomputed from scratch per window. Pearson correlation comes
+    from running sums, coherence from segment spectra computed once with
+    overlapping STFT segments and summed per window through cumulative sums,
+    and lags from batched FFT cross-correlations of all windows.
+    
+    Parameters:
+    -----------
+    ecg_data : array
+        ECG signal data
+    eeg_data : array
+        EEG signal data, same length and sampling rate as ``ecg_data``
+    sampling_rate : float
+        Sampling rate in Hz
+    window_seconds : float
+        Window length in seconds
+    step_seconds : float
+        Step between consecutive windows in seconds
+    max_lag_seconds : float
+        Largest cross-correlation lag searched within each window
+    segment_seconds : float
+        STFT segment length used for coherence (50% overlap)
+    batch_size : int
+        Number of windows cross-correlated per FFT batch (bounds memory)
+        
+    Returns:
+    --------
+    dict
+        Dictionary with window centre times and the per-window Pearson
+        correlation, peak cross-correlation lag/value and band coherence
+    """
+    ecg_data = np.asarray(ecg_data, dtype=float)
+    eeg_data = np.asarray(eeg_data, dtype=float)
+    n_samples = min(len(ecg_data), len(eeg_data))
+    window = int(round(window_seconds * sampling_rate))
+    step = max(int(round(step_seconds * sampling_rate)), 1)
+    if window < 2 or window > n_samples:
+        raise ValueError(f"Window of {window_seconds} s does not fit a {n_samples / sampling_rate:.2f} s recording")
+    
+    starts = np.arange(0, n_samples - window + 1, step)
+    
+    # Pearson correlation from running sums (centred first to limit cancellation)
+    x = ecg_data[:n_samples] - np.mean(ecg_data[:n_samples])
+    y = eeg_data[:n_samples] - np.mean(eeg_data[:n_samples])
+    cumulative = {
+        name: np.concatenate([[0.0], np.cumsum(values)])
+        for name, values in (("x", x), ("y", y), ("xx", x * x), ("yy", y * y), ("xy", x * y))
+    }
+    sums = {name: _window_sums(values, starts, window) for name, values in cumulative.items()}
+    covariance = window * sums["xy"] - sums["x"] * sums["y"]
+    variance = (window * sums["xx"] - sums["x"]**2) * (window * sums["yy"] - sums["y"]**2)
+    pearson = np.divide(covariance, np.sqrt(np.maximum(variance, 0)),
+                        out=np.zeros(len(starts)), where=variance > 0)
+    
+    # Peak cross-correlation lag per window, batched FFTs over all windows
+    max_lag = min(int(round(max_lag_seconds * sampling_rate)), window - 1)
+    n_fft = next_fast_len(window + max_lag)
+    # Strided views; only the windows of the current batch are ever copied
+    ecg_windows = sliding_window_view(ecg_data[:n_samples], window)
+    eeg_windows = sliding_window_view(eeg_data[:n_samples], window)
+    lag_samples = np.zeros(len(starts), dtype=int)
+    lag_values = np.zeros(len(starts))
+    lags = np.arange(-max_lag, max_lag + 1)
+    for batch in range(0, len(starts), batch_size):
+        batch_starts = starts[batch:batch + batch_size]
+        x_batch = ecg_windows[batch_starts]
+        y_batch = eeg_windows[batch_starts]
+        circular = np.fft.irfft(np.fft.rfft(x_batch, n_fft, axis=-1) *
+                                np.conj(np.fft.rfft(y_batch, n_fft, axis=-1)), n_fft, axis=-1)
+        values = np.concatenate([circular[:, n_fft - max_lag:], circular[:, :max_lag + 1]], axis=-1)
+        norm = np.sqrt(np.sum(x_batch**2, axis=-1) * np.sum(y_batch**2, axis=-1))
+        values = np.divide(values, norm[:, None], out=np.zeros_like(values), where=norm[:, None] > 0)
+        best = np.argmax(np.abs(values), axis=-1)
+        lag_samples[batch:batch + batch_size] = lags[best]
+        lag_values[batch:batch + batch_size] = values[np.arange(len(best)), best]
+    
+    # Band coherence from STFT segments shared by overlapping windows
+    nperseg = min(int(round(segment_seconds * sampling_rate)), window // 2)
+    freqs, ecg_spectra, seg_starts = segment_spectra(ecg_data[:n_samples], sampling_rate, nperseg)
+    _, eeg_spectra, _ = segment_spectra(eeg_data[:n_samples], sampling_rate, nperseg)
+    seg_cumulative = [
+        np.concatenate([np.zeros((1, len(freqs)), dtype=values.dtype), np.cumsum(values, axis=0)])
+        for values in (ecg_spectra * np.conj(eeg_spectra), np.abs(ecg_spectra)**2, np.abs(eeg_spectra)**2)
+    ]
+    # Segments lying entirely inside each window
+    first_seg = np.searchsorted(seg_starts, starts)
+    last_seg = np.searchsorted(seg_starts, starts + window - nperseg, side='right')
+    cross, ecg_power, eeg_power = [values[last_seg] - values[first_seg] for values in seg_cumulative]
+    denominator = ecg_power * eeg_power
+    coherence_windows = np.divide(np.abs(cross)**2, denominator, out=np.zeros_like(denominator),
+                                  where=denominator > 0)
+    band_coh = band_means(coherence_windows, freqs, COHERENCE_BANDS)
+    
+    return {
+        "window_seconds": window / sampling_rate,
+        "step_seconds": step / sampling_rate,
+        "times": (starts + window / 2) / sampling_rate,
+        "pearson": pearson,
+        "cross_correlation": {
+            "lag_samples": lag_samples,
+            "max_value": lag_values,
+            "max_lag_samples": max_lag
+        },
+        "coherence": {f"{band}_band": values for band, values in band_coh.items()}
+    }
+
+def epoch_grid(duration_seconds, epoch_seconds, step_seconds):
+    """Start times (s) of the epochs [start, start + epoch_seconds) that fit a recording."""
+    if epoch_seconds <= 0 or step_seconds <= 0 or epoch_seconds > duration_seconds:
+        return np.array([])
+    return np.arange(0.0, duration_seconds - epoch_seconds + 1e-9, step_seconds)
+
+def hrv_epoch_series(r_peaks, sampling_rate, epoch_starts, epoch_seconds, min_beats=3):
+    """
+    Heart rate, SDNN and RMSSD of every epoch, from the R-peaks in one pass.
+    
+    Each RR interval belongs to the epoch holding the R-peak that ends it.
+    Epoch sums of RR, RR^2 and squared successive differences come from
+    cumulative sums, so every epoch costs O(1).
+    
+    Parameters:
+    -----------
+    r_peaks : array
+        R-peak sample indices
+    sampling_rate : float
+        ECG sampling rate in Hz
+    epoch_starts : array
+        Epoch start times in seconds
+    epoch_seconds : float
+        Epoch length in seconds
+    min_beats : int
+        Fewest RR intervals an epoch needs; epochs with fewer are NaN
+        
+    Returns:
+    --------
+    dict
+        ``heart_rate`` (bpm), ``sdnn`` and ``rmssd`` (ms) arrays, one value per epoch
+    """
+    r_peaks = np.asarray(r_peaks, dtype=float)
+    n_epochs = len(epoch_starts)
+    series = {name: np.full(n_epochs, np.nan) for name in ("heart_rate", "sdnn", "rmssd")}
+    if len(r_peaks) < 2 or not n_epochs:
+        return series
+    
+    rri = np.diff(r_peaks) / sampling_rate * 1000
+    beat_times = r_peaks[1:] / sampling_rate
+    cumulative = [np.concatenate([[0.0], np.cumsum(values)]) for values in (rri, rri ** 2, np.diff(rri) ** 2)]
+    first = np.searchsorted(beat_times, epoch_starts)
+    last = np.searchsorted(beat_times, epoch_starts + epoch_seconds)
+    count = last - first
+    valid = count >= max(min_beats, 2)
+    first, last, count = first[valid], last[valid], count[valid]
+    
+    sum_rr = cumulative[0][last] - cumulative[0][first]
+    sum_rr2 = cumulative[1][last] - cumulative[1][first]
+    # Successive differences with both intervals inside the epoch
+    sum_diff2 = cumulative[2][last - 1] - cumulative[2][first]
+    mean_rr = sum_rr / count
+    series["heart_rate"][valid] = 60000.0 / mean_rr
+    series["sdnn"][valid] = np.sqrt(np.maximum(sum_rr2 - count * mean_rr ** 2, 0) / (count - 1))
+    series["rmssd"][valid] = np.sqrt(sum_diff2 / (count - 1))
+    return series
+
+def band_power_epoch_series(spectra, sampling_rate, nperseg, epoch_starts, epoch_seconds, bands):
+    """
+    Relative EEG band power of every epoch from segment spectra.
+    
+    Band power is relative to the total power, as the ``bands`` of an EEG
+    analysis, over the segments lying entirely inside the epoch. Per-segment
+    band powers are summed per epoch through cumulative sums.
+    
+    Parameters:
+    -----------
+    spectra : array
+        (segments x freqs) segment spectra (see spectral.segment_spectra)
+    sampling_rate : float
+        EEG sampling rate in Hz
+    nperseg : int
+        Segment length in samples (50% overlap)
+    epoch_starts : array
+        Epoch start times in seconds
+    epoch_seconds : float
+        Epoch length in seconds
+    bands : dict
+        Band name -> (low, high) in Hz
+        
+    Returns:
+    --------
+    dict
+        Band name -> relative power per epoch (NaN for epochs without a whole segment)
+    """
+    spectra = np.asarray(spectra)
+    freqs = np.fft.rfftfreq(nperseg, 1.0 / sampling_rate)
+    power = psd_from_power(np.abs(spectra) ** 2, sampling_rate, nperseg)
+    seg_starts = np.arange(spectra.shape[0]) * (nperseg - nperseg // 2) / sampling_rate
+    first = np.searchsorted(seg_starts, epoch_starts)
+    last = np.searchsorted(seg_starts, epoch_starts + epoch_seconds - nperseg / sampling_rate, side='right')
+    
+    def epoch_sums(values):
+        cumulative = np.concatenate([[0.0], np.cumsum(values)])
+        return cumulative[np.maximum(last, first)] - cumulative[first]
+    
+    total = epoch_sums(np.sum(power, axis=-1))
+    valid = (last > first) & (total > 0)
+    series = {}
+    for band_name, (low, high) in bands.items():
+        band_idx = np.logical_and(freqs >= low, freqs <= high)
+        band_power = epoch_sums(np.sum(power[:, band_idx], axis=-1))
+        series[band_name] = np.divide(band_power, total, out=np.full(len(total), np.nan), where=valid)
+    return series
+
+def lagged_correlation(x, y, max_lag, min_pairs=3):
+    """
+    Pearson correlation of ``x[t]`` with each row of ``y`` at ``t + lag``.
+    
+    NaN epochs are left out pairwise. Positive lags pair an HRV epoch with a
+    later EEG epoch.
+    
+    Parameters:
+    -----------
+    x : array
+        (epochs,) series
+    y : array
+        (series x epochs) series, all correlated with ``x`` at once
+    max_lag : int
+        Largest lag in epochs, in either direction
+    min_pairs : int
+        Fewest valid epoch pairs a correlation needs; fewer give NaN
+        
+    Returns:
+    --------
+    tuple
+        Lags in epochs and the (series x lags) correlations, and the number of
+        epoch pairs behind each correlation
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.atleast_2d(np.asarray(y, dtype=float))
+    n_epochs = len(x)
+    max_lag = int(max(0, min(max_lag, n_epochs - min_pairs)))
+    lags = np.arange(-max_lag, max_lag + 1)
+    values = np.full((y.shape[0], len(lags)), np.nan)
+    pairs = np.zeros((y.shape[0], len(lags)), dtype=int)
+    for index, lag in enumerate(lags):
+        x_part = x[max(0, -lag):n_epochs - max(0, lag)]
+        y_part = y[:, max(0, lag):n_epochs - max(0, -lag)]
+        mask = np.isfinite(x_part) & np.isfinite(y_part)
+        count = np.sum(mask, axis=-1)
+        x_masked = np.where(mask, x_part, 0.0)
+        y_masked = np.where(mask, y_part, 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            x_centred = np.where(mask, x_masked - np.sum(x_masked, axis=-1, keepdims=True) / count[:, None], 0.0)
+            y_centred = np.where(mask, y_masked - np.sum(y_masked, axis=-1, keepdims=True) / count[:, None], 0.0)
+            denominator = np.sqrt(np.sum(x_centred ** 2, axis=-1) * np.sum(y_centred ** 2, axis=-1))
+            r = np.sum(x_centred * y_centred, axis=-1) / denominator
+        values[:, index] = np.where((count >= min_pairs) & (denominator > 0), r, np.nan)
+        pairs[:, index] = count
+    return lags, values, pairs
+
+def correlation_p_value(r, n_effective):
+    """Two-sided p-value of a Pearson correlation from its t statistic."""
+    if not np.isfinite(r) or n_effective <= 2:
+        return None
+    if abs(r) >= 1:
+        return 0.0
+    t_statistic = r * np.sqrt((n_effective - 2) / (1 - r ** 2))
+    return float(2 * t_dist.sf(abs(t_statistic), n_effective - 2))
+
+def _optional(value):
+    """Float, or None for a value that could not be computed."""
+    return float(value) if value is not None and np.isfinite(value) else None
+
+def compute_hrv_eeg_time_series(ecg_results, eeg_results, eeg_channel=0, epoch_seconds=10.0, step_seconds=5.0,
+                                max_lag_seconds=30.0, bands=EEG_BANDS):
+    """
+    Correlate epoch-wise HRV with epoch-wise EEG band power, scanning lags.
+    
+    Works from what the analyses already hold: HRV series come from the
+    stored R-peaks and band-power series from the stored EEG segment spectra
+    (computed once from the cleaned channel when a result has none), both on
+    one epoch grid starting at the beginning of the recordings.
     
     Parameters:
     -----------
@@ -227,107 +690,583 @@ def compute_hrv_eeg_correlation(ecg_results, eeg_results):
         ECG analysis results
     eeg_results : dict
         EEG analysis results
+    eeg_channel : int or str
+        EEG channel index or name
+    epoch_seconds : float
+        Epoch length in seconds
+    step_seconds : float
+        Step between epoch starts in seconds
+    max_lag_seconds : float
+        Largest lag scanned in either direction
+    bands : dict
+        EEG band name -> (low, high) in Hz
         
     Returns:
     --------
     dict
-        Dictionary containing HRV-EEG correlation results
-    """
-    # Extract HRV features
-    hrv_features = {}
-    if "features" in ecg_results:
-        hrv_features = {
-            "sdnn": ecg_results["features"].get("sdnn"),
-            "rmssd": ecg_results["features"].get("rmssd"),
-            "lf_hf_ratio": ecg_results["features"].get("lf_hf_ratio")
-        }
+        Epoch grid, the HRV and band-power series, and per HRV metric and
+        band the zero-lag correlation with its p-value and the lag scan
+    """
+    ecg_fs = ecg_results["metadata"]["sampling_rate"]
+    eeg_fs = eeg_results["metadata"]["sampling_rate"]
+    duration = min(ecg_results["metadata"]["duration_seconds"], eeg_results["metadata"]["duration_seconds"])
+    starts = epoch_grid(duration, epoch_seconds, step_seconds)
     
-    # Extract EEG band powers
-    eeg_bands = {}
-    if "bands" in eeg_results:
-        eeg_bands = eeg_results["bands"]
+    hrv = hrv_epoch_series(ecg_results.get("peaks", {}).get("r_peaks", []), ecg_fs, starts, epoch_seconds)
+    
+    n_eeg = np.shape(eeg_results["signal"]["cleaned"])[-1]
+    nperseg = int(min(eeg_fs, n_eeg))
+    spectra = stored_spectra(eeg_channel_spectral(eeg_results, eeg_channel), eeg_fs, nperseg)
+    if spectra is None:
+        _, spectra, _ = segment_spectra(select_eeg_channel(eeg_results, eeg_channel), eeg_fs, nperseg)
+    eeg = band_power_epoch_series(spectra, eeg_fs, nperseg, starts, epoch_seconds, bands)
+    
+    max_lag = int(round(max_lag_seconds / step_seconds)) if step_seconds > 0 else 0
+    # Overlapping epochs are not independent; p-values count non-overlapping ones
+    overlap_factor = min(1.0, step_seconds / epoch_seconds) if epoch_seconds > 0 else 1.0
+    band_names = list(bands)
+    band_matrix = np.array([eeg[band] for band in band_names]).reshape(len(band_names), len(starts))
     
-    # Compute correlations if we have both HRV and EEG data
     correlations = {}
-    if hrv_features and eeg_bands:
-        for hrv_name, hrv_value in hrv_features.items():
-            if hrv_value is not None:
-                band_correlations = {}
-                for band_name, band_value in eeg_bands.items():
-                    # Since we only have one data point for each, we can't compute
-                    # a statistical correlation. Instead, we'll compute a simple ratio.
-                    if band_value > 0:
-                        ratio = hrv_value / band_value
-                    else:
-                        ratio = 0
-                    band_correlations[band_name] = float(ratio)
-                correlations[hrv_name] = band_correlations
-    
-    return correlations
+    for metric, values in hrv.items():
+        lags, lagged, pairs = lagged_correlation(values, band_matrix, max_lag)
+        zero = int(np.flatnonzero(lags == 0)[0]) if len(lags) else None
+        correlations[metric] = {}
+        for index, band in enumerate(band_names):
+            r = lagged[index, zero] if zero is not None else np.nan
+            finite = np.isfinite(lagged[index])
+            best = int(np.argmax(np.where(finite, np.abs(lagged[index]), -1))) if finite.any() else None
+            correlations[metric][band] = {
+                "r": _optional(r),
+                "p_value": correlation_p_value(r, pairs[index, zero] * overlap_factor) if zero is not None else None,
+                "n_epochs": int(pairs[index, zero]) if zero is not None else 0,
+                "best_lag_seconds": float(lags[best] * step_seconds) if best is not None else None,
+                "best_r": _optional(lagged[index, best]) if best is not None else None,
+                "lag_r": lagged[index]
+            }
+    
+    return {
+        "epoch_seconds": epoch_seconds,
+        "step_seconds": step_seconds,
+        "times": starts + epoch_seconds / 2,
+        "lag_seconds": lags * step_seconds if len(starts) else np.array([]),
+        "hrv": hrv,
+        "eeg_band_power": eeg,
+        "correlations": correlations
+    }
 
-def main():
-    """Main function to correlate ECG and EEG signals."""
-    args = parse_arguments()
+def compute_hrv_eeg_correlation(ecg_results, eeg_results, eeg_channel=0, **kwargs):
+    """
+    Compute correlation between HRV metrics and EEG frequency bands.
+    
+    Zero-lag Pearson correlation of epoch-wise heart rate, SDNN and RMSSD
+    with epoch-wise relative band power (see compute_hrv_eeg_time_series,
+    which takes the same keyword arguments and also returns the lag scan).
+    
+    Parameters:
+    -----------
+    ecg_results : dict
+        ECG analysis results
+    eeg_results : dict
+        EEG analysis results
+    eeg_channel : int or str
+        EEG channel index or name
+        
+    Returns:
+    --------
+    dict
+        HRV metric -> band -> correlation (None when the recordings hold too
+        few epochs)
+    """
+    time_series = compute_hrv_eeg_time_series(ecg_results, eeg_results, eeg_channel, **kwargs)
+    return hrv_eeg_summary(time_series)
+
+def hrv_eeg_summary(time_series):
+    """HRV metric -> band -> zero-lag correlation, from compute_hrv_eeg_time_series."""
+    return {metric: {band: values["r"] for band, values in bands.items()}
+            for metric, bands in time_series["correlations"].items()}
+
+def prepare_matrix_signal(data, sampling_rate, nperseg, n_fft=None, spectral=None):
+    """
+    Precompute everything the pairwise matrix correlations reuse for one signal.
+    
+    Parameters:
+    -----------
+    data : array
+        Signal resampled to the common analysis rate
+    sampling_rate : float
+        Common analysis rate in Hz
+    nperseg : int
+        Coherence segment length in samples
+    n_fft : int, optional
+        Cross-correlation FFT length for signals of the common length
+    spectral : dict, optional
+        Stored ``spectral`` record of the analysis, used instead of new
+        segment spectra when it matches ``sampling_rate`` and ``nperseg``
+        
+    Returns:
+    --------
+    dict
+        Signal, ranks, segment spectra, PLV phasors and optional FFT
+    """
+    data = np.ascontiguousarray(data, dtype=float)
+    spectra = stored_spectra(spectral, sampling_rate, nperseg)
+    if spectra is None:
+        _, spectra, seg_starts = segment_spectra(data, sampling_rate, nperseg)
+    else:
+        seg_starts = np.arange(spectra.shape[-2]) * (nperseg - nperseg // 2)
+    return {
+        "data": data,
+        "ranks": rankdata(data),
+        "spectra": spectra,
+        "seg_starts": seg_starts,
+        "phasors": unit_phasors(band_analytic_signal(data, sampling_rate, *PLV_BAND)),
+        "fft": np.fft.rfft(data, n_fft) if n_fft else None
+    }
+
+def _init_matrix_worker(ecg_prepared, eeg_prepared, sampling_rate, nperseg, freqs, max_lag):
+    """Hand the precomputed signals to a worker process once, instead of once per pair."""
+    global _matrix_state
+    _matrix_state = {
+        "ecg": ecg_prepared,
+        "eeg": eeg_prepared,
+        "sampling_rate": sampling_rate,
+        "nperseg": nperseg,
+        "freqs": freqs,
+        "max_lag": max_lag
+    }
+
+def _correlate_pair(pair):
+    """
+    Correlate one ECG-EEG pair of the matrix from the precomputed signals.
+    
+    Pairs of different length are compared over their common prefix, like
+    resample_signals does for a single pair.
+    
+    Returns:
+    --------
+    tuple
+        ECG index, EEG index, dict of scalar results and an error message or None
+    """
+    i, j = pair
+    state = _matrix_state
+    ecg, eeg = state["ecg"][i], state["eeg"][j]
+    n_samples = min(len(ecg["data"]), len(eeg["data"]))
+    x, y = ecg["data"][:n_samples], eeg["data"][:n_samples]
     
     try:
-        # Load configuration
-        with open(args.config, 'r') as f:
-            config = json.load(f)
+        values = {}
+        values["pearson"] = float(pearsonr(x, y)[0])
         
-        ecg_analysis_id = config["ecgAnalysisId"]
-        eeg_analysis_id = config["eegAnalysisId"]
-        output_path = config["outputPath"]
+        # Spearman correlation is the Pearson correlation of the ranks
+        if len(ecg["data"]) == len(eeg["data"]):
+            x_ranks, y_ranks = ecg["ranks"], eeg["ranks"]
+        else:
+            x_ranks, y_ranks = rankdata(x), rankdata(y)
+        values["spearman"] = float(pearsonr(x_ranks, y_ranks)[0])
         
-        # Load analysis results
-        results_dir = os.path.join(os.path.dirname(os.path.dirname(args.config)), "results")
-        ecg_results_path = os.path.join(results_dir, f"{ecg_analysis_id}.json")
-        eeg_results_path = os.path.join(results_dir, f"{eeg_analysis_id}.json")
+        # Cross-correlation, reusing both spectra when the pair has the common length
+        if ecg["fft"] is not None and eeg["fft"] is not None and len(ecg["data"]) == len(eeg["data"]):
+            max_lag = min(state["max_lag"], n_samples - 1)
+            n_fft = 2 * (len(ecg["fft"]) - 1)
+            circular = np.fft.irfft(ecg["fft"] * np.conj(eeg["fft"]), n_fft)
+            cross_corr = np.concatenate([circular[n_fft - max_lag:], circular[:max_lag + 1]]) if max_lag > 0 else circular[:1]
+            lags = np.arange(-max_lag, max_lag + 1)
+            norm_factor = np.sqrt(np.sum(x**2) * np.sum(y**2))
+            cross_corr = cross_corr / norm_factor if norm_factor > 0 else np.zeros_like(cross_corr)
+        else:
+            lags, cross_corr = fft_cross_correlation(x, y, state["max_lag"])
+        best = np.argmax(np.abs(cross_corr))
+        values["cross_correlation_max"] = float(cross_corr[best])
+        values["cross_correlation_lag_samples"] = int(lags[best])
         
-        ecg_results = load_analysis_results(ecg_results_path)
-        eeg_results = load_analysis_results(eeg_results_path)
+        # Coherence from the segments lying inside the common length
+        n_segments = np.searchsorted(ecg["seg_starts"], n_samples - state["nperseg"], side='right')
+        n_segments = min(n_segments, np.searchsorted(eeg["seg_starts"], n_samples - state["nperseg"], side='right'))
+        coh = coherence_from_spectra(ecg["spectra"][:n_segments], eeg["spectra"][:n_segments])
+        for band, value in band_means(coh, state["freqs"], COHERENCE_BANDS).items():
+            values[f"coherence_{band}_band"] = float(value)
         
-        # Extract signals
-        ecg_signal = np.array(ecg_results["signal"]["cleaned"])
-        eeg_signal = np.array(eeg_results["signal"]["cleaned"])
+        # Phase-locking value of the precomputed instantaneous phases
+        values["phase_locking_value"] = float(np.abs(np.mean(ecg["phasors"][:n_samples] *
+                                                             np.conj(eeg["phasors"][:n_samples]))))
+        return i, j, values, None
+    except Exception as e:
+        return i, j, {}, str(e)
+
+def compute_correlation_matrix(ecg_signals, eeg_signals, sampling_rate, max_lag=None, workers=None,
+                               ecg_spectral=None, eeg_spectral=None):
+    """
+    Correlate every ECG signal with every EEG signal.
+    
+    Each signal is prepared once (ranks, coherence segment spectra, PLV phases
+    and, for the common length, the cross-correlation FFT); pairs then only
+    combine precomputed arrays and are spread across a process pool, or a
+    thread pool inside a daemon worker process.
+    
+    Parameters:
+    -----------
+    ecg_signals : list
+        ECG signals at the common analysis rate
+    eeg_signals : list
+        EEG signals at the common analysis rate
+    sampling_rate : float
+        Common analysis rate in Hz
+    max_lag : int, optional
+        Largest cross-correlation lag in samples (default: every lag)
+    workers : int, optional
+        Number of worker processes, or threads inside a daemon process
+        (default: all cores)
+    ecg_spectral, eeg_spectral : list, optional
+        Stored ``spectral`` record (or None) per signal
         
-        # Get sampling rates
-        ecg_fs = ecg_results["metadata"]["sampling_rate"]
-        eeg_fs = eeg_results["metadata"]["sampling_rate"]
+    Returns:
+    --------
+    dict
+        Dictionary of (n_ecg x n_eeg) result matrices and a list of failed pairs
+    """
+    lengths = [len(data) for data in list(ecg_signals) + list(eeg_signals)]
+    shortest = min(lengths)
+    nperseg = int(min(sampling_rate, shortest // 2))
+    if nperseg < 2:
+        raise ValueError("Signals are too short to correlate")
+    freqs = np.fft.rfftfreq(nperseg, 1.0 / sampling_rate)
+    
+    # Cross-correlation spectra are shared only when every signal has the same length
+    if max_lag is None or max_lag > shortest - 1:
+        max_lag = shortest - 1
+    n_fft = next_fast_len(shortest + max_lag) if len(set(lengths)) == 1 else None
+    
+    ecg_spectral = ecg_spectral or [None] * len(ecg_signals)
+    eeg_spectral = eeg_spectral or [None] * len(eeg_signals)
+    ecg_prepared = [prepare_matrix_signal(data, sampling_rate, nperseg, n_fft, record)
+                    for data, record in zip(ecg_signals, ecg_spectral)]
+    eeg_prepared = [prepare_matrix_signal(data, sampling_rate, nperseg, n_fft, record)
+                    for data, record in zip(eeg_signals, eeg_spectral)]
+    
+    shape = (len(ecg_prepared), len(eeg_prepared))
+    names = ["pearson", "spearman", "cross_correlation_max", "cross_correlation_lag_samples"]
+    names += [f"coherence_{band}_band" for band in COHERENCE_BANDS] + ["phase_locking_value"]
+    matrices = {name: np.full(shape, np.nan) for name in names}
+    failures = []
+    
+    pairs = [(i, j) for i in range(shape[0]) for j in range(shape[1])]
+    initargs = (ecg_prepared, eeg_prepared, sampling_rate, nperseg, freqs, max_lag)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(pairs)))
+    if workers == 1:
+        _init_matrix_worker(*initargs)
+        outcomes = map(_correlate_pair, pairs)
+    else:
+        if current_process().daemon:
+            # Pool workers (e.g. inside signal_worker.py) cannot start processes of their
+            # own; the per-pair FFTs and array reductions release the GIL, so threads still scale
+            _init_matrix_worker(*initargs)
+            pool = ThreadPool(processes=workers)
+        else:
+            pool = Pool(processes=workers, initializer=_init_matrix_worker, initargs=initargs)
+        outcomes = pool.imap_unordered(_correlate_pair, pairs, chunksize=max(1, len(pairs) // (4 * workers)))
+    
+    try:
+        for i, j, values, error in outcomes:
+            if error:
+                failures.append({"ecg_index": i, "eeg_index": j, "error": error})
+            for name, value in values.items():
+                matrices[name][i, j] = value
+    finally:
+        if workers > 1:
+            pool.close()
+            pool.join()
+    
+    return {"matrices": matrices, "failures": failures, "nperseg": nperseg, "max_lag_samples": max_lag}
+
+def correlate_matrix_from_config(config, store_path, results_dir):
+    """
+    Run a many-to-many correlation of the ECG and EEG analyses listed in a config.
+    
+    Parameters:
+    -----------
+    config : dict
+        Configuration with ``ecgAnalysisIds``, ``eegAnalysisIds``, ``outputPath``
+        and optionally ``analysisRate``, ``maxLagSeconds``, ``eegChannel``, ``workers`` and ``dtype``
+    store_path : str
+        Analysis store the inputs are looked up in first
+    results_dir : str
+        Directory holding the analysis result files not in the store
+        
+    Returns:
+    --------
+    dict
+        Dictionary containing the correlation matrices
+    """
+    ecg_ids = list(config["ecgAnalysisIds"])
+    eeg_ids = list(config["eegAnalysisIds"])
+    dtype = np.dtype(config.get("dtype", "float64"))
+    # Load each analysis once
+    ecg_loaded = []
+    for analysis_id in ecg_ids:
+        results, _ = resolve_analysis(analysis_id, store_path, results_dir)
+        ecg_loaded.append((np.asarray(results["signal"]["cleaned"], dtype=dtype),
+                           results["metadata"]["sampling_rate"], results.get("spectral")))
+    eeg_loaded = []
+    for analysis_id in eeg_ids:
+        results, _ = resolve_analysis(analysis_id, store_path, results_dir)
+        eeg_loaded.append((select_eeg_channel(results, config.get("eegChannel", 0), dtype),
+                           results["metadata"]["sampling_rate"],
+                           eeg_channel_spectral(results, config.get("eegChannel", 0))))
+    
+    # Resample each signal once to the common analysis rate
+    rates = [fs for _, fs, _ in ecg_loaded + eeg_loaded]
+    target_fs = config.get("analysisRate", "max")
+    if target_fs == 'max':
+        target_fs = max(rates)
+    elif target_fs == 'min':
+        target_fs = min(rates)
+    ecg_signals = [resample_polyphase(data, fs, target_fs) if fs != target_fs else data for data, fs, _ in ecg_loaded]
+    eeg_signals = [resample_polyphase(data, fs, target_fs) if fs != target_fs else data for data, fs, _ in eeg_loaded]
+    # Stored segment spectra are only valid for signals that were not resampled
+    ecg_spectral = [record if fs == target_fs else None for _, fs, record in ecg_loaded]
+    eeg_spectral = [record if fs == target_fs else None for _, fs, record in eeg_loaded]
+    
+    max_lag_seconds = config.get("maxLagSeconds", DEFAULT_MAX_LAG_SECONDS)
+    max_lag = int(round(max_lag_seconds * target_fs)) if max_lag_seconds is not None else None
+    matrix = compute_correlation_matrix(ecg_signals, eeg_signals, target_fs, max_lag, config.get("workers"),
+                                        ecg_spectral, eeg_spectral)
+    
+    failures = [
+        {"ecg_analysis_id": ecg_ids[f["ecg_index"]], "eeg_analysis_id": eeg_ids[f["eeg_index"]], "error": f["error"]}
+        for f in matrix["failures"]
+    ]
+    return {
+        "ecg_analysis_ids": ecg_ids,
+        "eeg_analysis_ids": eeg_ids,
+        "matrices": matrix["matrices"],
+        "failures": failures,
+        "metadata": {
+            "mode": "matrix",
+            "sampling_rate": target_fs,
+            "coherence_nperseg": matrix["nperseg"],
+            "max_lag_samples": matrix["max_lag_samples"],
+            "plv_band": list(PLV_BAND)
+        }
+    }
+
+def load_config(config):
+    """Return a correlation configuration given as a dict, a JSON file path or a JSON string."""
+    if isinstance(config, dict):
+        return config
+    if config.lstrip().startswith("{"):
+        return json.loads(config)
+    with open(config, 'r') as f:
+        return json.load(f)
+
+def correlate_from_config(config, cache_dir=DEFAULT_CACHE_DIR, timing_log=None):
+    """
+    Run the correlation analysis described by a configuration.
+    
+    Parameters:
+    -----------
+    config : dict or str
+        Configuration, or a JSON file or string holding it (see load_config).
+        Analyses are read from, and the correlation is written to, the
+        analysis store ``storePath`` (default: the store next to
+        ``outputPath``, whose file name is the correlation ID). The result
+        file at ``outputPath`` is only written with ``exportResult: true`` or
+        ``useStore: false``.
+    cache_dir : str, optional
+        Result cache directory; a pair of analyses already correlated with the
+        same parameters is served from it. None disables the cache.
+    timing_log : str, optional
+        JSON-lines file the per-stage measurements are appended to, including
+        result writing (default: $SIGNAL_TIMING_LOG, if set)
         
-        # Resample signals to the same sampling rate
+    Returns:
+    --------
+    dict
+        Dictionary containing the correlation results; ``metadata.timings``
+        holds wall time, CPU time and peak memory of every stage
+    """
+    # Load configuration
+    config = load_config(config)
+    
+    output_path = config["outputPath"]
+    precision = config.get("precision")
+    store_path = config.get("storePath") or default_store_path(output_path)
+    use_store = config.get("useStore", True)
+    export = config.get("exportResult", False) or not use_store
+    correlation_id = os.path.splitext(os.path.basename(output_path))[0]
+    destination = output_path if export else f"analysis {correlation_id} in {store_path}"
+    # Exported result files of the analyses, e.g. from before the store existed
+    results_dir = os.path.dirname(os.path.abspath(output_path))
+    timings = {}
+    
+    # Matrix mode: every listed ECG against every listed EEG
+    if "ecgAnalysisIds" in config:
+        with stage(timings, "matrix"):
+            correlation_results = correlate_matrix_from_config(config, store_path, results_dir)
+        correlation_results["metadata"]["timings"] = timings
+        with stage(timings, "save"):
+            if export:
+                save_results(correlation_results, output_path, precision=precision)
+            if use_store:
+                store_analysis(store_path, correlation_id, correlation_results, kind='correlation',
+                               subject=config.get("subject"), result_path=output_path if export else None)
+        append_timing_log({"script": "correlate_signals", "mode": "matrix", "timings": timings}, timing_log)
+        print(f"Correlation matrix complete. Results saved to {destination}")
+        return correlation_results
+    
+    ecg_analysis_id = config["ecgAnalysisId"]
+    eeg_analysis_id = config["eegAnalysisId"]
+    
+    # Load analysis results
+    with stage(timings, "load"):
+        ecg_results, ecg_results_path = resolve_analysis(ecg_analysis_id, store_path, results_dir)
+        eeg_results, eeg_results_path = resolve_analysis(eeg_analysis_id, store_path, results_dir)
+    
+    def save_correlation(correlation_results):
+        if export:
+            save_results(correlation_results, output_path, precision=precision)
+        if use_store:
+            store_analysis(store_path, correlation_id, correlation_results, kind='correlation',
+                           subject=config.get("subject"), result_path=output_path if export else None,
+                           ecg_id=ecg_analysis_id, eeg_id=eeg_analysis_id)
+    
+    # Serve repeated correlation requests from the content-addressed cache. An
+    # input kept only in the store is identified by its own cache key.
+    cache_key = None
+    identified = all(results.get("metadata", {}).get("cache_key") or path
+                     for results, path in ((ecg_results, ecg_results_path), (eeg_results, eeg_results_path)))
+    if cache_dir and config.get("useCache", True) and identified:
+        cache_key = correlation_key(ecg_results, ecg_results_path, eeg_results, eeg_results_path, config)
+        if export:
+            correlation_results = load_results(output_path) if lookup(cache_dir, cache_key, output_path) else None
+        else:
+            correlation_results = load_cached(cache_dir, cache_key)
+        if correlation_results is not None:
+            # Same content may have been uploaded under different analysis IDs
+            correlation_results["metadata"].update(ecg_analysis_id=ecg_analysis_id, eeg_analysis_id=eeg_analysis_id)
+            save_correlation(correlation_results)
+            print(f"Cache hit. Correlation results saved to {destination}")
+            return correlation_results
+    
+    # Extract signals (zero-copy for memory-mapped arrays of the requested dtype)
+    dtype = np.dtype(config.get("dtype", "float64"))
+    ecg_signal = np.asarray(ecg_results["signal"]["cleaned"], dtype=dtype)
+    eeg_signal = select_eeg_channel(eeg_results, config.get("eegChannel", 0), dtype)
+    
+    # Get sampling rates
+    ecg_fs = ecg_results["metadata"]["sampling_rate"]
+    eeg_fs = eeg_results["metadata"]["sampling_rate"]
+    
+    # Resample signals to the same sampling rate
+    with stage(timings, "resample"):
         ecg_resampled, eeg_resampled, target_fs = resample_signals(
-            ecg_signal, eeg_signal, ecg_fs, eeg_fs
+            ecg_signal, eeg_signal, ecg_fs, eeg_fs, config.get("analysisRate", "max")
         )
-        
-        # Compute time domain correlation
-        time_domain_corr = compute_time_domain_correlation(ecg_resampled, eeg_resampled)
-        
-        # Compute frequency domain correlation
+    
+    # Compute time domain correlation over physiological lags; an explicit null keeps every lag
+    max_lag_seconds = config.get("maxLagSeconds", DEFAULT_MAX_LAG_SECONDS)
+    max_lag = int(round(max_lag_seconds * target_fs)) if max_lag_seconds is not None else None
+    with stage(timings, "time_domain"):
+        time_domain_corr = compute_time_domain_correlation(ecg_resampled, eeg_resampled, max_lag)
+    
+    # Compute frequency domain correlation
+    # Stored segment spectra are only valid for signals that were not resampled
+    ecg_spectral = ecg_results.get("spectral") if ecg_fs == target_fs else None
+    eeg_spectral = eeg_channel_spectral(eeg_results, config.get("eegChannel", 0)) if eeg_fs == target_fs else None
+    with stage(timings, "frequency_domain"):
         freq_domain_corr = compute_frequency_domain_correlation(
-            ecg_resampled, eeg_resampled, target_fs
+            ecg_resampled, eeg_resampled, target_fs, timings, ecg_spectral, eeg_spectral
         )
-        
-        # Compute HRV-EEG correlation
-        hrv_eeg_corr = compute_hrv_eeg_correlation(ecg_results, eeg_results)
-        
-        # Prepare correlation results
-        correlation_results = {
-            "time_domain": time_domain_corr,
-            "frequency_domain": freq_domain_corr,
-            "hrv_eeg_correlation": hrv_eeg_corr,
-            "metadata": {
-                "ecg_analysis_id": ecg_analysis_id,
-                "eeg_analysis_id": eeg_analysis_id,
-                "sampling_rate": target_fs,
-                "signal_length": len(ecg_resampled)
-            }
+    
+    # Compute epoch-wise HRV-EEG correlation from the stored R-peaks and spectra
+    hrv_eeg_config = config.get("hrvEeg", {})
+    with stage(timings, "hrv_eeg"):
+        hrv_eeg_series = compute_hrv_eeg_time_series(
+            ecg_results, eeg_results, config.get("eegChannel", 0),
+            epoch_seconds=hrv_eeg_config.get("epochSeconds", 10.0),
+            step_seconds=hrv_eeg_config.get("stepSeconds", 5.0),
+            max_lag_seconds=hrv_eeg_config.get("maxLagSeconds", 30.0)
+        )
+        hrv_eeg_corr = hrv_eeg_summary(hrv_eeg_series)
+    
+    # Optional time-resolved correlation over sliding windows
+    sliding_config = config.get("slidingWindow")
+    time_resolved = None
+    if sliding_config:
+        with stage(timings, "sliding_window"):
+            time_resolved = compute_sliding_window_correlation(
+                ecg_resampled, eeg_resampled, target_fs,
+                window_seconds=sliding_config.get("windowSeconds", 10.0),
+                step_seconds=sliding_config.get("stepSeconds", 1.0),
+                max_lag_seconds=sliding_config.get("maxLagSeconds", 2.0),
+                segment_seconds=sliding_config.get("segmentSeconds", 1.0)
+            )
+    
+    # Optional significance of coherence and PLV against EEG surrogates
+    surrogate_config = config.get("surrogates")
+    significance = None
+    if surrogate_config:
+        observed = {
+            "coherence": {band: freq_domain_corr["coherence"][f"{band}_band"] for band in COHERENCE_BANDS},
+            "phase_locking": dict(freq_domain_corr["phase_locking_bands"],
+                                  broadband=freq_domain_corr["phase_locking_value"])
         }
-        
-        # Save results to JSON
-        with open(output_path, 'w') as f:
-            json.dump(correlation_results, f)
-        
-        print(f"Correlation analysis complete. Results saved to {output_path}")
+        with stage(timings, "surrogates"):
+            significance = surrogate_test(
+                ecg_resampled, eeg_resampled, target_fs, observed, COHERENCE_BANDS,
+                dict(PLV_BANDS, broadband=PLV_BAND),
+                n_surrogates=surrogate_config.get("count", DEFAULT_SURROGATES),
+                method=surrogate_config.get("method", "phase"),
+                min_shift_seconds=surrogate_config.get("minShiftSeconds", 1.0),
+                seed=surrogate_config.get("seed", 0),
+                workers=config.get("workers")
+            )
+    
+    # Prepare correlation results
+    correlation_results = {
+        "time_domain": time_domain_corr,
+        "frequency_domain": freq_domain_corr,
+        "hrv_eeg_correlation": hrv_eeg_corr,
+        "hrv_eeg_time_series": hrv_eeg_series,
+        "metadata": {
+            "ecg_analysis_id": ecg_analysis_id,
+            "eeg_analysis_id": eeg_analysis_id,
+            "sampling_rate": target_fs,
+            "signal_length": len(ecg_resampled),
+            "timings": timings
+        }
+    }
+    if time_resolved is not None:
+        correlation_results["time_resolved"] = time_resolved
+    if significance is not None:
+        correlation_results["significance"] = significance
+    
+    # Save results; their own write time can only go to the timing log
+    with stage(timings, "save"):
+        save_correlation(correlation_results)
+    if cache_key and export:
+        store(cache_dir, cache_key, output_path)
+    elif cache_key:
+        store_results(cache_dir, cache_key, correlation_results, precision=precision)
+    
+    append_timing_log({
+        "script": "correlate_signals",
+        "mode": "pair",
+        "signal_length": len(ecg_resampled),
+        "timings": timings
+    }, timing_log)
+    
+    print(f"Correlation analysis complete. Results saved to {destination}")
+    
+    return correlation_results
+
+def main():
+    """Main function to correlate ECG and EEG signals."""
+    args = parse_arguments()
+    
+    try:
+        with profiled(args.profile):
+            correlate_from_config(args.config, timing_log=args.timing_log)
         
     except Exception as e:
         print(f"Error: {str(e)}")
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Streaming CSV Ingestion for ECG and EEG recordings
+Reads only the selected signal columns in bounded-size chunks into a
+preallocated (optionally on-disk) array
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+from instrumentation import stage
+
+# Rows parsed per chunk; bounds parser memory regardless of file length
+DEFAULT_CHUNK_ROWS = 262144
+# Rows read up front to pick the signal columns and estimate the sampling rate
+SNIFF_ROWS = 1000
+# Column names treated as timestamps rather than signal
+TIME_COLUMN_NAMES = ('time', 'timestamp', 't', 'seconds', 'time_s')
+# Sampling rates (Hz) accepted from a Time column; anything else is likely not seconds
+MIN_SAMPLING_RATE = 1
+MAX_SAMPLING_RATE = 100000
+
+def count_data_rows(file_path, block_size=1 << 24):
+    """Count the data rows of a CSV file (excluding the header) without parsing it."""
+    n_lines = 0
+    last_byte = b'\n'
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            n_lines += block.count(b'\n')
+            last_byte = block[-1:]
+    # A final line without a trailing newline still counts
+    if last_byte != b'\n':
+        n_lines += 1
+    return max(n_lines - 1, 0)
+
+def select_signal_columns(columns, signal_type, numeric_columns=None):
+    """
+    Pick the signal columns and the time column from column names.
+
+    Columns named after the signal type are preferred; otherwise every numeric
+    column except the time column is a candidate. ECG selects a single column,
+    EEG every candidate.
+
+    Parameters:
+    -----------
+    columns : list
+        Column names in file order
+    signal_type : str
+        Type of signal ('ecg' or 'eeg')
+    numeric_columns : list, optional
+        Columns holding numbers (default: all of them)
+
+    Returns:
+    --------
+    tuple
+        (list of signal columns, time column or None)
+    """
+    time_column = next((col for col in columns if str(col).strip().lower() in TIME_COLUMN_NAMES), None)
+
+    potential_cols = [col for col in columns if signal_type in str(col).lower()]
+    if not potential_cols:
+        # If no column with the signal type in its name, use the numeric non-time columns
+        numeric_columns = columns if numeric_columns is None else numeric_columns
+        potential_cols = [col for col in numeric_columns if col != time_column]
+        if not potential_cols:
+            raise ValueError("No numeric columns found in the CSV file")
+    signal_columns = potential_cols if signal_type == 'eeg' else potential_cols[:1]
+    return signal_columns, time_column
+
+def sniff_csv(file_path, signal_type):
+    """
+    Inspect the header and first rows of a CSV file.
+
+    Parameters:
+    -----------
+    file_path : str
+        Path to the CSV/TXT file
+    signal_type : str
+        Type of signal ('ecg' or 'eeg')
+
+    Returns:
+    --------
+    dict
+        Dictionary with the selected ``signal_columns``, the ``time_column``
+        (or None) and the ``sampling_rate`` estimated from it (or None, also
+        when the estimate falls outside MIN_SAMPLING_RATE..MAX_SAMPLING_RATE).
+        ECG files select a single column; EEG files select every channel.
+    """
+    head = pd.read_csv(file_path, nrows=SNIFF_ROWS)
+    signal_columns, time_column = select_signal_columns(list(head.columns), signal_type,
+                                                        list(head.select_dtypes(include=[np.number]).columns))
+
+    sampling_rate = None
+    if time_column is not None:
+        time_values = pd.to_numeric(head[time_column], errors='coerce').to_numpy(dtype=float)
+        steps = np.diff(time_values[np.isfinite(time_values)])
+        steps = steps[steps > 0]
+        if len(steps) > 0:
+            estimate = 1.0 / np.median(steps)
+            if MIN_SAMPLING_RATE <= estimate <= MAX_SAMPLING_RATE:
+                sampling_rate = int(round(estimate))
+            else:
+                # e.g. a millisecond or sample-index column; let the caller's default apply
+                print(f"Warning: Ignoring sampling rate of {estimate:g} Hz implied by column '{time_column}' "
+                      f"(expected {MIN_SAMPLING_RATE}-{MAX_SAMPLING_RATE} Hz)")
+
+    return {"signal_columns": signal_columns, "time_column": time_column, "sampling_rate": sampling_rate}
+
+def read_csv_columns(file_path, columns, dtype=np.float64, chunk_rows=DEFAULT_CHUNK_ROWS, buffer_path=None):
+    """
+    Stream selected columns of a CSV file into a preallocated array.
+
+    Parameters:
+    -----------
+    file_path : str
+        Path to the CSV/TXT file
+    columns : list of str
+        Names of the columns to read
+    dtype : numpy dtype
+        Output dtype
+    chunk_rows : int
+        Number of rows parsed per chunk
+    buffer_path : str, optional
+        If given, the output is a .npy file memory-mapped at this path instead
+        of an in-memory array
+
+    Returns:
+    --------
+    tuple
+        The (columns x samples) data and a dictionary of ingestion statistics;
+        ``peak_memory_mb`` is the peak reached while reading this file
+    """
+    timings = {}
+    with stage(timings, "ingest"):
+        n_rows = count_data_rows(file_path)
+
+        shape = (len(columns), n_rows)
+        if buffer_path is not None:
+            data = np.lib.format.open_memmap(buffer_path, mode='w+', dtype=dtype, shape=shape)
+        else:
+            data = np.empty(shape, dtype=dtype)
+
+        n_read = 0
+        reader = pd.read_csv(file_path, usecols=columns, dtype={col: dtype for col in columns},
+                             chunksize=chunk_rows, engine='c')
+        for chunk in reader:
+            values = chunk[columns].to_numpy().T
+            data[:, n_read:n_read + values.shape[1]] = values
+            n_read += values.shape[1]
+
+        # Blank lines are counted up front but skipped by the parser
+        data = data[:, :n_read]
+
+    elapsed = timings["ingest"]["wall_seconds"]
+    file_mb = os.path.getsize(file_path) / (1024 * 1024)
+    stats = {
+        "rows": n_read,
+        "file_mb": file_mb,
+        "seconds": elapsed,
+        "mb_per_second": file_mb / elapsed if elapsed > 0 else None,
+        "rows_per_second": n_read / elapsed if elapsed > 0 else None,
+        "peak_memory_mb": timings["ingest"]["peak_rss_mb"]
+    }
+    return data, stats
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Min/Max Decimation Pyramid for chart-ready signal payloads
+Builds envelope-preserving multi-resolution views of long signals so a chart
+only has to fetch the points its viewport can actually display
+"""
+
+import numpy as np
+
+# Bucket size of the finest pyramid level (coarser levels grow by LEVEL_FACTOR)
+MIN_BUCKET_SIZE = 16
+LEVEL_FACTOR = 4
+# Levels are added until a level has at most this many buckets
+MAX_TOP_BUCKETS = 1024
+# Finest-level buckets reduced per pass, so long memory-mapped signals are read in pieces
+BUCKETS_PER_CHUNK = 1 << 16
+# Peaks drawn as chart markers; they are stored beside the levels, not inside them
+MARKER_PEAKS = "r_peaks"
+
+def _bucket_extrema(values, positions, group_size):
+    """
+    Reduce consecutive groups of candidate samples to their min and max.
+
+    Parameters:
+    -----------
+    values : array
+        Signal values at the candidate positions
+    positions : array
+        Sample indices of the candidates
+    group_size : int
+        Number of consecutive candidates per output bucket
+
+    Returns:
+    --------
+    tuple
+        Sample indices of the minimum and the maximum of each bucket
+    """
+    n_buckets = -(-len(values) // group_size)
+    pad = n_buckets * group_size - len(values)
+    # Pad with the last value so the padding can never win over a real sample
+    grouped = np.pad(values, (0, pad), mode='edge').reshape(n_buckets, group_size)
+    grouped_positions = np.pad(positions, (0, pad), mode='edge').reshape(n_buckets, group_size)
+
+    rows = np.arange(n_buckets)
+    min_idx = grouped_positions[rows, np.argmin(grouped, axis=1)]
+    max_idx = grouped_positions[rows, np.argmax(grouped, axis=1)]
+    return min_idx, max_idx
+
+def build_minmax_pyramid(data, peaks=None, min_bucket_size=MIN_BUCKET_SIZE,
+                         factor=LEVEL_FACTOR, max_top_buckets=MAX_TOP_BUCKETS):
+    """
+    Build a min/max decimation pyramid for a 1-D signal.
+
+    Every level keeps, for each bucket of ``bucket_size`` samples, the samples
+    holding the bucket minimum and maximum in time order, so the drawn envelope
+    matches the full-resolution signal and a level has at most two points per
+    bucket. Each level is reduced from the previous one, so the whole pyramid
+    costs O(N). Peak markers are kept once, with their signal values, beside
+    the levels.
+
+    Parameters:
+    -----------
+    data : array
+        1-D signal
+    peaks : array-like, optional
+        Sample indices of the peaks drawn as markers
+    min_bucket_size : int
+        Bucket size of the finest level
+    factor : int
+        Bucket size ratio between consecutive levels
+    max_top_buckets : int
+        Levels are added until one has at most this many buckets
+
+    Returns:
+    --------
+    dict
+        Dictionary with the signal length, a list of levels, each holding
+        ``bucket_size``, sample ``index`` and ``value`` arrays, and with
+        ``peaks`` given, their sorted ``index`` and ``value`` under ``peaks``
+    """
+    data = np.asarray(data)
+    n_samples = len(data)
+    levels = []
+    pyramid = {"length": n_samples, "levels": levels}
+    if peaks is not None:
+        peak_idx = np.asarray(peaks, dtype=float)
+        peak_idx = np.unique(peak_idx[np.isfinite(peak_idx)].astype(np.int64))
+        peak_idx = peak_idx[(peak_idx >= 0) & (peak_idx < n_samples)]
+        pyramid["peaks"] = {"index": peak_idx.astype(np.int32), "value": data[peak_idx]}
+    if n_samples <= min_bucket_size:
+        return pyramid
+
+    # Finest level is reduced straight from the samples, a bucket-aligned chunk at a time
+    chunk = min_bucket_size * BUCKETS_PER_CHUNK
+    extrema = [
+        _bucket_extrema(np.asarray(data[start:start + chunk]),
+                        np.arange(start, min(start + chunk, n_samples)), min_bucket_size)
+        for start in range(0, n_samples, chunk)
+    ]
+    min_idx = np.concatenate([chunk_min for chunk_min, _ in extrema])
+    max_idx = np.concatenate([chunk_max for _, chunk_max in extrema])
+    bucket_size = min_bucket_size
+
+    while True:
+        index = np.unique(np.concatenate([min_idx, max_idx]))
+        levels.append({
+            "bucket_size": bucket_size,
+            "index": index.astype(np.int32),
+            "value": data[index]
+        })
+        if len(min_idx) <= max_top_buckets:
+            break
+
+        # Coarser level from the previous level's extrema
+        min_idx, _ = _bucket_extrema(data[min_idx], min_idx, factor)
+        _, max_idx = _bucket_extrema(data[max_idx], max_idx, factor)
+        bucket_size *= factor
+
+    return pyramid
+
+def build_signal_pyramids(results):
+    """
+    Build decimation pyramids for every array in ``results["signal"]``.
+
+    Parameters:
+    -----------
+    results : dict
+        Results dictionary from preprocess_ecg or preprocess_eeg
+
+    Returns:
+    --------
+    dict
+        Pyramids keyed by signal name (e.g. 'cleaned'); multichannel signals
+        map to a list with one pyramid per channel. Single-channel signals
+        carry the MARKER_PEAKS of the results as markers.
+    """
+    n_samples = None
+    markers = results.get("peaks", {}).get(MARKER_PEAKS)
+
+    pyramids = {}
+    for name, values in results.get("signal", {}).items():
+        values = np.asarray(values)
+        if values.ndim not in (1, 2):
+            continue
+        if n_samples is None:
+            n_samples = values.shape[-1]
+        # Auxiliary series such as the beat-wise heart rate are not sample-aligned
+        if values.shape[-1] != n_samples:
+            continue
+        if values.ndim == 1:
+            pyramids[name] = build_minmax_pyramid(values, markers)
+        else:
+            pyramids[name] = [build_minmax_pyramid(channel) for channel in values]
+
+    return pyramids
+
+def query_pyramid(results, signal_name, start_time=None, end_time=None, max_points=2000, channel=0):
+    """
+    Return the points of a signal a viewport needs.
+
+    Picks the finest resolution with at most ``max_points`` points in the
+    requested time range: the full-resolution samples if they fit, otherwise
+    the finest pyramid level that does. When even the coarsest level has too
+    many points, its range is reduced further to min/max pairs on the fly. Only that range of the signal and the
+    index arrays of levels that can fit are indexed, so the arrays may be read
+    on demand (e.g. analysis_store.StoredArray). Peak markers in the range are
+    returned separately, and left out when more than ``max_points`` of them
+    would have to be drawn.
+
+    Parameters:
+    -----------
+    results : dict
+        Results dictionary containing ``signal``, ``pyramid`` and ``metadata``
+    signal_name : str
+        Name of the signal in ``results["signal"]`` (e.g. 'cleaned')
+    start_time, end_time : float, optional
+        Viewport range in seconds; defaults to the whole recording
+    max_points : int
+        Maximum number of points the viewport can render
+    channel : int
+        Channel index for multichannel signals
+
+    Returns:
+    --------
+    dict
+        Dictionary with the chosen ``level`` (0 for full resolution), its
+        ``bucket_size``, the ``index``, ``time`` and ``value`` arrays, and the
+        ``time`` and ``value`` of the peak markers under ``peaks``
+    """
+    sampling_rate = results["metadata"]["sampling_rate"]
+    data = results["signal"][signal_name]
+    if isinstance(data, list):
+        data = np.asarray(data)
+    pyramid = results.get("pyramid", {}).get(signal_name, {})
+    if data.ndim == 2:
+        data = data[channel]
+        pyramid = pyramid[channel] if pyramid else {}
+    n_samples = len(data)
+
+    start = 0 if start_time is None else int(np.clip(np.floor(start_time * sampling_rate), 0, n_samples))
+    end = n_samples if end_time is None else int(np.clip(np.ceil(end_time * sampling_rate) + 1, start, n_samples))
+
+    peaks = _peak_markers(pyramid.get("peaks"), start, end, max_points, sampling_rate)
+    if end - start <= max_points:
+        index = np.arange(start, end)
+        return {
+            "level": 0,
+            "bucket_size": 1,
+            "index": index,
+            "time": index / sampling_rate,
+            "value": np.asarray(data[start:end]),
+            "peaks": peaks
+        }
+
+    levels = pyramid.get("levels", [])
+    selection = None
+    for level_number, level in enumerate(levels, start=1):
+        # Every bucket inside the range keeps at least one sample, so finer levels cannot fit
+        if (end - start) // level["bucket_size"] - 1 > max_points and level_number < len(levels):
+            continue
+        level_index = np.asarray(level["index"])
+        lo, hi = np.searchsorted(level_index, [start, end])
+        selection = (level_number, level, level_index, lo, hi)
+        if hi - lo <= max_points:
+            break
+
+    if selection is None:
+        raise ValueError(f"No decimation pyramid stored for signal '{signal_name}'")
+
+    level_number, level, level_index, lo, hi = selection
+    index = level_index[lo:hi]
+    value = np.asarray(level["value"][lo:hi])
+    bucket_size = level["bucket_size"]
+    if hi - lo > max_points:
+        group_size = -(-(hi - lo) // max(1, max_points // 2))
+        min_pos, max_pos = _bucket_extrema(value, np.arange(hi - lo), group_size)
+        keep = np.unique(np.concatenate([min_pos, max_pos]))
+        index, value = index[keep], value[keep]
+        # A level holds about two points per bucket
+        bucket_size *= max(1, group_size // 2)
+    return {
+        "level": level_number,
+        "bucket_size": bucket_size,
+        "index": index,
+        "time": index / sampling_rate,
+        "value": value,
+        "peaks": peaks
+    }
+
+def _peak_markers(markers, start, end, max_points, sampling_rate):
+    """Time and value of the stored peak markers in samples [start, end), or empty beyond ``max_points``."""
+    if not markers:
+        return {"time": np.array([]), "value": np.array([])}
+    peak_index = np.asarray(markers["index"])
+    lo, hi = np.searchsorted(peak_index, [start, end])
+    if hi - lo > max_points:
+        lo = hi
+    return {"time": peak_index[lo:hi] / sampling_rate, "value": np.asarray(markers["value"][lo:hi])}
@@ -0,0 +1,326 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Out-of-Core Building Blocks for long multichannel recordings
+Chunked zero-phase filtering, NaN interpolation, streaming moments and Welch
+spectra over (channels x samples) .npy files, so memory use depends on the
+chunk size rather than the recording length. Every function reproduces its
+single-pass counterpart (sosfiltfilt, np.interp, np.mean/np.std,
+scipy.stats, scipy.signal.welch) up to floating-point rounding.
+"""
+
+import os
+import numpy as np
+from scipy import signal
+
+from result_io import npy_backing_file
+from spectral import psd_from_power, segment_spectra
+
+# Size of one (channels x chunk) block of float64 samples
+DEFAULT_CHUNK_MB = 64
+MIN_CHUNK_SAMPLES = 4096
+
+def chunk_length(n_channels, chunk_mb=DEFAULT_CHUNK_MB):
+    """Number of samples per chunk so one float64 block of every channel takes ``chunk_mb``."""
+    return max(MIN_CHUNK_SAMPLES, int(chunk_mb * 1024 * 1024 / (8 * max(n_channels, 1))))
+
+def chunk_ranges(n_samples, chunk_samples):
+    """List of (start, stop) sample ranges covering ``n_samples`` in order."""
+    return [(start, min(start + chunk_samples, n_samples)) for start in range(0, n_samples, chunk_samples)]
+
+def array_shape(path):
+    """Shape of a .npy file, read from its header."""
+    return np.load(path, mmap_mode='r').shape
+
+def create_array(path, shape, dtype=np.float64):
+    """Create an uninitialized .npy file of the given shape and return its path."""
+    data = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=tuple(int(size) for size in shape))
+    del data
+    return path
+
+def read_block(path, start, stop):
+    """
+    Read samples [start, stop) of every channel of a (channels x samples) .npy file.
+
+    The file is mapped only for the duration of the read, so pages already
+    processed do not accumulate in the resident set.
+    """
+    data = np.load(path, mmap_mode='r')
+    block = np.array(data[..., start:stop])
+    del data
+    return block
+
+def write_block(path, start, block):
+    """Write a (channels x n) block into a .npy file starting at sample ``start``."""
+    data = np.load(path, mmap_mode='r+')
+    data[..., start:start + block.shape[-1]] = block
+    data.flush()
+    del data
+
+def as_npy_file(data, path, chunk_samples):
+    """
+    Return a (channels x samples) .npy file holding ``data``.
+
+    A memory-mapped array that already is a whole .npy file of that shape is
+    used in place; anything else is copied to ``path`` chunk by chunk.
+    """
+    rows = data.reshape(1, -1) if data.ndim == 1 else data
+    source = npy_backing_file(data)
+    if source is not None and array_shape(source) == rows.shape:
+        return source
+
+    create_array(path, rows.shape, rows.dtype if rows.dtype.kind == 'f' else np.float64)
+    for start, stop in chunk_ranges(rows.shape[-1], chunk_samples):
+        write_block(path, start, rows[:, start:stop])
+    return path
+
+def _next_valid(path, channel, start, chunk_samples):
+    """Index and value of the first non-NaN sample of a channel at or after ``start``, or None."""
+    n_samples = array_shape(path)[-1]
+    for block_start, block_stop in chunk_ranges(n_samples - start, chunk_samples):
+        block = read_block(path, start + block_start, start + block_stop)[channel]
+        valid = np.flatnonzero(~np.isnan(block))
+        if len(valid):
+            return start + block_start + valid[0], block[valid[0]]
+    return None
+
+def interpolate_nans_chunked(path, chunk_samples):
+    """
+    Linearly interpolate NaN samples of a (channels x samples) .npy file in place.
+
+    Equivalent to process_signal.interpolate_nans on the whole array: the last
+    valid sample before each chunk is carried over, and a NaN run reaching the
+    end of a chunk looks ahead for the next valid sample. Edge NaNs take the
+    nearest valid value and all-NaN channels are left untouched.
+
+    Parameters:
+    -----------
+    path : str
+        Path of the .npy file
+    chunk_samples : int
+        Samples per chunk
+    """
+    n_channels, n_samples = array_shape(path)
+    last_index = np.full(n_channels, -1, dtype=np.int64)
+    last_value = np.zeros(n_channels)
+
+    for start, stop in chunk_ranges(n_samples, chunk_samples):
+        block = read_block(path, start, stop)
+        nan_mask = np.isnan(block)
+        for channel in np.flatnonzero(nan_mask.any(axis=-1)):
+            row = block[channel]
+            valid = ~nan_mask[channel]
+            positions = list(np.flatnonzero(valid) + start)
+            values = list(row[valid])
+            if last_index[channel] >= 0:
+                positions.insert(0, last_index[channel])
+                values.insert(0, last_value[channel])
+            if not valid[-1]:
+                following = _next_valid(path, channel, stop, chunk_samples)
+                if following is not None:
+                    positions.append(following[0])
+                    values.append(following[1])
+            if positions:
+                row[~valid] = np.interp(np.flatnonzero(~valid) + start, positions, values)
+        if nan_mask.any():
+            write_block(path, start, block)
+
+        # Carry the last valid sample of every channel into the next chunk
+        valid = ~np.isnan(block)
+        has_valid = valid.any(axis=-1)
+        last_in_block = block.shape[-1] - 1 - np.argmax(valid[:, ::-1], axis=-1)
+        last_index = np.where(has_valid, start + last_in_block, last_index)
+        last_value = np.where(has_valid, block[np.arange(n_channels), last_in_block], last_value)
+
+def sosfiltfilt_chunked(sos, source_path, destination_path, chunk_samples, work_dir):
+    """
+    Zero-phase SOS filtering of a (channels x samples) .npy file in chunks.
+
+    Reproduces ``scipy.signal.sosfiltfilt(sos, x, axis=-1)`` with its default
+    odd-extension padding: the forward pass carries the section states across
+    chunks into a temporary file, then the backward pass walks that file from
+    the end, again carrying state, and writes the trimmed result.
+
+    Parameters:
+    -----------
+    sos : array
+        Second-order sections
+    source_path : str
+        Input .npy file (must not contain NaN)
+    destination_path : str
+        Output .npy file, created with the input's shape and dtype; the
+        filtering itself always runs in float64
+    chunk_samples : int
+        Samples per chunk
+    work_dir : str
+        Directory for the forward-pass file
+    """
+    n_channels, n_samples = array_shape(source_path)
+    n_sections = sos.shape[0]
+    ntaps = 2 * n_sections + 1 - min((sos[:, 2] == 0).sum(), (sos[:, 5] == 0).sum())
+    edge = 3 * int(ntaps)
+    if n_samples <= edge:
+        raise ValueError(f"The length of the input vector x must be greater than padlen, which is {edge}.")
+
+    # Odd extensions at both ends, as in scipy.signal._arraytools.odd_ext
+    first = read_block(source_path, 0, 1).astype(np.float64)
+    last = read_block(source_path, n_samples - 1, n_samples).astype(np.float64)
+    left_ext = 2 * first - read_block(source_path, 1, edge + 1)[:, ::-1]
+    right_ext = 2 * last - read_block(source_path, n_samples - edge - 1, n_samples - 1)[:, ::-1]
+
+    zi = signal.sosfilt_zi(sos).reshape(n_sections, 1, 2)
+    forward_path = create_array(os.path.join(work_dir, "sosfiltfilt_forward.npy"),
+                                (n_channels, n_samples + 2 * edge))
+    try:
+        # Forward pass over [left_ext, x, right_ext]
+        y, state = signal.sosfilt(sos, left_ext, axis=-1, zi=zi * left_ext[:, :1])
+        write_block(forward_path, 0, y)
+        for start, stop in chunk_ranges(n_samples, chunk_samples):
+            y, state = signal.sosfilt(sos, read_block(source_path, start, stop), axis=-1, zi=state)
+            write_block(forward_path, edge + start, y)
+        y, state = signal.sosfilt(sos, right_ext, axis=-1, zi=state)
+        write_block(forward_path, edge + n_samples, y)
+
+        # Backward pass from the end of the forward output, keeping only the unpadded span
+        create_array(destination_path, (n_channels, n_samples), np.load(source_path, mmap_mode='r').dtype)
+        state = zi * y[:, -1:]
+        for start, stop in reversed(chunk_ranges(n_samples + 2 * edge, chunk_samples)):
+            block, state = signal.sosfilt(sos, read_block(forward_path, start, stop)[:, ::-1], axis=-1, zi=state)
+            block = block[:, ::-1]
+            keep_start, keep_stop = max(start, edge), min(stop, edge + n_samples)
+            if keep_start < keep_stop:
+                write_block(destination_path, keep_start - edge, block[:, keep_start - start:keep_stop - start])
+    finally:
+        os.remove(forward_path)
+
+def block_moments(block):
+    """
+    Count, mean and central sums of powers 2-4 of each channel of a block.
+
+    A NaN sample makes its channel's moments NaN, as np.mean/np.std would.
+    Moments are accumulated in float64 whatever the block's dtype.
+    """
+    block = np.asarray(block, dtype=np.float64)
+    n = block.shape[-1]
+    mean = np.mean(block, axis=-1)
+    deviation = block - mean[:, None]
+    squared = deviation * deviation
+    return {
+        "n": n,
+        "mean": mean,
+        "m2": np.sum(squared, axis=-1),
+        "m3": np.sum(squared * deviation, axis=-1),
+        "m4": np.sum(squared * squared, axis=-1)
+    }
+
+def merge_moments(a, b):
+    """
+    Combine the moments of two consecutive blocks (Chan et al. / Pebay update).
+
+    Either argument may be None for an empty block.
+    """
+    if a is None or a["n"] == 0:
+        return b
+    if b is None or b["n"] == 0:
+        return a
+    na, nb = a["n"], b["n"]
+    n = na + nb
+    delta = b["mean"] - a["mean"]
+    delta_n = delta / n
+    return {
+        "n": n,
+        "mean": a["mean"] + delta_n * nb,
+        "m2": a["m2"] + b["m2"] + delta * delta_n * na * nb,
+        "m3": (a["m3"] + b["m3"] + delta * delta_n * delta_n * na * nb * (na - nb)
+               + 3 * delta_n * (na * b["m2"] - nb * a["m2"])),
+        "m4": (a["m4"] + b["m4"] + delta * delta_n ** 3 * na * nb * (na * na - na * nb + nb * nb)
+               + 6 * delta_n * delta_n * (na * na * b["m2"] + nb * nb * a["m2"])
+               + 4 * delta_n * (na * b["m3"] - nb * a["m3"]))
+    }
+
+def moment_statistics(moments):
+    """
+    Mean, standard deviation (ddof=0) and bias-corrected skewness and excess
+    kurtosis from merged moments, matching ``scipy.stats.skew``/``kurtosis``
+    with ``bias=False``.
+
+    Returns:
+    --------
+    dict
+        Arrays keyed 'mean', 'std', 'skewness' and 'kurtosis'
+    """
+    n = moments["n"]
+    m2 = moments["m2"] / n
+    m3 = moments["m3"] / n
+    m4 = moments["m4"] / n
+    mean = moments["mean"]
+
+    # Constant channels have no defined shape statistics
+    zero = m2 <= (np.finfo(float).resolution * mean) ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        skewness = np.sqrt((n - 1.0) * n) / (n - 2.0) * m3 / m2 ** 1.5 if n > 2 else np.full_like(m2, np.nan)
+        kurt = (1.0 / (n - 2) / (n - 3) * ((n * n - 1.0) * m4 / m2 ** 2 - 3 * (n - 1) ** 2.0)
+                if n > 3 else np.full_like(m2, np.nan))
+    return {
+        "mean": mean,
+        "std": np.sqrt(m2),
+        "skewness": np.where(zero, np.nan, skewness),
+        "kurtosis": np.where(zero, np.nan, kurt)
+    }
+
+def welch_chunked(path, sampling_rate, nperseg, chunk_samples, spectra_path=None):
+    """
+    Welch PSD of every channel of a (channels x samples) .npy file.
+
+    Segments are formed across chunk boundaries by carrying the unfinished
+    tail into the next chunk, so the result equals ``scipy.signal.welch`` with
+    its defaults (Hann window, 50% overlap, constant detrend, density scaling).
+
+    Parameters:
+    -----------
+    path : str
+        Path of the .npy file
+    sampling_rate : float
+        Sampling rate in Hz
+    nperseg : int
+        Segment length in samples
+    chunk_samples : int
+        Samples per chunk
+    spectra_path : str, optional
+        If given, the complex64 segment spectra (channels x segments x freqs)
+        are written to this .npy file as they are computed
+
+    Returns:
+    --------
+    tuple
+        Frequencies and the (channels x freqs) PSD
+    """
+    n_channels, n_samples = array_shape(path)
+    step = nperseg - nperseg // 2
+    freqs = np.fft.rfftfreq(nperseg, 1.0 / sampling_rate)
+    total_segments = (n_samples - nperseg) // step + 1 if n_samples >= nperseg else 0
+    if spectra_path is not None:
+        create_array(spectra_path, (n_channels, total_segments, len(freqs)), np.complex64)
+
+    power_sum = np.zeros((n_channels, len(freqs)))
+    n_segments = 0
+    pending = np.empty((n_channels, 0))
+    for start, stop in chunk_ranges(n_samples, chunk_samples):
+        pending = np.concatenate([pending, read_block(path, start, stop)], axis=-1)
+        if pending.shape[-1] < nperseg:
+            continue
+        count = (pending.shape[-1] - nperseg) // step + 1
+        _, spectra, _ = segment_spectra(pending[:, :(count - 1) * step + nperseg], sampling_rate, nperseg)
+        power_sum += np.sum(np.abs(spectra) ** 2, axis=-2)
+        if spectra_path is not None:
+            segments = np.load(spectra_path, mmap_mode='r+')
+            segments[:, n_segments:n_segments + count] = spectra
+            segments.flush()
+            del segments
+        n_segments += count
+        pending = pending[:, count * step:]
+
+    if n_segments == 0:
+        return freqs, np.zeros((n_channels, len(freqs)))
+    return freqs, psd_from_power(power_sum / n_segments, sampling_rate, nperseg)
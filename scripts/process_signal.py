@@ -7,26 +7,138 @@ Uses MNE and NeuroKit2 for advanced signal processing
 """
 
 import argparse
-import json
 import os
+import shutil
+import tempfile
 import numpy as np
 import pandas as pd
 import mne
 import neurokit2 as nk
 from scipy import signal
-from scipy.stats import zscore
+from scipy.stats import kurtosis, skew, zscore
 from pathlib import Path
 
+from analysis_store import (STORE_FILE_NAME, default_store_path, find_analysis, get_analysis, open_store,
+                            store_analysis)
+from csv_ingest import DEFAULT_CHUNK_ROWS, read_csv_columns, sniff_csv
+from decimation import build_signal_pyramids
+from instrumentation import append_timing_log, profiled, stage
+from nonlinear_hrv import nonlinear_indices
+from out_of_core import (DEFAULT_CHUNK_MB, as_npy_file, block_moments, chunk_length, chunk_ranges,
+                         interpolate_nans_chunked, merge_moments, moment_statistics, read_block,
+                         sosfiltfilt_chunked, welch_chunked, write_block)
+from result_cache import DEFAULT_CACHE_DIR, analysis_key, load_cached, lookup, make_key, store, store_results
+from result_io import array_dir_for, load_results, save_results
+from spectral import EEG_BANDS, psd_from_spectra, segment_spectra, spectra_record
+
+# ECG analysis depths, shallowest first: heart rate only, plus time/frequency HRV,
+# plus wave delineation and nonlinear HRV
+ANALYSIS_LEVELS = ('quick', 'standard', 'full')
+
 def parse_arguments():
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(description='Process ECG or EEG signal data')
-    parser.add_argument('--file', type=str, required=True, help='Path to the input file')
-    parser.add_argument('--type', type=str, required=True, choices=['ecg', 'eeg'], help='Signal type (ecg or eeg)')
-    parser.add_argument('--output', type=str, required=True, help='Path to save the output JSON')
+    parser.add_argument('--file', type=str, default=None, help='Path to the input file')
+    parser.add_argument('--type', type=str, default=None, choices=['ecg', 'eeg'], help='Signal type (ecg or eeg)')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Result path: its file name is the analysis ID in the store next to it, and the '
+                             'file itself is only written with --export or --no_store')
     parser.add_argument('--sampling_rate', type=int, default=1000, help='Sampling rate in Hz')
-    return parser.parse_args()
+    parser.add_argument('--format', type=str, default='json', choices=['json', 'npy'],
+                        help='Layout of exported and cached results: a single JSON file, or a JSON header with '
+                             '.npy array sidecars')
+    parser.add_argument('--channels', type=str, default=None,
+                        help='Comma-separated channel names or indices to load (default: all channels of the signal type)')
+    parser.add_argument('--tmin', type=float, default=None, help='Start of the segment to load in seconds')
+    parser.add_argument('--tmax', type=float, default=None, help='End of the segment to load in seconds')
+    parser.add_argument('--profile', type=str, default=None, help='Write a cProfile dump of the run to this path')
+    parser.add_argument('--timing_log', type=str, default=None,
+                        help='Append per-stage timings as a JSON line to this file (default: $SIGNAL_TIMING_LOG)')
+    parser.add_argument('--cache_dir', type=str, default=DEFAULT_CACHE_DIR, help='Directory of the result cache')
+    parser.add_argument('--no_cache', action='store_true', help='Always reprocess, bypassing the result cache')
+    parser.add_argument('--out_of_core', action='store_true',
+                        help='Process EEG in chunks through files on disk, for recordings larger than memory '
+                             '(implies --format npy)')
+    parser.add_argument('--chunk_mb', type=float, default=DEFAULT_CHUNK_MB,
+                        help='Size of one chunk of all channels in out-of-core mode')
+    parser.add_argument('--dtype', type=str, default='float64', choices=['float64', 'float32'],
+                        help='Precision of the signal arrays from loading to storage')
+    parser.add_argument('--precision', type=int, default=None,
+                        help='Significant digits of floats written as JSON text (default: full precision)')
+    parser.add_argument('--store', type=str, default=None,
+                        help=f'Analysis store database (default: {STORE_FILE_NAME} next to the output)')
+    parser.add_argument('--no_store', action='store_true', help='Write the result file only, not the analysis store')
+    parser.add_argument('--export', action='store_true',
+                        help='Also write the result file at --output (the analysis store alone serves the API)')
+    parser.add_argument('--subject', type=str, default=None, help='Subject identifier to index the analysis under')
+    parser.add_argument('--level', type=str, default='full', choices=ANALYSIS_LEVELS,
+                        help='ECG analysis depth: quick (clean, R-peaks, heart rate), standard (plus time and '
+                             'frequency domain HRV) or full (plus wave delineation and nonlinear HRV)')
+    parser.add_argument('--upgrade', type=str, default=None,
+                        help='Deepen a stored ECG result file to --level, reusing its cleaned signal and R-peaks')
+    args = parser.parse_args()
+    if not args.upgrade and not (args.file and args.type and args.output):
+        parser.error("--file, --type and --output are required unless --upgrade is given")
+    return args
 
-def load_signal_data(file_path, signal_type):
+def parse_channels(channels):
+    """Parse a comma-separated channel list; integers are channel indices, anything else a name."""
+    if not channels:
+        return None
+    return [int(item) if item.strip().lstrip('-').isdigit() else item.strip() for item in channels.split(',')]
+
+def _resolve_channels(requested, names):
+    """Map requested channel names or indices to indices into ``names``."""
+    indices = []
+    for channel in requested:
+        if isinstance(channel, int):
+            if not -len(names) <= channel < len(names):
+                raise ValueError(f"Channel index {channel} out of range ({len(names)} channels)")
+            indices.append(channel % len(names))
+        elif channel in names:
+            indices.append(names.index(channel))
+        else:
+            raise ValueError(f"Unknown channel: {channel}")
+    return indices
+
+def select_edf_channels(raw, signal_type, channels=None):
+    """
+    Choose the channels to decode from an EDF header.
+    
+    Parameters:
+    -----------
+    raw : mne.io.Raw
+        EDF recording opened without preloading
+    signal_type : str
+        Type of signal ('ecg' or 'eeg')
+    channels : list, optional
+        Channel names or indices; by default the first ECG channel or every EEG channel
+        
+    Returns:
+    --------
+    list
+        Channel indices
+    """
+    if channels:
+        return _resolve_channels(channels, raw.ch_names)
+    
+    if signal_type == 'ecg':
+        ecg_channels = list(mne.pick_types(raw.info, ecg=True))
+        if len(ecg_channels) == 0:
+            # If no ECG channel is explicitly marked, try to find it by name
+            ecg_channels = [idx for idx, ch in enumerate(raw.ch_names) if 'ecg' in ch.lower()]
+            if not ecg_channels:
+                raise ValueError("No ECG channels found in the EDF file")
+        return ecg_channels[:1]
+    
+    # Keep every EEG channel; preprocess_eeg processes them together
+    eeg_channels = list(mne.pick_types(raw.info, eeg=True))
+    if len(eeg_channels) == 0:
+        raise ValueError("No EEG channels found in the EDF file")
+    return eeg_channels
+
+def load_signal_data(file_path, signal_type, chunk_rows=DEFAULT_CHUNK_ROWS, buffer_path=None, stats=None,
+                     channels=None, tmin=None, tmax=None, dtype=np.float64):
     """
     Load signal data from file based on file extension and signal type.
     
@@ -36,361 +148,929 @@ def load_signal_data(file_path, signal_type):
         Path to the signal data file
     signal_type : str
         Type of signal ('ecg' or 'eeg')
+    chunk_rows : int
+        Rows parsed per chunk when streaming CSV files
+    buffer_path : str, optional
+        If given, the data is streamed into a memory-mapped .npy file at this path
+        instead of being held in memory
+    stats : dict, optional
+        If given, updated with ingestion statistics (rows, throughput, peak memory)
+        and the names of the loaded channels
+    channels : list, optional
+        Channel names or indices to load instead of the default selection
+    tmin, tmax : float, optional
+        Start and end in seconds of the segment to load (default: whole recording)
+    dtype : numpy dtype
+        Float type of the returned samples (np.float32 halves memory and I/O)
         
     Returns:
     --------
     data : array-like
-        Signal data
+        Signal data; EEG recordings with several channels are returned as a
+        (channels x samples) array
     sampling_rate : int
         Sampling rate of the signal
     """
     file_extension = Path(file_path).suffix.lower()
     
     if file_extension == '.edf':
-        # Load EDF file using MNE
-        raw = mne.io.read_raw_edf(file_path, preload=True)
+        # Read only the header, then decode just the selected channels and time range
+        raw = mne.io.read_raw_edf(file_path, preload=False, verbose='error')
         sampling_rate = raw.info['sfreq']
         
-        if signal_type == 'ecg':
-            # Extract ECG channel
-            ecg_channels = mne.pick_types(raw.info, ecg=True)
-            if len(ecg_channels) == 0:
-                # If no ECG channel is explicitly marked, try to find it by name
-                ecg_channels = [idx for idx, ch in enumerate(raw.ch_names) if 'ecg' in ch.lower()]
-                if not ecg_channels:
-                    raise ValueError("No ECG channels found in the EDF file")
-            data = raw.get_data(picks=ecg_channels)[0]
-        else:  # EEG
-            # Extract EEG channels
-            eeg_channels = mne.pick_types(raw.info, eeg=True)
-            if len(eeg_channels) == 0:
-                raise ValueError("No EEG channels found in the EDF file")
-            data = raw.get_data(picks=eeg_channels)
-            # For simplicity, if multiple EEG channels, use the first one
-            if data.ndim > 1 and data.shape[0] > 1:
-                data = data[0]
+        picks = select_edf_channels(raw, signal_type, channels)
+        channel_names = [raw.ch_names[idx] for idx in picks]
+        start = raw.time_as_index(tmin)[0] if tmin is not None else 0
+        stop = raw.time_as_index(tmax)[0] if tmax is not None else None
+        if buffer_path is not None:
+            # Decode a block of samples at a time into the memory-mapped buffer
+            stop = raw.n_times if stop is None else stop
+            data = np.lib.format.open_memmap(buffer_path, mode='w+', dtype=dtype,
+                                             shape=(len(picks), stop - start))
+            for block_start in range(start, stop, chunk_rows):
+                block_stop = min(block_start + chunk_rows, stop)
+                data[:, block_start - start:block_stop - start] = raw.get_data(picks=picks, start=block_start,
+                                                                               stop=block_stop)
+            data.flush()
+        else:
+            data = raw.get_data(picks=picks, start=start, stop=stop).astype(dtype, copy=False)
+        # A single channel is returned as a 1-D signal
+        if data.shape[0] == 1:
+            data = data[0]
     
     elif file_extension in ['.csv', '.txt']:
-        # Assume CSV/TXT file has a simple format with one column of data
+        # Stream only the selected signal column instead of parsing the whole table
         try:
-            df = pd.read_csv(file_path)
-            # Try to automatically detect the signal column
-            if signal_type == 'ecg':
-                potential_cols = [col for col in df.columns if 'ecg' in col.lower()]
-                if not potential_cols:
-                    # If no column with 'ecg' in name, take the first numeric column
-                    numeric_cols = df.select_dtypes(include=[np.number]).columns
-                    if len(numeric_cols) == 0:
-                        raise ValueError("No numeric columns found in the CSV file")
-                    data = df[numeric_cols[0]].values
-                else:
-                    data = df[potential_cols[0]].values
-            else:  # EEG
-                potential_cols = [col for col in df.columns if 'eeg' in col.lower()]
-                if not potential_cols:
-                    # If no column with 'eeg' in name, take the first numeric column
-                    numeric_cols = df.select_dtypes(include=[np.number]).columns
-                    if len(numeric_cols) == 0:
-                        raise ValueError("No numeric columns found in the CSV file")
-                    data = df[numeric_cols[0]].values
-                else:
-                    data = df[potential_cols[0]].values
+            columns = sniff_csv(file_path, signal_type)
+            signal_columns = columns["signal_columns"]
+            if channels:
+                header = list(pd.read_csv(file_path, nrows=0).columns)
+                signal_columns = [header[idx] for idx in _resolve_channels(channels, header)]
+            channel_names = [str(col) for col in signal_columns]
+            data, ingest_stats = read_csv_columns(file_path, signal_columns, dtype=dtype,
+                                                  chunk_rows=chunk_rows, buffer_path=buffer_path)
+            
+            # Use the rate implied by the Time column, else assume the default
+            sampling_rate = columns["sampling_rate"] or 1000  # Default to 1000 Hz
+            
+            # Keep the requested time range
+            if tmin is not None or tmax is not None:
+                start = int(round(tmin * sampling_rate)) if tmin is not None else 0
+                stop = int(round(tmax * sampling_rate)) if tmax is not None else None
+                data = data[:, start:stop]
             
-            # Assume default sampling rate if not provided
-            sampling_rate = 1000  # Default to 1000 Hz
+            # A single channel is returned as a 1-D signal
+            if data.shape[0] == 1:
+                data = data[0]
         except Exception as e:
             raise ValueError(f"Error reading CSV file: {str(e)}")
+        
+        print(f"Read {ingest_stats['rows']} samples from column(s) {', '.join(channel_names)} "
+              f"in {ingest_stats['seconds']:.3f} s ({ingest_stats['mb_per_second'] or 0:.1f} MB/s, "
+              f"peak memory {ingest_stats['peak_memory_mb']:.1f} MB)")
+        if stats is not None:
+            stats.update(ingest_stats)
     
     else:
         raise ValueError(f"Unsupported file format: {file_extension}")
     
+    if stats is not None:
+        stats["channels"] = channel_names
+    
     return data, sampling_rate
 
-def preprocess_ecg(ecg_signal, sampling_rate):
+def _peak_list(waves_peak, key):
+    """
+    Return one wave's peak indices from nk.ecg_delineate output as a list.
+    
+    Beats where the wave was not found are kept as None so the list stays
+    aligned with the R-peaks.
+    """
+    # ecg_delineate can return a list instead of a dict when delineation fails
+    if not isinstance(waves_peak, dict) or waves_peak.get(key) is None:
+        return []
+    return [None if pd.isna(peak) else int(peak) for peak in waves_peak[key]]
+
+def _feature(frame, column):
+    """Return a single NeuroKit2 feature as a float, or None if it is missing."""
+    return float(frame[column].values[0]) if column in frame else None
+
+def _float_dtype(data):
+    """float32 for float32 input (reduced-precision mode), float64 for anything else."""
+    return np.float32 if getattr(data, "dtype", None) == np.float32 else np.float64
+
+def preprocess_ecg(ecg_signal, sampling_rate, level='full'):
     """
     Preprocess ECG signal using NeuroKit2.
     
+    The signal is cleaned and R-peaks are detected once. The R-peaks, the RR
+    interval series and the interpolated heart rate derived from them are
+    shared by every feature stage instead of being recomputed per stage.
+    
     Parameters:
     -----------
     ecg_signal : array
-        Raw ECG signal
+        Raw ECG signal; for a float32 signal the returned signal arrays are
+        float32 too (NeuroKit2 itself computes in float64)
     sampling_rate : int
         Sampling rate in Hz
+    level : str
+        Analysis depth (see ANALYSIS_LEVELS): 'quick' stops after the heart
+        rate, 'standard' adds time and frequency domain HRV and the segment
+        spectra, 'full' adds wave delineation and nonlinear HRV. Features of
+        deeper levels are None until deepen_ecg computes them.
         
     Returns:
     --------
     dict
         Dictionary containing processed ECG data and features
     """
+    timings = {}
+    dtype = _float_dtype(ecg_signal)
+    
     # Step 1: Clean the ECG signal
-    ecg_cleaned = nk.ecg_clean(ecg_signal, sampling_rate=sampling_rate)
+    with stage(timings, "clean"):
+        ecg_cleaned = nk.ecg_clean(ecg_signal, sampling_rate=sampling_rate)
     
     # Step 2: Find R-peaks
-    _, rpeaks = nk.ecg_peaks(ecg_cleaned, sampling_rate=sampling_rate)
-    
-    # Step 3: Compute heart rate and HRV metrics
-    ecg_rate = nk.ecg_rate(rpeaks, sampling_rate=sampling_rate)
-    
-    # Step 4: Delineate the ECG signal and extract all peaks (P, Q, R, S, T)
-    _, waves_peak = nk.ecg_delineate(ecg_cleaned, rpeaks, sampling_rate=sampling_rate, method="peak")
+    with stage(timings, "r_peaks"):
+        _, rpeaks = nk.ecg_peaks(ecg_cleaned, sampling_rate=sampling_rate)
+        r_peaks = np.asarray(rpeaks["ECG_R_Peaks"]) if "ECG_R_Peaks" in rpeaks else np.array([], dtype=int)
     
-    # Handle the return value correctly
-    # First check what we actually got back from ecg_delineate
-    r_peaks_list = rpeaks["ECG_R_Peaks"].tolist() if "ECG_R_Peaks" in rpeaks else []
-    
-    # Handle the waves_peak object correctly based on its actual type
-    if isinstance(waves_peak, list):
-        # If it's a list, we need to create empty lists for the peaks
-        p_peaks_list = []
-        q_peaks_list = []
-        s_peaks_list = []
-        t_peaks_list = []
-    else:
-        # If it's a dictionary, extract the peaks safely
-        p_peaks_list = waves_peak.get("ECG_P_Peaks", [])
-        if p_peaks_list is not None and hasattr(p_peaks_list, "tolist"):
-            p_peaks_list = p_peaks_list.tolist()
-        else:
-            p_peaks_list = []
-            
-        q_peaks_list = waves_peak.get("ECG_Q_Peaks", [])
-        if q_peaks_list is not None and hasattr(q_peaks_list, "tolist"):
-            q_peaks_list = q_peaks_list.tolist()
-        else:
-            q_peaks_list = []
-            
-        s_peaks_list = waves_peak.get("ECG_S_Peaks", [])
-        if s_peaks_list is not None and hasattr(s_peaks_list, "tolist"):
-            s_peaks_list = s_peaks_list.tolist()
+    # Step 3: Interpolate the heart rate once from the R-peaks; the interpolation passes
+    # through the beat-wise rates, so they are read off it at the peaks
+    with stage(timings, "rate"):
+        if len(r_peaks) > 1:
+            ecg_rate_interp = nk.signal_rate(r_peaks, sampling_rate=sampling_rate, desired_length=len(ecg_cleaned))
+            ecg_rate = ecg_rate_interp[r_peaks]
         else:
-            s_peaks_list = []
-            
-        t_peaks_list = waves_peak.get("ECG_T_Peaks", [])
-        if t_peaks_list is not None and hasattr(t_peaks_list, "tolist"):
-            t_peaks_list = t_peaks_list.tolist()
-        else:
-            t_peaks_list = []
-    
-    # Process ECG signal for interval-related metrics
-    try:
-        # Try using the ecg_process function first
-        processed_ecg = nk.ecg_process(ecg_cleaned, sampling_rate=sampling_rate)
-        ecg_features = nk.ecg_intervalrelated(processed_ecg[0], sampling_rate=sampling_rate)
-    except Exception as e:
-        print(f"Warning: Could not compute interval-related features: {str(e)}")
-        # Fallback to directly computing some basic features
-        ecg_features = pd.DataFrame({
-            "ECG_Rate_Mean": [np.mean(ecg_rate) if len(ecg_rate) > 0 else 0],
-            "ECG_Rate_Min": [np.min(ecg_rate) if len(ecg_rate) > 0 else 0],
-            "ECG_Rate_Max": [np.max(ecg_rate) if len(ecg_rate) > 0 else 0]
-        })
-    
-    # Safely compute HRV indices
-    try:
-        hrv_time = nk.hrv_time(rpeaks, sampling_rate=sampling_rate)
-    except Exception as e:
-        print(f"Warning: Could not compute HRV time domain features: {str(e)}")
-        hrv_time = pd.DataFrame({"HRV_SDNN": [np.nan], "HRV_RMSSD": [np.nan]})
-        
-    try:
-        hrv_freq = nk.hrv_frequency(rpeaks, sampling_rate=sampling_rate)
-    except Exception as e:
-        print(f"Warning: Could not compute HRV frequency domain features: {str(e)}")
-        hrv_freq = pd.DataFrame({"HRV_LF/HF": [np.nan]})
-        
-    try:
-        hrv_nonlinear = nk.hrv_nonlinear(rpeaks, sampling_rate=sampling_rate)
-    except Exception as e:
-        print(f"Warning: Could not compute HRV nonlinear features: {str(e)}")
-        hrv_nonlinear = pd.DataFrame({"HRV_SampEn": [np.nan]})
+            ecg_rate_interp = np.array([])
+            ecg_rate = np.array([])
     
-    # Prepare results with more robust error handling
+    # Prepare the quick-level results; deeper levels fill in the remaining peaks and features
+    # Signal arrays are kept as NumPy arrays; save_results serializes them
     results = {
         "signal": {
-            "raw": ecg_signal.tolist() if hasattr(ecg_signal, "tolist") else list(ecg_signal),
-            "cleaned": ecg_cleaned.tolist() if hasattr(ecg_cleaned, "tolist") else list(ecg_cleaned),
-            "heart_rate": ecg_rate.tolist() if hasattr(ecg_rate, "tolist") else list(ecg_rate)
+            "raw": np.asarray(ecg_signal),
+            "cleaned": np.asarray(ecg_cleaned, dtype=dtype),
+            "heart_rate": np.asarray(ecg_rate, dtype=dtype)
         },
         "peaks": {
-            "r_peaks": r_peaks_list,
-            "p_peaks": p_peaks_list,
-            "q_peaks": q_peaks_list,
-            "s_peaks": s_peaks_list,
-            "t_peaks": t_peaks_list
+            "r_peaks": r_peaks.tolist(),
+            "p_peaks": [],
+            "q_peaks": [],
+            "s_peaks": [],
+            "t_peaks": []
         },
         "features": {
-            "mean_hr": float(ecg_features["ECG_Rate_Mean"].values[0]) if "ECG_Rate_Mean" in ecg_features else None,
-            "min_hr": float(ecg_features["ECG_Rate_Min"].values[0]) if "ECG_Rate_Min" in ecg_features else None,
-            "max_hr": float(ecg_features["ECG_Rate_Max"].values[0]) if "ECG_Rate_Max" in ecg_features else None,
-            "sdnn": float(hrv_time["HRV_SDNN"].values[0]) if "HRV_SDNN" in hrv_time else None,
-            "rmssd": float(hrv_time["HRV_RMSSD"].values[0]) if "HRV_RMSSD" in hrv_time else None,
-            "lf_hf_ratio": float(hrv_freq["HRV_LF/HF"].values[0]) if "HRV_LF/HF" in hrv_freq else None,
-            "sample_entropy": float(hrv_nonlinear["HRV_SampEn"].values[0]) if "HRV_SampEn" in hrv_nonlinear else None
+            "mean_hr": float(np.mean(ecg_rate_interp)) if len(ecg_rate_interp) > 0 else None,
+            "min_hr": float(np.min(ecg_rate_interp)) if len(ecg_rate_interp) > 0 else None,
+            "max_hr": float(np.max(ecg_rate_interp)) if len(ecg_rate_interp) > 0 else None,
+            "sdnn": None,
+            "rmssd": None,
+            "lf_hf_ratio": None,
+            "sample_entropy": None,
+            "sd1": None,
+            "sd2": None,
+            "dfa_alpha1": None,
+            "dfa_alpha2": None
         },
         "metadata": {
             "sampling_rate": sampling_rate,
             "duration_seconds": len(ecg_signal) / sampling_rate,
-            "signal_type": "ecg"
+            "signal_type": "ecg",
+            "analysis_level": "quick",
+            "timings": timings
         }
     }
     
+    return deepen_ecg(results, level, ecg_cleaned)
+
+def deepen_ecg(results, level, ecg_cleaned=None):
+    """
+    Run the ECG stages between a result's analysis level and a deeper one.
+    
+    Every stage beyond the quick level only needs the cleaned signal and the
+    R-peaks, so a stored quick or standard result is upgraded without
+    cleaning or detecting peaks again.
+    
+    Parameters:
+    -----------
+    results : dict
+        ECG results from preprocess_ecg, fresh or loaded; updated in place
+    level : str
+        Target analysis level; nothing is computed if the result is already
+        at least this deep
+    ecg_cleaned : array, optional
+        Full-precision cleaned signal, when still in memory (default: the
+        stored ``signal.cleaned``)
+        
+    Returns:
+    --------
+    dict
+        The results at the target level
+    """
+    metadata = results["metadata"]
+    # Results from before analysis levels were always full
+    current = ANALYSIS_LEVELS.index(metadata.get("analysis_level", "full"))
+    target = ANALYSIS_LEVELS.index(level)
+    if target <= current:
+        return results
+    
+    timings = metadata.setdefault("timings", {})
+    features = results["features"]
+    sampling_rate = metadata["sampling_rate"]
+    if ecg_cleaned is None:
+        ecg_cleaned = np.asarray(results["signal"]["cleaned"], dtype=float)
+    r_peaks = np.asarray(results["peaks"]["r_peaks"], dtype=int)
+    rr_intervals = {"RRI": np.diff(r_peaks) / sampling_rate * 1000}
+    
+    if current < ANALYSIS_LEVELS.index("standard") <= target:
+        # Step 4: Compute time and frequency domain HRV from the shared RR interval series
+        with stage(timings, "hrv_time"):
+            try:
+                hrv_time = nk.hrv_time(rr_intervals, sampling_rate=sampling_rate)
+            except Exception as e:
+                print(f"Warning: Could not compute HRV time domain features: {str(e)}")
+                hrv_time = pd.DataFrame({"HRV_SDNN": [np.nan], "HRV_RMSSD": [np.nan]})
+        
+        with stage(timings, "hrv_frequency"):
+            try:
+                hrv_freq = nk.hrv_frequency(rr_intervals, sampling_rate=sampling_rate)
+            except Exception as e:
+                print(f"Warning: Could not compute HRV frequency domain features: {str(e)}")
+                hrv_freq = pd.DataFrame({"HRV_LF/HF": [np.nan]})
+        
+        features.update(
+            sdnn=_feature(hrv_time, "HRV_SDNN"),
+            rmssd=_feature(hrv_time, "HRV_RMSSD"),
+            # Recent NeuroKit2 versions name the ratio HRV_LFHF
+            lf_hf_ratio=_feature(hrv_freq, "HRV_LFHF" if "HRV_LFHF" in hrv_freq else "HRV_LF/HF")
+        )
+        
+        # Step 5: Segment spectra of the cleaned ECG, stored for the ECG-EEG coherence
+        with stage(timings, "spectrum"):
+            nperseg = int(min(sampling_rate, len(ecg_cleaned)))
+            _, spectra, _ = segment_spectra(np.asarray(ecg_cleaned, dtype=float), sampling_rate, nperseg)
+        results["spectral"] = spectra_record(spectra, sampling_rate, nperseg)
+    
+    if current < ANALYSIS_LEVELS.index("full") <= target:
+        # Step 6: Delineate the ECG signal and extract all peaks (P, Q, R, S, T)
+        with stage(timings, "delineate"):
+            try:
+                _, waves_peak = nk.ecg_delineate(ecg_cleaned, {"ECG_R_Peaks": r_peaks}, sampling_rate=sampling_rate,
+                                                 method="peak")
+            except Exception as e:
+                print(f"Warning: Could not delineate ECG waves: {str(e)}")
+                waves_peak = {}
+        for name in ("p", "q", "s", "t"):
+            results["peaks"][f"{name}_peaks"] = _peak_list(waves_peak, f"ECG_{name.upper()}_Peaks")
+        
+        # Step 7: Compute nonlinear HRV
+        with stage(timings, "hrv_nonlinear"):
+            try:
+                hrv_nonlinear = pd.DataFrame([nonlinear_indices(rr_intervals["RRI"])])
+            except Exception as e:
+                print(f"Warning: Could not compute HRV nonlinear features: {str(e)}")
+                hrv_nonlinear = pd.DataFrame({"HRV_SampEn": [np.nan]})
+        
+        features.update(
+            sample_entropy=_feature(hrv_nonlinear, "HRV_SampEn"),
+            sd1=_feature(hrv_nonlinear, "HRV_SD1"),
+            sd2=_feature(hrv_nonlinear, "HRV_SD2"),
+            dfa_alpha1=_feature(hrv_nonlinear, "HRV_DFA_alpha1"),
+            dfa_alpha2=_feature(hrv_nonlinear, "HRV_DFA_alpha2")
+        )
+    
+    metadata["analysis_level"] = level
     return results
 
-def preprocess_eeg(eeg_signal, sampling_rate):
+def interpolate_nans(data):
+    """
+    Linearly interpolate NaN samples along the last axis.
+    
+    Equivalent to calling ``np.interp`` on each row (edge NaNs take the nearest
+    valid value) but runs as a single vectorized pass over all channels.
+    
+    Parameters:
+    -----------
+    data : array
+        1-D signal or (channels x samples) array; modified in place
+        
+    Returns:
+    --------
+    array
+        The interpolated array
+    """
+    nan_mask = np.isnan(data)
+    if not np.any(nan_mask):
+        return data
+    
+    rows = np.atleast_2d(data)
+    nan_rows = np.atleast_2d(nan_mask)
+    n_samples = rows.shape[-1]
+    indices = np.broadcast_to(np.arange(n_samples), rows.shape)
+    
+    # Index of the previous and next valid sample for every position
+    prev_idx = np.maximum.accumulate(np.where(nan_rows, -1, indices), axis=-1)
+    next_idx = np.minimum.accumulate(np.where(nan_rows, n_samples, indices)[:, ::-1], axis=-1)[:, ::-1]
+    
+    # Rows without a single valid sample are left untouched
+    has_valid = ~np.all(nan_rows, axis=-1, keepdims=True)
+    prev_clipped = np.where(prev_idx < 0, next_idx, prev_idx).clip(0, n_samples - 1)
+    next_clipped = np.where(next_idx >= n_samples, prev_idx, next_idx).clip(0, n_samples - 1)
+    
+    prev_val = np.take_along_axis(rows, prev_clipped, axis=-1)
+    next_val = np.take_along_axis(rows, next_clipped, axis=-1)
+    span = next_clipped - prev_clipped
+    weight = np.divide(indices - prev_clipped, span, out=np.zeros(rows.shape), where=span > 0)
+    
+    fill = nan_rows & has_valid
+    rows[fill] = (prev_val + weight * (next_val - prev_val))[fill]
+    return data
+
+def preprocess_eeg(eeg_signal, sampling_rate, channel_names=None):
     """
     Preprocess EEG signal using MNE and NeuroKit2.
     
+    All channels are processed together along the sample axis, so the cost of
+    a high-density montage is a few batched NumPy/SciPy calls rather than one
+    pipeline run per channel.
+    
     Parameters:
     -----------
     eeg_signal : array
-        Raw EEG signal
+        Raw EEG signal, either 1-D or (channels x samples); a float32 signal
+        is processed and returned in float32
     sampling_rate : int
         Sampling rate in Hz
+    channel_names : list of str, optional
+        Channel labels for a multichannel signal
         
     Returns:
     --------
     dict
-        Dictionary containing processed EEG data and features
+        Dictionary containing processed EEG data and features. For a
+        multichannel signal, ``bands`` and ``features`` hold channel averages and
+        ``channels`` holds the per-channel values.
     """
+    timings = {}
+    eeg_signal = np.asarray(eeg_signal, dtype=_float_dtype(eeg_signal))
+    multichannel = eeg_signal.ndim == 2 and eeg_signal.shape[0] > 1
+    if eeg_signal.ndim == 2 and not multichannel:
+        eeg_signal = eeg_signal[0]
+    
     # Step 1: Clean the EEG signal
-    # Apply bandpass filter (0.5-45 Hz)
-    eeg_filtered = nk.signal_filter(eeg_signal, 
-                                   lowcut=0.5, 
-                                   highcut=45, 
-                                   sampling_rate=sampling_rate, 
-                                   method='butterworth')
+    # Apply bandpass filter (0.5-45 Hz), the same 2nd-order Butterworth SOS
+    # design nk.signal_filter uses, applied to every channel at once
+    with stage(timings, "filter"):
+        missing = np.isnan(eeg_signal)
+        sos = signal.butter(2, [0.5, 45], btype='bandpass', output='sos', fs=sampling_rate)
+        interpolated = interpolate_nans(eeg_signal.copy())
+        if interpolated.dtype == np.float64:
+            eeg_filtered = signal.sosfiltfilt(sos, interpolated, axis=-1)
+        else:
+            # Float32 recursions drift at a 0.5 Hz cut-off: filter one channel
+            # at a time in float64 and store the result in float32
+            eeg_filtered = np.empty_like(interpolated)
+            for channel_in, channel_out in zip(np.atleast_2d(interpolated), np.atleast_2d(eeg_filtered)):
+                channel_out[:] = signal.sosfiltfilt(sos, channel_in)
+        del interpolated
+        eeg_filtered[missing] = np.nan
     
     # Step 2: Remove artifacts - replace eeg_clean with manual artifact removal
     # Since NeuroKit2 doesn't have eeg_clean, we'll use basic methods
-    # First convert to z-scores
-    z_scores = zscore(eeg_filtered)
-    
-    # Remove extreme values (z-score > 3)
-    artifact_mask = np.abs(z_scores) > 3
-    eeg_cleaned = eeg_filtered.copy()
-    eeg_cleaned[artifact_mask] = np.nan
-    
-    # Interpolate NaN values
-    nan_indices = np.isnan(eeg_cleaned)
-    if np.any(nan_indices):
-        non_nan_indices = ~nan_indices
-        if np.any(non_nan_indices):
-            # Get indices of non-NaN values
-            indices = np.arange(len(eeg_cleaned))
-            # Interpolate NaN values
-            eeg_cleaned[nan_indices] = np.interp(
-                indices[nan_indices], 
-                indices[non_nan_indices], 
-                eeg_cleaned[non_nan_indices]
-            )
-    
-    # Step 3: Extract EEG frequency bands using NeuroKit2
-    try:
-        eeg_bands = nk.eeg_bandpower(eeg_cleaned, sampling_rate=sampling_rate, method='welch')
-    except Exception as e:
-        print(f"Warning: Could not compute EEG band power: {str(e)}")
-        # Create empty DataFrame if the function fails
-        eeg_bands = pd.DataFrame()
-    
-    # Step 4: Compute spectral power
-    freqs, psd = signal.welch(eeg_cleaned, fs=sampling_rate, nperseg=min(sampling_rate, len(eeg_cleaned)))
-    
-    # Step 5: Extract EEG features
-    # Compute relative band powers
-    delta_idx = np.logical_and(freqs >= 0.5, freqs <= 4)
-    theta_idx = np.logical_and(freqs >= 4, freqs <= 8)
-    alpha_idx = np.logical_and(freqs >= 8, freqs <= 13)
-    beta_idx = np.logical_and(freqs >= 13, freqs <= 30)
-    gamma_idx = np.logical_and(freqs >= 30, freqs <= 45)
-    
-    total_power = np.sum(psd)
-    # Avoid division by zero
-    if total_power > 0:
-        delta_power = np.sum(psd[delta_idx]) / total_power if np.any(delta_idx) else 0
-        theta_power = np.sum(psd[theta_idx]) / total_power if np.any(theta_idx) else 0
-        alpha_power = np.sum(psd[alpha_idx]) / total_power if np.any(alpha_idx) else 0
-        beta_power = np.sum(psd[beta_idx]) / total_power if np.any(beta_idx) else 0
-        gamma_power = np.sum(psd[gamma_idx]) / total_power if np.any(gamma_idx) else 0
-    else:
-        delta_power = theta_power = alpha_power = beta_power = gamma_power = 0
+    with stage(timings, "artifacts"):
+        # First convert to z-scores
+        z_scores = zscore(eeg_filtered, axis=-1)
+        
+        # Remove extreme values (z-score > 3)
+        artifact_mask = np.abs(z_scores) > 3
+        eeg_cleaned = eeg_filtered.copy()
+        eeg_cleaned[artifact_mask] = np.nan
+        
+        # Interpolate NaN values
+        interpolate_nans(eeg_cleaned)
     
-    # Calculate Hjorth parameters manually if NeuroKit2 doesn't have the function
-    try:
-        hjorth_params = nk.eeg_hjorth(eeg_cleaned)
-        hjorth_mobility = float(hjorth_params["hjorth_mobility"])
-        hjorth_complexity = float(hjorth_params["hjorth_complexity"])
-    except Exception as e:
-        print(f"Warning: Could not compute Hjorth parameters: {str(e)}")
-        # Calculate Hjorth parameters manually
-        # Mobility - std of the first derivative / std of the signal
-        diff1 = np.diff(eeg_cleaned, n=1)
-        if np.std(eeg_cleaned) > 0:
-            hjorth_mobility = np.std(diff1) / np.std(eeg_cleaned)
-        else:
-            hjorth_mobility = 0
-            
-        # Complexity - mobility of the first derivative / mobility of the signal
-        diff2 = np.diff(eeg_cleaned, n=2)
-        if len(diff1) > 0 and np.std(diff1) > 0:
-            mobility_diff = np.std(diff2) / np.std(diff1)
-            hjorth_complexity = mobility_diff / hjorth_mobility if hjorth_mobility > 0 else 0
-        else:
-            hjorth_complexity = 0
+    # Step 3: Compute spectral power
+    # The segment FFTs behind the Welch PSD are kept with the results, so band
+    # powers here and the ECG-EEG coherence later reuse them
+    n_samples = eeg_cleaned.shape[-1]
+    with stage(timings, "spectrum"):
+        nperseg = int(min(sampling_rate, n_samples))
+        freqs, spectra, _ = segment_spectra(eeg_cleaned, sampling_rate, nperseg)
+        psd = psd_from_spectra(spectra, sampling_rate, nperseg)
     
-    # Safely compute statistics
-    try:
-        mean_val = float(np.mean(eeg_cleaned))
-    except:
-        mean_val = 0
-        
-    try:
-        std_val = float(np.std(eeg_cleaned))
-    except:
-        std_val = 0
+    # Step 4: Extract EEG features
+    with stage(timings, "features"):
+        # Compute relative band powers
+        total_power = np.sum(psd, axis=-1)
+        band_powers = {}
+        for band_name, (low, high) in EEG_BANDS.items():
+            band_idx = np.logical_and(freqs >= low, freqs <= high)
+            band_power = np.sum(psd[..., band_idx], axis=-1)
+            # Avoid division by zero
+            band_powers[band_name] = np.divide(band_power, total_power,
+                                               out=np.zeros_like(total_power), where=total_power > 0)
         
-    try:
-        kurtosis_val = float(pd.Series(eeg_cleaned).kurtosis())
-    except:
-        kurtosis_val = 0
+        # Calculate Hjorth parameters
+        # Mobility - std of the first derivative / std of the signal
+        # Complexity - mobility of the first derivative / mobility of the signal
+        diff1 = np.diff(eeg_cleaned, n=1, axis=-1)
+        diff2 = np.diff(eeg_cleaned, n=2, axis=-1)
+        std0 = np.std(eeg_cleaned, axis=-1)
+        std1 = np.std(diff1, axis=-1) if diff1.shape[-1] > 0 else np.zeros_like(std0)
+        std2 = np.std(diff2, axis=-1) if diff2.shape[-1] > 0 else np.zeros_like(std0)
+        hjorth_mobility = np.divide(std1, std0, out=np.zeros_like(std0), where=std0 > 0)
+        mobility_diff = np.divide(std2, std1, out=np.zeros_like(std0), where=std1 > 0)
+        hjorth_complexity = np.divide(mobility_diff, hjorth_mobility, out=np.zeros_like(std0),
+                                      where=hjorth_mobility > 0)
         
-    try:
-        skewness_val = float(pd.Series(eeg_cleaned).skew())
-    except:
-        skewness_val = 0
+        # Statistics (bias-corrected kurtosis and skewness, as computed by pandas)
+        channel_features = {
+            "mean": np.mean(eeg_cleaned, axis=-1),
+            "std": std0,
+            "kurtosis": kurtosis(eeg_cleaned, axis=-1, bias=False),
+            "skewness": skew(eeg_cleaned, axis=-1, bias=False),
+            "hjorth_mobility": hjorth_mobility,
+            "hjorth_complexity": hjorth_complexity
+        }
     
     # Prepare results with robust error handling for JSON serialization
+    # Signal arrays are kept as NumPy arrays; save_results serializes them
     results = {
         "signal": {
-            "raw": eeg_signal.tolist() if hasattr(eeg_signal, "tolist") else list(eeg_signal),
-            "filtered": eeg_filtered.tolist() if hasattr(eeg_filtered, "tolist") else list(eeg_filtered),
-            "cleaned": eeg_cleaned.tolist() if hasattr(eeg_cleaned, "tolist") else list(eeg_cleaned)
+            "raw": eeg_signal,
+            "filtered": eeg_filtered,
+            "cleaned": eeg_cleaned
         },
         "frequency": {
-            "freqs": freqs.tolist() if hasattr(freqs, "tolist") else list(freqs),
-            "psd": psd.tolist() if hasattr(psd, "tolist") else list(psd)
-        },
-        "bands": {
-            "delta": float(delta_power),
-            "theta": float(theta_power),
-            "alpha": float(alpha_power),
-            "beta": float(beta_power),
-            "gamma": float(gamma_power)
+            "freqs": np.asarray(freqs),
+            "psd": np.asarray(psd)
         },
-        "features": {
-            "mean": mean_val,
-            "std": std_val,
-            "kurtosis": kurtosis_val,
-            "skewness": skewness_val,
-            "hjorth_mobility": float(hjorth_mobility),
-            "hjorth_complexity": float(hjorth_complexity)
+        "spectral": spectra_record(spectra, sampling_rate, nperseg),
+        # Channel-averaged values for multichannel recordings
+        "bands": {name: float(np.mean(power)) for name, power in band_powers.items()},
+        "features": {name: float(np.mean(values)) for name, values in channel_features.items()},
+        "metadata": {
+            "sampling_rate": sampling_rate,
+            "duration_seconds": n_samples / sampling_rate,
+            "signal_type": "eeg",
+            "n_channels": eeg_cleaned.shape[0] if multichannel else 1,
+            "timings": timings
+        }
+    }
+    
+    if multichannel:
+        if channel_names is None:
+            channel_names = [f"Ch{i + 1}" for i in range(eeg_cleaned.shape[0])]
+        results["channels"] = {
+            "names": list(channel_names),
+            "bands": {name: power.tolist() for name, power in band_powers.items()},
+            "features": {name: values.tolist() for name, values in channel_features.items()}
+        }
+    
+    return results
+
+def preprocess_eeg_chunked(eeg_signal, sampling_rate, work_dir, channel_names=None, chunk_mb=DEFAULT_CHUNK_MB):
+    """
+    Out-of-core counterpart of preprocess_eeg for recordings larger than memory.
+    
+    Runs the same pipeline through .npy files in ``work_dir`` one chunk of
+    samples at a time: the band-pass filter carries its section states across
+    chunk boundaries, the artifact z-scores and the features use streaming
+    moments, and the Welch spectrum carries partial segments over. The results
+    match preprocess_eeg up to floating-point rounding.
+    
+    Parameters:
+    -----------
+    eeg_signal : array
+        Raw EEG signal, either 1-D or (channels x samples); a memory-mapped
+        .npy array (as loaded with ``buffer_path``) is read in place
+    sampling_rate : int
+        Sampling rate in Hz
+    work_dir : str
+        Directory for the intermediate and output arrays; it must outlive the
+        results, whose signal arrays are memory-mapped from it
+    channel_names : list of str, optional
+        Channel labels for a multichannel signal
+    chunk_mb : float
+        Size of one chunk of all channels in MB
+        
+    Returns:
+    --------
+    dict
+        Same structure as preprocess_eeg
+    """
+    timings = {}
+    multichannel = eeg_signal.ndim == 2 and eeg_signal.shape[0] > 1
+    n_channels = eeg_signal.shape[0] if eeg_signal.ndim == 2 else 1
+    n_samples = eeg_signal.shape[-1]
+    chunk = chunk_length(n_channels, chunk_mb)
+    ranges = chunk_ranges(n_samples, chunk)
+    raw_path = as_npy_file(eeg_signal, os.path.join(work_dir, "raw.npy"), chunk)
+    
+    # Step 1: Clean the EEG signal
+    # Same 0.5-45 Hz Butterworth band-pass as preprocess_eeg, run forward and
+    # backward over the chunks with the filter state carried between them
+    with stage(timings, "filter"):
+        interpolated_path = os.path.join(work_dir, "interpolated.npy")
+        shutil.copyfile(raw_path, interpolated_path)
+        interpolate_nans_chunked(interpolated_path, chunk)
+        
+        filtered_path = os.path.join(work_dir, "filtered.npy")
+        sos = signal.butter(2, [0.5, 45], btype='bandpass', output='sos', fs=sampling_rate)
+        sosfiltfilt_chunked(sos, interpolated_path, filtered_path, chunk, work_dir)
+        os.remove(interpolated_path)
+        
+        # Missing samples stay missing in the filtered signal
+        for start, stop in ranges:
+            missing = np.isnan(read_block(raw_path, start, stop))
+            if missing.any():
+                block = read_block(filtered_path, start, stop)
+                block[missing] = np.nan
+                write_block(filtered_path, start, block)
+    
+    # Step 2: Remove artifacts (|z-score| > 3), with the channel mean and
+    # standard deviation accumulated from per-chunk moments
+    with stage(timings, "artifacts"):
+        moments = None
+        for start, stop in ranges:
+            moments = merge_moments(moments, block_moments(read_block(filtered_path, start, stop)))
+        stats = moment_statistics(moments)
+        
+        cleaned_path = os.path.join(work_dir, "cleaned.npy")
+        shutil.copyfile(filtered_path, cleaned_path)
+        for start, stop in ranges:
+            block = read_block(filtered_path, start, stop)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                artifact_mask = np.abs((block - stats["mean"][:, None]) / stats["std"][:, None]) > 3
+            if artifact_mask.any():
+                block[artifact_mask] = np.nan
+                write_block(cleaned_path, start, block)
+        interpolate_nans_chunked(cleaned_path, chunk)
+    
+    # Step 3: Compute spectral power
+    with stage(timings, "spectrum"):
+        nperseg = int(min(sampling_rate, n_samples))
+        spectra_path = os.path.join(work_dir, "segment_spectra.npy")
+        freqs, psd = welch_chunked(cleaned_path, sampling_rate, nperseg, chunk, spectra_path)
+    
+    # Step 4: Extract EEG features
+    with stage(timings, "features"):
+        # Compute relative band powers
+        total_power = np.sum(psd, axis=-1)
+        band_powers = {}
+        for band_name, (low, high) in EEG_BANDS.items():
+            band_idx = np.logical_and(freqs >= low, freqs <= high)
+            band_power = np.sum(psd[..., band_idx], axis=-1)
+            band_powers[band_name] = np.divide(band_power, total_power,
+                                               out=np.zeros_like(total_power), where=total_power > 0)
+        
+        # Moments of the signal and of its first two derivatives; the last two
+        # samples of each chunk continue the differences into the next one
+        moments, diff1_moments, diff2_moments = None, None, None
+        tail = np.empty((n_channels, 0))
+        for start, stop in ranges:
+            block = read_block(cleaned_path, start, stop)
+            moments = merge_moments(moments, block_moments(block))
+            diff1 = np.diff(np.concatenate([tail[:, -1:], block], axis=-1), n=1, axis=-1)
+            diff2 = np.diff(np.concatenate([tail[:, -2:], block], axis=-1), n=2, axis=-1)
+            diff1_moments = merge_moments(diff1_moments, block_moments(diff1) if diff1.shape[-1] else None)
+            diff2_moments = merge_moments(diff2_moments, block_moments(diff2) if diff2.shape[-1] else None)
+            tail = np.concatenate([tail, block[:, -2:]], axis=-1)[:, -2:]
+        stats = moment_statistics(moments)
+        
+        # Hjorth parameters, as in preprocess_eeg
+        std0 = stats["std"]
+        std1 = moment_statistics(diff1_moments)["std"] if diff1_moments else np.zeros_like(std0)
+        std2 = moment_statistics(diff2_moments)["std"] if diff2_moments else np.zeros_like(std0)
+        hjorth_mobility = np.divide(std1, std0, out=np.zeros_like(std0), where=std0 > 0)
+        mobility_diff = np.divide(std2, std1, out=np.zeros_like(std0), where=std1 > 0)
+        hjorth_complexity = np.divide(mobility_diff, hjorth_mobility, out=np.zeros_like(std0),
+                                      where=hjorth_mobility > 0)
+        
+        channel_features = {
+            "mean": stats["mean"],
+            "std": std0,
+            "kurtosis": stats["kurtosis"],
+            "skewness": stats["skewness"],
+            "hjorth_mobility": hjorth_mobility,
+            "hjorth_complexity": hjorth_complexity
+        }
+    
+    # Signal arrays are memory-mapped from the work directory; save_results
+    # streams them to the sidecar files without reading them into memory
+    signals = {name: np.load(path, mmap_mode='r')
+               for name, path in (("raw", raw_path), ("filtered", filtered_path), ("cleaned", cleaned_path))}
+    spectral = {"sampling_rate": sampling_rate, "nperseg": nperseg, "noverlap": nperseg // 2,
+                "segment_spectra": np.load(spectra_path, mmap_mode='r')}
+    if not multichannel:
+        signals = {name: values.reshape(-1) for name, values in signals.items()}
+        spectral["segment_spectra"] = spectral["segment_spectra"][0]
+        psd = psd[0]
+        band_powers = {name: power[0] for name, power in band_powers.items()}
+        channel_features = {name: values[0] for name, values in channel_features.items()}
+    
+    results = {
+        "signal": signals,
+        "frequency": {
+            "freqs": np.asarray(freqs),
+            "psd": np.asarray(psd)
         },
+        "spectral": spectral,
+        # Channel-averaged values for multichannel recordings
+        "bands": {name: float(np.mean(power)) for name, power in band_powers.items()},
+        "features": {name: float(np.mean(values)) for name, values in channel_features.items()},
         "metadata": {
             "sampling_rate": sampling_rate,
-            "duration_seconds": len(eeg_signal) / sampling_rate,
-            "signal_type": "eeg"
+            "duration_seconds": n_samples / sampling_rate,
+            "signal_type": "eeg",
+            "n_channels": n_channels,
+            "out_of_core": True,
+            "timings": timings
         }
     }
     
+    if multichannel:
+        if channel_names is None:
+            channel_names = [f"Ch{i + 1}" for i in range(n_channels)]
+        results["channels"] = {
+            "names": list(channel_names),
+            "bands": {name: power.tolist() for name, power in band_powers.items()},
+            "features": {name: values.tolist() for name, values in channel_features.items()}
+        }
+    
+    return results
+
+def process_file(file_path, signal_type, output_path, sampling_rate=None, array_format='json',
+                 cache_dir=DEFAULT_CACHE_DIR, channels=None, tmin=None, tmax=None, timing_log=None,
+                 out_of_core=False, chunk_mb=DEFAULT_CHUNK_MB, dtype='float64', precision=None, store_path=None,
+                 subject=None, level='full', export=False):
+    """
+    Load, process and store a single signal file.
+    
+    Parameters:
+    -----------
+    file_path : str
+        Path to the input file
+    signal_type : str
+        Type of signal ('ecg' or 'eeg')
+    output_path : str
+        Result path; its file name without extension is the analysis ID, and
+        the file is only written when ``export`` is set
+    sampling_rate : int, optional
+        Sampling rate override in Hz. If None, the rate reported by the loader is used.
+    array_format : str
+        Layout of the exported and cached result files ('json' or 'npy')
+    cache_dir : str, optional
+        Result cache directory; identical input bytes and parameters are served
+        from it without reprocessing. None disables the cache.
+    channels : list, optional
+        Channel names or indices to load instead of the default selection
+    tmin, tmax : float, optional
+        Segment of the recording to analyse, in seconds
+    timing_log : str, optional
+        JSON-lines file the per-stage measurements are appended to, including
+        result writing (default: $SIGNAL_TIMING_LOG, if set)
+    out_of_core : bool
+        Process EEG with preprocess_eeg_chunked through a temporary directory
+        next to the output, so memory use is bounded by ``chunk_mb`` rather
+        than the recording length. Result files are always written as npy.
+    chunk_mb : float
+        Chunk size for out-of-core processing
+    dtype : str
+        'float32' to load, process and store the signal arrays in single
+        precision, or 'float64'
+    precision : int, optional
+        Significant digits of floats written as JSON text
+    store_path : str, optional
+        Analysis store database the result is written to, under the output
+        file name as its ID. None writes the result file only.
+    subject : str, optional
+        Subject identifier the analysis is indexed under in the store
+    level : str
+        ECG analysis depth (see preprocess_ecg); a shallower result can be
+        deepened later with upgrade_analysis
+    export : bool
+        Also write the result file at ``output_path``; implied without a store
+        
+    Returns:
+    --------
+    dict
+        Dictionary containing the processed results; ``metadata.timings``
+        holds wall time, CPU time and peak memory of every stage
+    """
+    if out_of_core and signal_type != 'eeg':
+        print("Warning: Out-of-core processing is only available for EEG; processing in memory")
+        out_of_core = False
+    if out_of_core and array_format != 'npy':
+        # Inlining the arrays as JSON lists would pull the whole recording into memory
+        print("Warning: Out-of-core results are saved in the npy format")
+        array_format = 'npy'
+    export = export or not store_path
+    analysis_id = os.path.splitext(os.path.basename(output_path))[0]
+    destination = output_path if export else f"analysis {analysis_id} in {store_path}"
+    
+    # Serve repeated uploads from the content-addressed cache
+    cache_key = None
+    if cache_dir:
+        # Out-of-core results only match in-memory ones up to rounding, which depends on the chunking
+        chunked = out_of_core and signal_type == 'eeg'
+        cache_key = analysis_key(file_path, signal_type, sampling_rate, array_format=array_format,
+                                 channels=channels, tmin=tmin, tmax=tmax, dtype=dtype, precision=precision,
+                                 level=level if signal_type == 'ecg' else None, out_of_core=chunked,
+                                 chunk_mb=chunk_mb if chunked else None)
+        if export:
+            results = load_results(output_path) if lookup(cache_dir, cache_key, output_path) else None
+        else:
+            results = load_cached(cache_dir, cache_key)
+        if results is not None:
+            print(f"Cache hit for {file_path}. Results saved to {destination}")
+            if store_path:
+                _store_result(store_path, analysis_id, results, file_path, output_path if export else None, subject)
+            return results
+    
+    # Out-of-core intermediates live next to the output, on the same filesystem
+    work_dir = None
+    if out_of_core:
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        os.makedirs(output_dir, exist_ok=True)
+        work_dir = tempfile.mkdtemp(prefix=".eeg_work_", dir=output_dir)
+    try:
+        results = _process_loaded_file(file_path, signal_type, sampling_rate, channels, tmin, tmax, work_dir,
+                                       chunk_mb, np.dtype(dtype), level)
+        if cache_key:
+            results["metadata"]["cache_key"] = cache_key
+        
+        # Out-of-core signal arrays are still mapped from the work directory here
+        timings = results["metadata"]["timings"]
+        with stage(timings, "save"):
+            if export:
+                save_results(results, output_path, array_format, precision)
+            if store_path:
+                _store_result(store_path, analysis_id, results, file_path, output_path if export else None,
+                              subject)
+        if cache_key:
+            if export:
+                store(cache_dir, cache_key, output_path)
+            else:
+                store_results(cache_dir, cache_key, results, array_format, precision)
+    finally:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    # Saved results are only in the timing log, with the write time of their own
+    append_timing_log({
+        "script": "process_signal",
+        "signal_type": signal_type,
+        "duration_seconds": results["metadata"]["duration_seconds"],
+        "n_channels": results["metadata"].get("n_channels", 1),
+        "timings": timings
+    }, timing_log)
+    total_seconds = sum(timings[name]["wall_seconds"] for name in ("load", "preprocess", "pyramid", "save"))
+    print(f"Processing complete in {total_seconds:.2f} s. Results saved to {destination}")
+    
+    # Out-of-core signal arrays were mapped from the work directory; map the exported copies instead
+    if work_dir and export:
+        results = load_results(output_path)
+    return results
+
+def _store_result(store_path, analysis_id, results, file_path, result_path, subject):
+    """Write an analysis to the store; ``result_path`` is its exported file, or None."""
+    store_analysis(store_path, analysis_id, results, subject=subject, source_file=os.path.abspath(file_path),
+                   result_path=result_path)
+
+def _process_loaded_file(file_path, signal_type, sampling_rate, channels, tmin, tmax, work_dir, chunk_mb, dtype,
+                         level):
+    """Load and analyse a file (process_file without the cache and saving); ``work_dir`` selects out-of-core."""
+    # Load signal data
+    print(f"Loading {signal_type} data from {file_path}...")
+    timings = {}
+    ingest_stats = {}
+    buffer_path = os.path.join(work_dir, "raw.npy") if work_dir else None
+    with stage(timings, "load"):
+        signal_data, file_sampling_rate = load_signal_data(file_path, signal_type, buffer_path=buffer_path,
+                                                           stats=ingest_stats, channels=channels,
+                                                           tmin=tmin, tmax=tmax, dtype=dtype)
+    
+    if sampling_rate is None:
+        sampling_rate = file_sampling_rate
+    
+    print(f"Processing {signal_type} signal with sampling rate {sampling_rate} Hz...")
+    
+    # Process based on signal type
+    with stage(timings, "preprocess"):
+        if signal_type == 'ecg':
+            results = preprocess_ecg(signal_data, sampling_rate, level)
+        elif work_dir:
+            results = preprocess_eeg_chunked(signal_data, sampling_rate, work_dir, ingest_stats.get("channels"),
+                                             chunk_mb)
+        else:  # EEG
+            results = preprocess_eeg(signal_data, sampling_rate, ingest_stats.get("channels"))
+    
+    if ingest_stats:
+        results["metadata"]["ingest"] = ingest_stats
+    
+    # Build min/max decimation pyramids for chart viewports
+    with stage(timings, "pyramid"):
+        results["pyramid"] = build_signal_pyramids(results)
+    
+    # Pipeline stages join the preprocessing sub-stages in the metadata
+    timings.update(results["metadata"].get("timings", {}))
+    results["metadata"]["timings"] = timings
+    
+    return results
+
+def upgrade_analysis(result_path, level='full', store_path=None, precision=None, timing_log=None, export=False):
+    """
+    Deepen a saved ECG analysis to a deeper analysis level.
+    
+    Only the stages the result is missing run, on its stored cleaned signal
+    and R-peaks (see deepen_ecg), so an upload can be answered at the quick
+    level first and upgraded in the background.
+    
+    Parameters:
+    -----------
+    result_path : str
+        Result path given to process_file; its file name is the analysis ID,
+        and an exported file there is rewritten in its own layout
+    level : str
+        Target analysis level
+    store_path : str, optional
+        Analysis store the result is read from when it holds it, and updated in
+    precision : int, optional
+        Significant digits of floats written as JSON text
+    timing_log : str, optional
+        JSON-lines file the per-stage measurements are appended to
+    export : bool
+        Write the result file even if the analysis was not exported before
+        
+    Returns:
+    --------
+    dict
+        Dictionary containing the upgraded results
+    """
+    analysis_id = os.path.splitext(os.path.basename(result_path))[0]
+    exported = os.path.exists(result_path)
+    entry = {}
+    results = None
+    if store_path and os.path.exists(store_path):
+        connection = open_store(store_path)
+        try:
+            entry = find_analysis(connection, analysis_id) or {}
+            # A result file rewritten since it was stored (e.g. upgraded through another store) is newer
+            stored_current = entry and not (exported and os.path.getmtime(result_path) > entry["created"] + 1.0)
+            if stored_current:
+                # The sidecars are about to be rewritten, so they must not stay memory-mapped
+                results = get_analysis(connection, analysis_id, prefer_exported=False)
+        finally:
+            connection.close()
+    if results is None:
+        if not exported:
+            raise FileNotFoundError(f"Analysis {analysis_id} is neither in the store nor at {result_path}")
+        results = load_results(result_path, mmap=False)
+    
+    metadata = results["metadata"]
+    if metadata.get("signal_type") != 'ecg':
+        print(f"Warning: Analysis levels only apply to ECG; analysis {analysis_id} is left unchanged")
+        return results
+    previous_level = metadata.get("analysis_level", "full")
+    if ANALYSIS_LEVELS.index(previous_level) >= ANALYSIS_LEVELS.index(level):
+        print(f"Analysis {analysis_id} is already analysed at the {previous_level} level")
+        return results
+    
+    timings = {}
+    with stage(timings, "upgrade"):
+        deepen_ecg(results, level)
+    # The pyramids only mark R-peaks, which every level already has, so they are kept
+    # The upgraded result differs from what the original cache key describes
+    if metadata.get("cache_key"):
+        metadata["cache_key"] = make_key(kind="upgrade", base=metadata["cache_key"], level=level)
+    
+    export = export or exported or not store_path
+    with stage(timings, "save"):
+        if export and os.path.isdir(array_dir_for(result_path)):
+            save_results(results, result_path, 'npy', precision)
+        elif export:
+            # Readers of the shallower result never see a partially written file
+            partial_path = result_path + ".partial"
+            save_results(results, partial_path, 'json', precision)
+            os.replace(partial_path, result_path)
+        if store_path:
+            store_analysis(store_path, analysis_id, results, subject=entry.get("subject"),
+                           source_file=entry.get("source_file"), result_path=result_path if export else None)
+    
+    append_timing_log({
+        "script": "process_signal",
+        "signal_type": "ecg",
+        "upgrade": [previous_level, level],
+        "duration_seconds": metadata["duration_seconds"],
+        "timings": timings
+    }, timing_log)
+    print(f"Upgraded analysis {analysis_id} from the {previous_level} to the {level} level "
+          f"in {timings['upgrade']['wall_seconds']:.2f} s")
+    
     return results
 
 def main():
@@ -398,27 +1078,19 @@ def main():
     args = parse_arguments()
     
     try:
-        # Load signal data
-        print(f"Loading {args.type} data from {args.file}...")
-        signal_data, sampling_rate = load_signal_data(args.file, args.type)
-        
         # Override sampling rate if provided
-        if args.sampling_rate != 1000:
-            sampling_rate = args.sampling_rate
-        
-        print(f"Processing {args.type} signal with sampling rate {sampling_rate} Hz...")
-        
-        # Process based on signal type
-        if args.type == 'ecg':
-            results = preprocess_ecg(signal_data, sampling_rate)
-        else:  # EEG
-            results = preprocess_eeg(signal_data, sampling_rate)
-        
-        # Save results to JSON
-        with open(args.output, 'w') as f:
-            json.dump(results, f)
+        sampling_rate = args.sampling_rate if args.sampling_rate != 1000 else None
         
-        print(f"Processing complete. Results saved to {args.output}")
+        cache_dir = None if args.no_cache else args.cache_dir
+        store_path = None if args.no_store else (args.store or default_store_path(args.upgrade or args.output))
+        with profiled(args.profile):
+            if args.upgrade:
+                upgrade_analysis(args.upgrade, args.level, store_path, args.precision, args.timing_log, args.export)
+            else:
+                process_file(args.file, args.type, args.output, sampling_rate, args.format, cache_dir,
+                             parse_channels(args.channels), args.tmin, args.tmax, args.timing_log,
+                             args.out_of_core, args.chunk_mb, args.dtype, args.precision, store_path, args.subject,
+                             args.level, args.export)
         
     except Exception as e:
         print(f"Error: {str(e)}")
@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Content-Addressed Result Cache for ECG/EEG analyses and correlations
+Results are keyed by a hash of the input bytes and processing parameters, so
+re-uploading the same recording returns the stored result immediately.
+Also provides size- and age-based pruning for cache, results/ and uploads/
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from analysis_store import STORE_FILE_NAME
+from result_io import copy_results, load_results, save_results
+
+# Bump whenever processing or correlation output changes, so stale entries are never served
+PIPELINE_VERSION = "9"
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache")
+DEFAULT_MAX_CACHE_MB = 2048
+DEFAULT_MAX_AGE_DAYS = 30
+# Minimum time between the automatic prunes done by store(); the CLI always prunes
+PRUNE_INTERVAL_SECONDS = 600
+# File in a pruned directory whose mtime records the last automatic prune
+PRUNE_MARKER_NAME = ".last_prune"
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Prune cached results, results/ or uploads/ by size and age')
+    parser.add_argument('--prune', type=str, default=DEFAULT_CACHE_DIR, help='Directory to prune')
+    parser.add_argument('--max-mb', type=float, default=DEFAULT_MAX_CACHE_MB, help='Maximum total size in MB')
+    parser.add_argument('--max-age-days', type=float, default=DEFAULT_MAX_AGE_DAYS, help='Maximum entry age in days')
+    return parser.parse_args()
+
+def hash_file(file_path, block_size=1 << 20):
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def make_key(**parts):
+    """Return a cache key hashing the given JSON-serializable parts and the pipeline version."""
+    payload = json.dumps(dict(parts, pipeline_version=PIPELINE_VERSION), sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def analysis_key(file_path, signal_type, sampling_rate, **options):
+    """
+    Cache key of a single-signal analysis.
+
+    Parameters:
+    -----------
+    file_path : str
+        Path to the input recording (its bytes are hashed, not its name)
+    signal_type : str
+        Type of signal ('ecg' or 'eeg')
+    sampling_rate : int or None
+        Sampling rate override, or None when taken from the file
+    **options
+        Any other parameter that changes the result (e.g. the result format)
+    """
+    return make_key(kind="analysis", input=hash_file(file_path), signal_type=signal_type,
+                    sampling_rate=sampling_rate, **options)
+
+def correlation_key(ecg_results, ecg_path, eeg_results, eeg_path, config):
+    """
+    Cache key of an ECG-EEG correlation.
+
+    Each input is identified by the cache key recorded in its metadata when
+    available (itself content-addressed), otherwise by hashing its result file.
+    Output locations in the config do not affect the key.
+    """
+    def input_id(results, path):
+        return results.get("metadata", {}).get("cache_key") or hash_file(path)
+
+    parameters = {k: v for k, v in config.items() if k not in ("outputPath", "ecgAnalysisId", "eegAnalysisId")}
+    return make_key(kind="correlation", ecg=input_id(ecg_results, ecg_path),
+                    eeg=input_id(eeg_results, eeg_path), parameters=parameters)
+
+def cache_path(cache_dir, key):
+    """Path of the cached result file for a key."""
+    return os.path.join(cache_dir, f"{key}.json")
+
+def lookup(cache_dir, key, output_path):
+    """
+    Copy a cached result to ``output_path`` if the key is present.
+
+    Returns:
+    --------
+    bool
+        True on a cache hit
+    """
+    cached = cache_path(cache_dir, key)
+    if not os.path.exists(cached):
+        return False
+
+    try:
+        copy_results(cached, output_path)
+        # Refresh the entry's timestamp so eviction is least-recently-used
+        now = time.time()
+        os.utime(cached, (now, now))
+    except FileNotFoundError:
+        # Evicted by a concurrent prune between the check and the copy
+        return False
+    return True
+
+def load_cached(cache_dir, key):
+    """
+    Load a cached result without copying it anywhere.
+
+    Returns:
+    --------
+    dict or None
+        The cached result, or None on a cache miss
+    """
+    cached = cache_path(cache_dir, key)
+    try:
+        results = load_results(cached)
+        # Refresh the entry's timestamp so eviction is least-recently-used
+        now = time.time()
+        os.utime(cached, (now, now))
+    except FileNotFoundError:
+        # Missing, or evicted by a concurrent prune while loading
+        return None
+    return results
+
+def store(cache_dir, key, output_path, max_mb=DEFAULT_MAX_CACHE_MB, max_age_days=DEFAULT_MAX_AGE_DAYS):
+    """
+    Copy a freshly written result into the cache, then enforce the size and age
+    limits if the cache was not pruned in the last PRUNE_INTERVAL_SECONDS.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    copy_results(output_path, cache_path(cache_dir, key))
+    if _claim_prune(cache_dir):
+        prune_directory(cache_dir, max_mb, max_age_days)
+
+def store_results(cache_dir, key, results, array_format='json', precision=None, max_mb=DEFAULT_MAX_CACHE_MB,
+                  max_age_days=DEFAULT_MAX_AGE_DAYS):
+    """
+    Save a result that was not exported to a file straight into the cache,
+    pruning it like store().
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    save_results(results, cache_path(cache_dir, key), array_format, precision)
+    if _claim_prune(cache_dir):
+        prune_directory(cache_dir, max_mb, max_age_days)
+
+def _claim_prune(directory):
+    """Return True, and restart the interval, if an automatic prune of the directory is due."""
+    marker = os.path.join(directory, PRUNE_MARKER_NAME)
+    now = time.time()
+    try:
+        if now - os.path.getmtime(marker) < PRUNE_INTERVAL_SECONDS:
+            return False
+    except FileNotFoundError:
+        pass
+    with open(marker, 'a'):
+        pass
+    os.utime(marker, (now, now))
+    return True
+
+def _entry_name(name):
+    """Group a result file with its .npy sidecar directory."""
+    stem = os.path.splitext(name)[0]
+    return stem[:-len("_arrays")] if stem.endswith("_arrays") else stem
+
+def _path_size(path):
+    """Size in bytes of a file or directory tree."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+def prune_directory(directory, max_mb=DEFAULT_MAX_CACHE_MB, max_age_days=DEFAULT_MAX_AGE_DAYS):
+    """
+    Delete entries older than ``max_age_days``, then least-recently-used entries
+    until the directory holds at most ``max_mb``.
+
+    A result file and its ``_arrays`` sidecar directory count as one entry.
+    Safe to run while other processes read, write or prune the directory:
+    entries that vanish mid-scan are skipped and count as removed.
+
+    Returns:
+    --------
+    dict
+        Number of entries removed and the remaining size in MB
+    """
+    if not os.path.isdir(directory):
+        return {"removed": 0, "remaining_mb": 0.0}
+
+    entries = {}
+    for name in os.listdir(directory):
+        # The analysis store database has its own retention policy
+        if name.startswith(STORE_FILE_NAME) or name == PRUNE_MARKER_NAME:
+            continue
+        path = os.path.join(directory, name)
+        try:
+            size = _path_size(path)
+            mtime = os.path.getmtime(path)
+        except FileNotFoundError:
+            # Removed by a concurrent prune
+            continue
+        entry = entries.setdefault(_entry_name(name), {"paths": [], "size": 0, "mtime": 0.0})
+        entry["paths"].append(path)
+        entry["size"] += size
+        entry["mtime"] = max(entry["mtime"], mtime)
+
+    def remove(entry):
+        for path in entry["paths"]:
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    removed = 0
+    cutoff = time.time() - max_age_days * 86400
+    max_bytes = max_mb * 1024 * 1024
+    total = sum(entry["size"] for entry in entries.values())
+
+    # Oldest first: expired entries, then LRU until under the size limit
+    for entry in sorted(entries.values(), key=lambda e: e["mtime"]):
+        if entry["mtime"] < cutoff or total > max_bytes:
+            remove(entry)
+            total -= entry["size"]
+            removed += 1
+
+    return {"removed": removed, "remaining_mb": total / (1024 * 1024)}
+
+def main():
+    """Prune a directory from the command line."""
+    args = parse_arguments()
+    summary = prune_directory(args.prune, args.max_mb, args.max_age_days)
+    print(f"Removed {summary['removed']} entries from {args.prune}; {summary['remaining_mb']:.1f} MB remaining")
+
+if __name__ == "__main__":
+    main()
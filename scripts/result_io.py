@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Result Storage for ECG and EEG analyses
+Writes results either as a single JSON file or as a small JSON header with
+the signal arrays stored as memory-mappable .npy sidecar files
+"""
+
+import json
+import os
+import shutil
+import numpy as np
+
+# Key used in the JSON header to mark an array stored in a sidecar file
+ARRAY_REF_KEY = "$npy"
+# Buffer size when streaming memory-mapped arrays between files
+COPY_BLOCK_BYTES = 16 * 1024 * 1024
+
+def _to_json_compatible(obj):
+    """json.dump hook converting NumPy arrays and scalars to Python types."""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def round_significant(values, digits):
+    """
+    Round values to ``digits`` significant decimal digits.
+
+    The rounded float64 values are the closest doubles to short decimals, so
+    they are written with at most ``digits`` digits in JSON.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        exponent = np.floor(np.log10(np.abs(values)))
+        shift = digits - 1 - np.where(np.isfinite(exponent), exponent, 0)
+        # Scale by an exact power of ten on whichever side keeps it integral
+        up = np.round(values * 10.0 ** np.maximum(shift, 0)) / 10.0 ** np.maximum(shift, 0)
+        down = np.round(values / 10.0 ** np.maximum(-shift, 0)) * 10.0 ** np.maximum(-shift, 0)
+    return np.where(shift >= 0, up, down)
+
+def _limit_precision(node, precision=None):
+    """
+    Prepare the floats in nested dicts/lists for text output.
+
+    With ``precision``, every float is rounded to that many significant digits.
+    Without it, float32 values are still converted to the shortest decimal that
+    reads back to the same float32, instead of the 17 digits of their float64 form.
+    """
+    if isinstance(node, dict):
+        return {key: _limit_precision(value, precision) for key, value in node.items()}
+    if isinstance(node, list):
+        return [_limit_precision(value, precision) for value in node]
+    if isinstance(node, np.ndarray) and node.dtype.kind == 'f':
+        if precision is not None:
+            return round_significant(node, precision)
+        if node.dtype == np.float32:
+            return node.astype(str).astype(np.float64)
+        return node
+    if isinstance(node, (float, np.floating)):
+        if precision is not None:
+            return float(round_significant(node, precision))
+        if isinstance(node, np.float32):
+            return float(str(node))
+    return node
+
+def _drop_complex_arrays(node):
+    """Remove complex arrays from nested dicts; JSON has no complex numbers and they are only kept as .npy."""
+    if isinstance(node, dict):
+        return {key: _drop_complex_arrays(value) for key, value in node.items()
+                if not (isinstance(value, np.ndarray) and value.dtype.kind == 'c')}
+    return node
+
+def array_dir_for(output_path):
+    """Return the sidecar directory used for the arrays of a result file."""
+    return os.path.splitext(output_path)[0] + "_arrays"
+
+def npy_backing_file(array):
+    """
+    Path of the .npy file whose entire payload is ``array``, or None.
+
+    True for a memory-mapped array loaded from (or created as) a whole .npy
+    file, including reshaped views of it, but not for slices of one.
+    """
+    if not isinstance(array, np.memmap) or not array.filename or not array.flags.c_contiguous:
+        return None
+    if not str(array.filename).endswith('.npy'):
+        return None
+    if array.offset + array.nbytes != os.path.getsize(array.filename):
+        return None
+    return array.filename
+
+def _save_array(path, array):
+    """Save an array as .npy; arrays mapped from a .npy file are streamed without being read into memory."""
+    source = npy_backing_file(array)
+    if source is None:
+        np.save(path, np.ascontiguousarray(array), allow_pickle=False)
+        return
+
+    with open(source, 'rb') as src, open(path, 'wb') as dst:
+        np.lib.format.write_array_header_1_0(dst, np.lib.format.header_data_from_array_1_0(array))
+        src.seek(array.offset)
+        shutil.copyfileobj(src, dst, COPY_BLOCK_BYTES)
+
+def _externalize_arrays(node, array_dir, prefix):
+    """Replace every array in nested dicts/lists with a reference to a saved .npy file."""
+    if isinstance(node, dict):
+        return {
+            key: _externalize_arrays(value, array_dir, f"{prefix}.{key}" if prefix else key)
+            for key, value in node.items()
+        }
+    if isinstance(node, list):
+        return [_externalize_arrays(value, array_dir, f"{prefix}.{i}") for i, value in enumerate(node)]
+    if isinstance(node, np.ndarray) and node.ndim > 0:
+        file_name = f"{prefix}.npy"
+        _save_array(os.path.join(array_dir, file_name), node)
+        return {
+            ARRAY_REF_KEY: os.path.join(os.path.basename(array_dir), file_name),
+            "dtype": str(node.dtype),
+            "shape": list(node.shape)
+        }
+    return node
+
+def _resolve_arrays(node, base_dir, mmap):
+    """Replace every sidecar reference in nested dicts/lists with the loaded array."""
+    if isinstance(node, dict):
+        if ARRAY_REF_KEY in node:
+            return np.load(os.path.join(base_dir, node[ARRAY_REF_KEY]),
+                           mmap_mode='r' if mmap else None, allow_pickle=False)
+        return {key: _resolve_arrays(value, base_dir, mmap) for key, value in node.items()}
+    if isinstance(node, list):
+        return [_resolve_arrays(value, base_dir, mmap) for value in node]
+    return node
+
+def save_results(results, output_path, array_format='json', precision=None):
+    """
+    Save analysis results to disk.
+
+    Parameters:
+    -----------
+    results : dict
+        Results dictionary; signal arrays may be NumPy arrays or lists
+    output_path : str
+        Path of the JSON file to write
+    array_format : str
+        'json' to inline every array as a JSON list, or 'npy' to write a JSON
+        header and store each array as a .npy file next to it. Complex arrays
+        (stored segment spectra) are only written in the 'npy' layout.
+    precision : int, optional
+        Significant digits of the floats written as text (default: enough to
+        read every value back exactly). Arrays stored as .npy keep their dtype.
+    """
+    if array_format == 'npy':
+        array_dir = array_dir_for(output_path)
+        # Start from an empty directory: stale sidecars may be hard links shared with the cache
+        if os.path.exists(array_dir):
+            shutil.rmtree(array_dir)
+        os.makedirs(array_dir)
+        results = _externalize_arrays(results, array_dir, "")
+        results.setdefault("metadata", {})["array_format"] = "npy"
+    elif array_format == 'json':
+        results = _drop_complex_arrays(results)
+    else:
+        raise ValueError(f"Unsupported result format: {array_format}")
+
+    results = _limit_precision(results, precision)
+    with open(output_path, 'w') as f:
+        json.dump(results, f, default=_to_json_compatible)
+
+def load_results(file_path, mmap=True):
+    """
+    Load analysis results saved by save_results.
+
+    Parameters:
+    -----------
+    file_path : str
+        Path to the JSON result file
+    mmap : bool
+        If True, arrays stored as .npy sidecars are memory-mapped read-only
+        instead of being read into memory
+
+    Returns:
+    --------
+    dict
+        Results dictionary; sidecar arrays are returned as NumPy arrays while
+        inline JSON arrays stay as lists
+    """
+    with open(file_path, 'r') as f:
+        results = json.load(f)
+
+    if results.get("metadata", {}).get("array_format") == "npy":
+        results = _resolve_arrays(results, os.path.dirname(os.path.abspath(file_path)), mmap)
+
+    return results
+
+def _rebase_refs(node, old_prefix, new_prefix):
+    """Point every sidecar reference in nested dicts/lists at a renamed array directory."""
+    if isinstance(node, dict):
+        if ARRAY_REF_KEY in node:
+            ref = node[ARRAY_REF_KEY]
+            if ref.startswith(old_prefix):
+                node = dict(node, **{ARRAY_REF_KEY: new_prefix + ref[len(old_prefix):]})
+            return node
+        return {key: _rebase_refs(value, old_prefix, new_prefix) for key, value in node.items()}
+    if isinstance(node, list):
+        return [_rebase_refs(value, old_prefix, new_prefix) for value in node]
+    return node
+
+def copy_results(source_path, destination_path):
+    """
+    Copy a result file saved by save_results, including its .npy sidecars.
+
+    Sidecar files are hard-linked when possible (they are never modified in
+    place) and the references in the JSON header are rewritten to the new
+    sidecar directory name.
+
+    Parameters:
+    -----------
+    source_path : str
+        Existing result file
+    destination_path : str
+        Path of the copy
+    """
+    with open(source_path, 'r') as f:
+        results = json.load(f)
+
+    if results.get("metadata", {}).get("array_format") != "npy":
+        shutil.copyfile(source_path, destination_path)
+        return
+
+    source_dir = array_dir_for(source_path)
+    destination_dir = array_dir_for(destination_path)
+    if os.path.exists(destination_dir):
+        shutil.rmtree(destination_dir)
+    shutil.copytree(source_dir, destination_dir, copy_function=_link_or_copy)
+
+    results = _rebase_refs(results, os.path.basename(source_dir) + os.sep, os.path.basename(destination_dir) + os.sep)
+    with open(destination_path, 'w') as f:
+        json.dump(results, f)
+
+def _link_or_copy(source, destination):
+    """Hard-link a file, falling back to a copy across filesystems."""
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Persistent Worker for ECG/EEG processing and correlation jobs
+Keeps a pool of warm Python processes with MNE, NeuroKit2 and SciPy already
+imported, and serves jobs and analysis store queries as JSON lines over
+stdin/stdout or a local socket.
+A worker process that dies mid-job (killed for memory, a crash in native code)
+fails that job with an error reply and the pool is restarted
+"""
+
+import argparse
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import current_process
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Serve signal processing jobs from a pool of warm workers')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Number of worker processes')
+    parser.add_argument('--socket', type=str, default=None,
+                        help='Path of a Unix socket to listen on (default: read jobs from stdin)')
+    return parser.parse_args()
+
+def init_worker():
+    """
+    Import the processing stack once per worker process.
+
+    The scripts print progress to stdout, which carries the JSON-lines replies in
+    stdin/stdout mode, so their output is redirected to stderr.
+    """
+    sys.stdout = sys.stderr
+    # Mark the worker daemonic like a multiprocessing.Pool worker, so parallel stages
+    # inside a job use threads instead of a process pool per worker
+    current_process().daemon = True
+
+    global analysis_store, process_signal, correlate_signals
+    import analysis_store
+    import process_signal
+    import correlate_signals
+
+def run_job(job):
+    """
+    Execute a single job inside a worker process.
+
+    Parameters:
+    -----------
+    job : dict
+        Job description. ``task`` is one of:
+        - 'process': requires ``file``, ``type`` and ``output``; ``sampling_rate``,
+          ``format``, ``channels``, ``tmin``, ``tmax`` and ``export`` are optional
+        - 'upgrade': requires ``output``; ``level`` and ``export`` are optional
+        - 'correlate': requires ``config``, a file path or the configuration itself
+        - 'find', 'get', 'window': require ``store`` and ``analysis``, see
+          analysis_store.run_query; the answer is the reply's ``result``
+        - 'ping': returns immediately, used for health checks
+
+    Returns:
+    --------
+    dict
+        Reply with the job ``id``, a ``status`` of 'ok' or 'error' and the elapsed time
+    """
+    start_time = time.perf_counter()
+    reply = {"id": job.get("id"), "task": job.get("task")}
+
+    try:
+        task = job.get("task")
+        if task == 'process':
+            process_signal.process_file(
+                job["file"], job["type"], job["output"], job.get("sampling_rate"),
+                job.get("format", "json"), channels=job.get("channels"),
+                tmin=job.get("tmin"), tmax=job.get("tmax"), subject=job.get("subject"), level=job.get("level", "full"),
+                store_path=job.get("store") or process_signal.default_store_path(job["output"]),
+                export=job.get("export", False)
+            )
+            reply["output"] = job["output"]
+        elif task == 'upgrade':
+            process_signal.upgrade_analysis(job["output"], job.get("level", "full"),
+                                            job.get("store") or process_signal.default_store_path(job["output"]),
+                                            export=job.get("export", False))
+            reply["output"] = job["output"]
+        elif task == 'correlate':
+            config = correlate_signals.load_config(job["config"])
+            correlate_signals.correlate_from_config(config)
+            reply["output"] = config["outputPath"]
+        elif task in ('find', 'get', 'window'):
+            connection = analysis_store.open_store(job["store"])
+            try:
+                reply["result"] = analysis_store.run_query(connection, job)
+            finally:
+                connection.close()
+        elif task == 'ping':
+            reply["pid"] = os.getpid()
+        else:
+            raise ValueError(f"Unknown task: {task}")
+        reply["status"] = "ok"
+    except Exception as e:
+        traceback.print_exc(file=sys.stderr)
+        reply["status"] = "error"
+        reply["error"] = str(e)
+
+    reply["elapsed_seconds"] = time.perf_counter() - start_time
+    return reply
+
+class WorkerPool:
+    """
+    Warm worker processes on a ProcessPoolExecutor, rebuilt when one of them dies.
+
+    A dead worker breaks the executor, which fails every job it still holds
+    with BrokenProcessPool; those jobs get error replies and later jobs run
+    on a fresh executor.
+    """
+
+    def __init__(self, workers):
+        self.workers = max(1, workers)
+        self._lock = threading.Lock()
+        self._executor = self._start()
+
+    def _start(self):
+        """Start a new executor of warm workers."""
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker)
+
+    def _replace(self, broken):
+        """Swap a broken executor for a new one, once, and return the current executor."""
+        with self._lock:
+            if self._executor is broken:
+                print("Warning: A worker process died; restarting the worker pool", file=sys.stderr)
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._start()
+            return self._executor
+
+    def submit(self, job):
+        """
+        Run a job on a worker.
+
+        Returns:
+        --------
+        concurrent.futures.Future
+            Resolves to the job's reply; never raises for a failed job
+        """
+        start_time = time.perf_counter()
+        with self._lock:
+            executor = self._executor
+        try:
+            future = executor.submit(run_job, job)
+        except BrokenProcessPool:
+            executor = self._replace(executor)
+            future = executor.submit(run_job, job)
+
+        reply = Future()
+
+        def finish(future):
+            try:
+                reply.set_result(future.result())
+            except BrokenProcessPool:
+                self._replace(executor)
+                reply.set_result({"id": job.get("id"), "task": job.get("task"), "status": "error",
+                                  "error": "Worker process died",
+                                  "elapsed_seconds": time.perf_counter() - start_time})
+
+        future.add_done_callback(finish)
+        return reply
+
+    def run(self, job):
+        """Run a job on a worker and wait for its reply."""
+        return self.submit(job).result()
+
+    def shutdown(self):
+        """Wait for running jobs and stop the workers."""
+        with self._lock:
+            self._executor.shutdown()
+
+def parse_job(line):
+    """Decode one JSON line into a job, returning an error reply if it is malformed."""
+    try:
+        job = json.loads(line)
+        if not isinstance(job, dict):
+            raise ValueError("Job must be a JSON object")
+        return job, None
+    except ValueError as e:
+        return None, {"id": None, "status": "error", "error": f"Invalid job: {str(e)}"}
+
+def serve_stdio(pool):
+    """
+    Read jobs from stdin and write replies to stdout, one JSON object per line.
+
+    Jobs run concurrently, so replies may arrive out of order and should be
+    matched to requests by their ``id``.
+    """
+    write_lock = threading.Lock()
+
+    def write_reply(reply):
+        with write_lock:
+            sys.stdout.write(json.dumps(reply) + "\n")
+            sys.stdout.flush()
+
+    pending = []
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        job, error = parse_job(line)
+        if error:
+            write_reply(error)
+            continue
+        reply = pool.submit(job)
+        reply.add_done_callback(lambda reply: write_reply(reply.result()))
+        pending.append(reply)
+
+    # Drain outstanding jobs before exiting on EOF
+    for reply in pending:
+        reply.result()
+
+class JobRequestHandler(socketserver.StreamRequestHandler):
+    """Handle one client connection, replying to each JSON line in order."""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            job, reply = parse_job(line)
+            if job is not None:
+                reply = self.server.pool.run(job)
+            self.wfile.write((json.dumps(reply) + "\n").encode('utf-8'))
+            self.wfile.flush()
+
+def serve_socket(pool, socket_path):
+    """Serve jobs on a Unix socket; each connection is handled in its own thread."""
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    with socketserver.ThreadingUnixStreamServer(socket_path, JobRequestHandler) as server:
+        server.daemon_threads = True
+        server.pool = pool
+        print(f"Signal worker listening on {socket_path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(socket_path)
+
+def main():
+    """Main function to start the worker pool."""
+    args = parse_arguments()
+
+    # Make the processing scripts importable regardless of the working directory
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    pool = WorkerPool(args.workers)
+    try:
+        if args.socket:
+            serve_socket(pool, args.socket)
+        else:
+            serve_stdio(pool)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Spectral Helpers for ECG and EEG analysis
+Segment-wise FFTs (the building block of Welch's method) from which PSDs, band
+powers and coherence are all derived, so no signal is transformed twice. The
+spectra are stored with analysis results and reused by the correlation step.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import get_window
+
+# Canonical EEG frequency bands in Hz
+EEG_BANDS = {
+    "delta": (0.5, 4),
+    "theta": (4, 8),
+    "alpha": (8, 13),
+    "beta": (13, 30),
+    "gamma": (30, 45)
+}
+
+def segment_spectra(data, sampling_rate, nperseg, noverlap=None):
+    """
+    Compute the FFT of every overlapping segment of a signal.
+
+    Segments are mean-detrended and Hann-windowed exactly as in
+    ``scipy.signal.welch``/``scipy.signal.coherence`` with their default
+    settings, so averaging these spectra reproduces those functions.
+
+    Parameters:
+    -----------
+    data : array
+        Signal, 1-D or (... x samples)
+    sampling_rate : float
+        Sampling rate in Hz
+    nperseg : int
+        Segment length in samples
+    noverlap : int, optional
+        Overlap between segments in samples (default: nperseg // 2)
+
+    Returns:
+    --------
+    tuple
+        Frequencies, complex segment spectra of shape (..., n_segments, n_freqs),
+        and the start sample of each segment
+    """
+    if noverlap is None:
+        noverlap = nperseg // 2
+    step = nperseg - noverlap
+
+    segments = sliding_window_view(np.asarray(data, dtype=float), nperseg, axis=-1)[..., ::step, :]
+    segments = segments - segments.mean(axis=-1, keepdims=True)
+    window = get_window('hann', nperseg)
+
+    spectra = np.fft.rfft(segments * window, axis=-1)
+    freqs = np.fft.rfftfreq(nperseg, 1.0 / sampling_rate)
+    starts = np.arange(segments.shape[-2]) * step
+    return freqs, spectra, starts
+
+def psd_from_power(mean_power, sampling_rate, nperseg):
+    """
+    One-sided power spectral density from the mean squared magnitude of the
+    segment spectra, with the density scaling of ``scipy.signal.welch``.
+
+    Parameters:
+    -----------
+    mean_power : array
+        Mean of ``|spectra|**2`` over segments, frequency on the last axis
+    sampling_rate : float
+        Sampling rate in Hz
+    nperseg : int
+        Segment length in samples
+
+    Returns:
+    --------
+    array
+        PSD with the same shape as ``mean_power``
+    """
+    window = get_window('hann', nperseg)
+    psd = np.array(mean_power, dtype=float) / (sampling_rate * np.sum(window ** 2))
+    # Double everything but DC and, for even lengths, Nyquist
+    if nperseg % 2:
+        psd[..., 1:] *= 2
+    else:
+        psd[..., 1:-1] *= 2
+    return psd
+
+def psd_from_spectra(spectra, sampling_rate, nperseg, axis=-2):
+    """Welch PSD from segment spectra (see segment_spectra), averaging over ``axis``."""
+    return psd_from_power(np.mean(np.abs(spectra) ** 2, axis=axis), sampling_rate, nperseg)
+
+def spectra_record(spectra, sampling_rate, nperseg):
+    """
+    Segment spectra in the form stored with analysis results.
+
+    Spectra are kept in complex64: half the storage, and far more precision
+    than coherence or band averages need.
+    """
+    return {
+        "sampling_rate": sampling_rate,
+        "nperseg": int(nperseg),
+        "noverlap": int(nperseg // 2),
+        "segment_spectra": np.asarray(spectra, dtype=np.complex64)
+    }
+
+def stored_spectra(record, sampling_rate, nperseg, n_segments=None):
+    """
+    Segment spectra from a stored record, if they were computed with this setup.
+
+    Parameters:
+    -----------
+    record : dict or None
+        ``spectral`` entry of an analysis result (see spectra_record)
+    sampling_rate : float
+        Sampling rate the caller works at
+    nperseg : int
+        Segment length the caller needs
+    n_segments : int, optional
+        Number of leading segments needed (default: all)
+
+    Returns:
+    --------
+    array or None
+        The (..., n_segments, n_freqs) spectra, or None when the record is
+        missing, was computed at another rate or segment length, or is too short
+    """
+    if not record or record.get("segment_spectra") is None:
+        return None
+    if (record.get("sampling_rate") != sampling_rate or record.get("nperseg") != int(nperseg)
+            or record.get("noverlap") != int(nperseg) // 2):
+        return None
+    spectra = record["segment_spectra"]
+    if n_segments is None:
+        return np.asarray(spectra)
+    if np.shape(spectra)[-2] < n_segments:
+        return None
+    return np.asarray(spectra[..., :n_segments, :])
+
+def coherence_from_spectra(x_spectra, y_spectra, axis=-2):
+    """
+    Magnitude-squared coherence from segment spectra of two signals.
+
+    Parameters:
+    -----------
+    x_spectra, y_spectra : array
+        Complex segment spectra from segment_spectra
+    axis : int
+        Segment axis to average over
+
+    Returns:
+    --------
+    array
+        Coherence per frequency
+    """
+    cross = np.mean(x_spectra * np.conj(y_spectra), axis=axis)
+    x_power = np.mean(np.abs(x_spectra)**2, axis=axis)
+    y_power = np.mean(np.abs(y_spectra)**2, axis=axis)
+    denominator = x_power * y_power
+    return np.divide(np.abs(cross)**2, denominator, out=np.zeros_like(denominator), where=denominator > 0)
+
+def band_means(values, freqs, bands):
+    """
+    Average a spectrum-like array over frequency bands.
+
+    Parameters:
+    -----------
+    values : array
+        Values with frequency on the last axis
+    freqs : array
+        Frequencies in Hz
+    bands : dict
+        Band name -> (low, high) in Hz, both edges inclusive
+
+    Returns:
+    --------
+    dict
+        Band name -> mean over the band (0 if the band holds no frequency bin)
+    """
+    means = {}
+    for band_name, (low, high) in bands.items():
+        band_idx = np.logical_and(freqs >= low, freqs <= high)
+        if np.any(band_idx):
+            means[band_name] = np.mean(values[..., band_idx], axis=-1)
+        else:
+            means[band_name] = np.zeros(values.shape[:-1]) if np.ndim(values) > 1 else 0.0
+    return means
+
+def band_analytic_signal(data, sampling_rate, low, high):
+    """
+    Band-limited analytic signal from a single FFT.
+
+    Zeroes every bin outside [low, high] Hz and the negative frequencies, then
+    doubles the kept positive bins (``scipy.signal.hilbert`` of an ideal
+    band-pass filter), so any number of bands can be taken from one transform.
+
+    Parameters:
+    -----------
+    data : array
+        Signal, 1-D or (... x samples)
+    sampling_rate : float
+        Sampling rate in Hz
+    low, high : float
+        Band edges in Hz
+
+    Returns:
+    --------
+    array
+        Complex analytic signal, same shape as ``data``
+    """
+    data = np.asarray(data, dtype=float)
+    n_samples = data.shape[-1]
+    spectrum = np.fft.fft(data, axis=-1)
+    freqs = np.fft.fftfreq(n_samples, 1.0 / sampling_rate)
+    mask = np.where((freqs >= low) & (freqs <= high), 2.0, 0.0)
+    return np.fft.ifft(spectrum * mask, axis=-1)
+
+def unit_phasors(analytic, eps=1e-12):
+    """Instantaneous phase of an analytic signal as unit-magnitude complex numbers."""
+    magnitude = np.abs(analytic)
+    return np.divide(analytic, magnitude, out=np.zeros_like(analytic), where=magnitude > eps)
+
+def band_phase_locking(x, y, sampling_rate, bands, max_batch_elements=1 << 24):
+    """
+    Phase-locking value between two signals in several frequency bands.
+
+    Each signal is transformed once; every band is then an ideal band-pass
+    analytic signal (as in band_analytic_signal) taken from that spectrum by
+    an inverse FFT, with as many bands per inverse FFT as fit in
+    ``max_batch_elements`` complex values. PLV is the magnitude of the mean
+    phase-difference phasor, ``|mean(exp(i * (phi_x - phi_y)))|``.
+
+    Parameters:
+    -----------
+    x, y : array
+        Signals of equal length, 1-D or (... x samples)
+    sampling_rate : float
+        Sampling rate in Hz
+    bands : dict
+        Band name -> (low, high) in Hz, both edges inclusive
+    max_batch_elements : int
+        Upper bound on the size of one batched inverse transform
+
+    Returns:
+    --------
+    dict
+        Band name -> PLV in [0, 1] (0 for a band holding no frequency bin)
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n_samples = x.shape[-1]
+
+    # One-sided spectra; ifft(..., n) zero-fills the negative frequencies
+    x_spectrum = np.fft.rfft(x, axis=-1)[..., None, :]
+    y_spectrum = np.fft.rfft(y, axis=-1)[..., None, :]
+    freqs = np.fft.rfftfreq(n_samples, 1.0 / sampling_rate)
+
+    names = list(bands)
+    masks = np.array([(freqs >= low) & (freqs <= high) for low, high in bands.values()]).reshape(len(names), -1)
+    plv = {name: 0.0 if np.ndim(x) == 1 else np.zeros(x.shape[:-1]) for name in names}
+
+    per_batch = max(1, max_batch_elements // max(n_samples * int(np.prod(x.shape[:-1])), 1))
+    active = [i for i in range(len(names)) if masks[i].any()]
+    for start in range(0, len(active), per_batch):
+        batch = active[start:start + per_batch]
+        x_phase = unit_phasors(np.fft.ifft(x_spectrum * masks[batch], n=n_samples, axis=-1))
+        y_phase = unit_phasors(np.fft.ifft(y_spectrum * masks[batch], n=n_samples, axis=-1))
+        values = np.abs(np.mean(x_phase * np.conj(y_phase), axis=-1))
+        for offset, band_index in enumerate(batch):
+            value = values[..., offset]
+            plv[names[band_index]] = float(value) if np.ndim(value) == 0 else value
+    return plv
@@ -0,0 +1,520 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Real-Time Streaming Analysis of ECG and EEG signals
+Consumes samples incrementally from stdin, a socket or a replayed CSV file and
+emits JSON-lines updates at a fixed cadence: heart rate and RMSSD from online
+R-peak detection for ECG, relative band powers from an incremental Welch
+estimate for EEG. All state is bounded, so the cost of an update does not grow
+with the length of the stream.
+"""
+
+import argparse
+import itertools
+import json
+import socket
+import sys
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+from scipy import signal
+
+from csv_ingest import select_signal_columns, sniff_csv
+from spectral import EEG_BANDS
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Stream ECG or EEG samples and emit live updates')
+    parser.add_argument('--type', type=str, required=True, choices=['ecg', 'eeg'], help='Signal type (ecg or eeg)')
+    parser.add_argument('--source', type=str, default='stdin', choices=['stdin', 'socket', 'csv'],
+                        help='Sample source: text lines on stdin or a socket, or a CSV file replay')
+    parser.add_argument('--file', type=str, default=None, help='CSV file to replay (with --source csv)')
+    parser.add_argument('--socket', type=str, default=None,
+                        help='HOST:PORT of a TCP server or path of a Unix socket (with --source socket)')
+    parser.add_argument('--sampling_rate', type=int, default=None,
+                        help='Sampling rate in Hz (default: inferred from the CSV Time column)')
+    parser.add_argument('--update_interval', type=float, default=1.0, help='Seconds of signal between updates')
+    parser.add_argument('--realtime', action='store_true', help='Pace a CSV replay at the recording speed')
+    parser.add_argument('--speed', type=float, default=1.0, help='Replay speed factor with --realtime')
+    parser.add_argument('--rr_window', type=int, default=30, help='Number of recent RR intervals for HR/RMSSD')
+    parser.add_argument('--psd_window', type=float, default=4.0, help='Seconds of EEG averaged in the Welch estimate')
+    return parser.parse_args()
+
+class StreamingECG:
+    """
+    Online ECG cleaning and R-peak detection.
+
+    Follows NeuroKit2's default ``neurokit`` R-peak method with causal filters:
+    QRS complexes are where the smoothed absolute gradient exceeds
+    ``threshold_weight`` times its slower moving average, and the R-peak is the
+    maximum of the cleaned signal inside each complex. Filter states carry over
+    between chunks, so any chunking gives the same peaks.
+
+    Parameters:
+    -----------
+    sampling_rate : float
+        Sampling rate in Hz
+    rr_window : int
+        Number of most recent RR intervals used for heart rate and RMSSD
+    """
+
+    def __init__(self, sampling_rate, rr_window=30, smooth_seconds=0.1, average_seconds=0.75,
+                 threshold_weight=1.5, min_length_weight=0.4, min_delay_seconds=0.3):
+        self.sampling_rate = sampling_rate
+        # 0.5 Hz high-pass as in nk.ecg_clean, plus a 40 Hz low-pass against powerline noise
+        self.sos = np.vstack([
+            signal.butter(5, 0.5, btype='highpass', output='sos', fs=sampling_rate),
+            signal.butter(2, min(40.0, 0.45 * sampling_rate), btype='lowpass', output='sos', fs=sampling_rate)
+        ])
+        self.filter_state = None
+        self.smooth_kernel = np.ones(max(int(round(smooth_seconds * sampling_rate)), 1))
+        self.smooth_kernel /= len(self.smooth_kernel)
+        self.average_kernel = np.ones(max(int(round(average_seconds * sampling_rate)), 1))
+        self.average_kernel /= len(self.average_kernel)
+        self.smooth_state = np.zeros(len(self.smooth_kernel) - 1)
+        self.average_state = np.zeros(len(self.average_kernel) - 1)
+        self.threshold_weight = threshold_weight
+        self.min_length_weight = min_length_weight
+        self.min_delay = int(round(min_delay_seconds * sampling_rate))
+
+        self.n_samples = 0
+        self.previous_sample = None
+        self.in_qrs = False
+        self.qrs_start = 0
+        self.qrs_max_value = -np.inf
+        self.qrs_max_index = 0
+        self.qrs_length_sum = 0
+        self.qrs_count = 0
+        self.last_peak = None
+        self.n_beats = 0
+        self.rr_intervals = deque(maxlen=rr_window)
+
+    def _close_qrs(self, end):
+        """Accept the R-peak of the complex ending at sample ``end`` if it passes the length and delay checks."""
+        length = end - self.qrs_start
+        self.qrs_length_sum += length
+        self.qrs_count += 1
+        if length < self.min_length_weight * self.qrs_length_sum / self.qrs_count:
+            return None
+
+        peak = self.qrs_max_index
+        if self.last_peak is not None:
+            if peak - self.last_peak < self.min_delay:
+                return None
+            self.rr_intervals.append((peak - self.last_peak) / self.sampling_rate * 1000)
+        self.last_peak = peak
+        self.n_beats += 1
+        return peak
+
+    def process(self, chunk):
+        """
+        Consume a chunk of raw samples.
+
+        Parameters:
+        -----------
+        chunk : array
+            1-D array of consecutive raw ECG samples
+
+        Returns:
+        --------
+        list
+            Sample indices (since the start of the stream) of R-peaks confirmed in this chunk
+        """
+        chunk = np.asarray(chunk, dtype=float).ravel()
+        if len(chunk) == 0:
+            return []
+        if self.filter_state is None:
+            # Start the filter in steady state for the first sample to avoid a step transient
+            self.filter_state = signal.sosfilt_zi(self.sos) * chunk[0]
+
+        cleaned, self.filter_state = signal.sosfilt(self.sos, chunk, zi=self.filter_state)
+        previous = cleaned[0] if self.previous_sample is None else self.previous_sample
+        gradient = np.abs(np.diff(cleaned, prepend=previous))
+        self.previous_sample = cleaned[-1]
+
+        smooth, self.smooth_state = signal.lfilter(self.smooth_kernel, 1.0, gradient, zi=self.smooth_state)
+        average, self.average_state = signal.lfilter(self.average_kernel, 1.0, gradient, zi=self.average_state)
+        qrs = smooth > self.threshold_weight * average
+
+        # Walk the runs of QRS / non-QRS samples; a complex may span chunks
+        peaks = []
+        boundaries = np.concatenate([[0], np.flatnonzero(np.diff(qrs)) + 1, [len(qrs)]])
+        for start, end in zip(boundaries[:-1], boundaries[1:]):
+            if qrs[start]:
+                if not self.in_qrs:
+                    self.in_qrs = True
+                    self.qrs_start = self.n_samples + start
+                    self.qrs_max_value = -np.inf
+                local_max = start + np.argmax(cleaned[start:end])
+                if cleaned[local_max] > self.qrs_max_value:
+                    self.qrs_max_value = cleaned[local_max]
+                    self.qrs_max_index = self.n_samples + local_max
+            elif self.in_qrs:
+                self.in_qrs = False
+                peak = self._close_qrs(self.n_samples + start)
+                if peak is not None:
+                    peaks.append(peak)
+
+        self.n_samples += len(chunk)
+        return peaks
+
+    def summary(self):
+        """Rolling heart rate (bpm), RMSSD and SDNN (ms) over the recent RR intervals."""
+        rr = np.asarray(self.rr_intervals)
+        return {
+            "heart_rate": float(60000.0 / np.mean(rr)) if len(rr) else None,
+            "rmssd": float(np.sqrt(np.mean(np.diff(rr)**2))) if len(rr) > 1 else None,
+            "sdnn": float(np.std(rr, ddof=1)) if len(rr) > 1 else None,
+            "n_beats": self.n_beats
+        }
+
+class StreamingEEG:
+    """
+    Online EEG filtering and incremental Welch band powers.
+
+    Samples are band-pass filtered causally (0.5-45 Hz, the band used offline)
+    and cut into 50%-overlapping Hann segments as they arrive. Each segment's
+    periodogram is computed once and kept in a running sum over the last
+    ``psd_window`` seconds, so the PSD is updated in constant time.
+
+    Parameters:
+    -----------
+    sampling_rate : float
+        Sampling rate in Hz
+    n_channels : int
+        Number of EEG channels
+    psd_window : float
+        Seconds of signal averaged in the PSD estimate
+    segment_seconds : float
+        Welch segment length in seconds (offline analysis uses 1 s)
+    """
+
+    def __init__(self, sampling_rate, n_channels=1, psd_window=4.0, segment_seconds=1.0, bands=EEG_BANDS):
+        self.sampling_rate = sampling_rate
+        self.bands = bands
+        self.sos = signal.butter(2, [0.5, 45], btype='bandpass', output='sos', fs=sampling_rate)
+        self.filter_state = None
+
+        self.nperseg = max(int(round(segment_seconds * sampling_rate)), 2)
+        self.step = self.nperseg - self.nperseg // 2
+        self.window = signal.get_window('hann', self.nperseg)
+        # One-sided PSD density scaling, as in scipy.signal.welch
+        self.scale = np.full(self.nperseg // 2 + 1, 2.0 / (sampling_rate * np.sum(self.window**2)))
+        self.scale[0] /= 2
+        if self.nperseg % 2 == 0:
+            self.scale[-1] /= 2
+        self.freqs = np.fft.rfftfreq(self.nperseg, 1.0 / sampling_rate)
+
+        n_segments = max(int((psd_window * sampling_rate - self.nperseg) // self.step) + 1, 1)
+        self.periodograms = deque(maxlen=n_segments)
+        self.psd_sum = np.zeros((n_channels, len(self.freqs)))
+        self.pending = np.zeros((n_channels, 0))
+        self.n_samples = 0
+
+    def process(self, chunk):
+        """
+        Consume a chunk of raw samples.
+
+        Parameters:
+        -----------
+        chunk : array
+            (channels x samples) or 1-D single-channel samples
+
+        Returns:
+        --------
+        int
+            Number of new Welch segments completed by this chunk
+        """
+        chunk = np.atleast_2d(np.asarray(chunk, dtype=float))
+        if chunk.shape[-1] == 0:
+            return 0
+        if self.filter_state is None:
+            zi = signal.sosfilt_zi(self.sos)
+            self.filter_state = zi[:, None, :] * chunk[None, :, :1]
+
+        filtered, self.filter_state = signal.sosfilt(self.sos, chunk, axis=-1, zi=self.filter_state)
+        self.pending = np.concatenate([self.pending, filtered], axis=-1)
+        self.n_samples += chunk.shape[-1]
+
+        n_new = 0
+        while self.pending.shape[-1] >= self.nperseg:
+            segment = self.pending[:, :self.nperseg]
+            segment = segment - segment.mean(axis=-1, keepdims=True)
+            periodogram = np.abs(np.fft.rfft(segment * self.window, axis=-1))**2 * self.scale
+            if len(self.periodograms) == self.periodograms.maxlen:
+                self.psd_sum -= self.periodograms[0]
+            self.periodograms.append(periodogram)
+            self.psd_sum += periodogram
+            self.pending = self.pending[:, self.step:]
+            n_new += 1
+        return n_new
+
+    def band_powers(self):
+        """Relative band power per channel from the current PSD estimate, or None before the first segment."""
+        if not self.periodograms:
+            return None
+        psd = self.psd_sum / len(self.periodograms)
+        total_power = np.sum(psd, axis=-1)
+        powers = {}
+        for band_name, (low, high) in self.bands.items():
+            band_idx = np.logical_and(self.freqs >= low, self.freqs <= high)
+            band_power = np.sum(psd[..., band_idx], axis=-1)
+            powers[band_name] = np.divide(band_power, total_power, out=np.zeros_like(band_power),
+                                          where=total_power > 0)
+        return powers
+
+def split_sample_line(line):
+    """Split a line on commas if it has any, otherwise on whitespace."""
+    if ',' in line:
+        return [value.strip() for value in line.split(',')]
+    return line.split()
+
+def read_sample_header(lines, signal_type):
+    """
+    Read the optional header line of a sample stream and select its signal columns.
+
+    A first line that is not all numbers is a header. Its columns are selected
+    like those of a CSV file (see csv_ingest.select_signal_columns), so the
+    Time column is dropped and ECG uses a single column. Without a header,
+    ECG uses the first column and EEG every column.
+
+    Parameters:
+    -----------
+    lines : iterable
+        Text lines of the stream
+    signal_type : str
+        Type of signal ('ecg' or 'eeg')
+
+    Returns:
+    --------
+    tuple
+        (dict with the column count ``n_columns``, the selected column
+        ``indices``, their ``names`` (None without a header) and the number of
+        lines ``consumed``, and an iterator over the remaining data lines)
+    """
+    lines = iter(lines)
+    consumed = 0
+    for line in lines:
+        consumed += 1
+        values = split_sample_line(line)
+        if values:
+            break
+    else:
+        return {"n_columns": 0, "indices": [], "names": None, "consumed": consumed}, lines
+
+    try:
+        [float(value) for value in values]
+    except ValueError:
+        signal_columns, _ = select_signal_columns(values, signal_type)
+        indices = [values.index(column) for column in signal_columns]
+        return {"n_columns": len(values), "indices": indices, "names": signal_columns, "consumed": consumed}, lines
+
+    # The first line is data and is parsed again
+    indices = [0] if signal_type == 'ecg' else list(range(len(values)))
+    columns = {"n_columns": len(values), "indices": indices, "names": None, "consumed": consumed - 1}
+    return columns, itertools.chain([line], lines)
+
+def parse_sample_lines(lines, n_rows, columns):
+    """
+    Parse text lines of comma- or whitespace-separated samples into chunks.
+
+    Parameters:
+    -----------
+    lines : iterable
+        Data lines, one sample (one value per column) per line
+    n_rows : int
+        Samples per yielded chunk
+    columns : dict
+        Column layout from read_sample_header
+
+    Yields:
+    -------
+    array
+        (channels x samples) chunk of the selected columns
+
+    Raises:
+    -------
+    ValueError
+        On a line with a different number of values than the first one, or a
+        value that is not a number
+    """
+    rows = []
+    for line_number, line in enumerate(lines, start=columns["consumed"] + 1):
+        values = split_sample_line(line)
+        if not values:
+            continue
+        if len(values) != columns["n_columns"]:
+            raise ValueError(f"Sample line {line_number} has {len(values)} values, "
+                             f"expected {columns['n_columns']}: {line.strip()!r}")
+        try:
+            rows.append([float(values[index]) for index in columns["indices"]])
+        except ValueError:
+            raise ValueError(f"Sample line {line_number} is not numeric: {line.strip()!r}") from None
+        if len(rows) >= n_rows:
+            yield np.asarray(rows).T
+            rows = []
+    if rows:
+        yield np.asarray(rows).T
+
+def open_socket_lines(address):
+    """Connect to ``HOST:PORT`` over TCP or to a Unix socket path and return its text lines."""
+    if ':' in address and not address.startswith('/'):
+        host, port = address.rsplit(':', 1)
+        connection = socket.create_connection((host, int(port)))
+    else:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(address)
+    return connection.makefile('r')
+
+def iter_csv_chunks(file_path, signal_type, sampling_rate, n_rows, realtime=False, speed=1.0):
+    """
+    Replay the signal columns of a CSV file in chunks.
+
+    Parameters:
+    -----------
+    file_path : str
+        CSV file, with columns selected as in the offline loader
+    signal_type : str
+        Type of signal ('ecg' or 'eeg')
+    sampling_rate : float
+        Sampling rate in Hz, used to pace a real-time replay
+    n_rows : int
+        Samples per yielded chunk
+    realtime : bool
+        If True, sleep so samples are delivered at ``speed`` times the recording rate
+
+    Yields:
+    -------
+    array
+        (channels x samples) chunk
+    """
+    columns = sniff_csv(file_path, signal_type)["signal_columns"]
+    start_time = time.perf_counter()
+    n_sent = 0
+    for frame in pd.read_csv(file_path, usecols=columns, chunksize=n_rows):
+        chunk = frame[columns].to_numpy(dtype=float).T
+        if realtime:
+            delay = start_time + (n_sent + chunk.shape[-1]) / (sampling_rate * speed) - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        n_sent += chunk.shape[-1]
+        yield chunk
+
+def run_stream(chunks, signal_type, sampling_rate, update_interval=1.0, rr_window=30, psd_window=4.0,
+               emit=None, channel_names=None):
+    """
+    Feed chunks to the streaming analyzer and emit an update at a fixed cadence.
+
+    Chunks are split at update boundaries, so updates are emitted every
+    ``update_interval`` seconds of signal regardless of how the samples arrive.
+
+    Parameters:
+    -----------
+    chunks : iterable
+        (channels x samples) arrays
+    signal_type : str
+        Type of signal ('ecg' or 'eeg')
+    sampling_rate : float
+        Sampling rate in Hz
+    update_interval : float
+        Seconds of signal between updates
+    emit : callable, optional
+        Called with each update dictionary (default: print a JSON line to stdout)
+    channel_names : list, optional
+        EEG channel names reported with per-channel band powers
+    """
+    if emit is None:
+        def emit(update):
+            sys.stdout.write(json.dumps(update) + "\n")
+            sys.stdout.flush()
+
+    update_samples = max(int(round(update_interval * sampling_rate)), 1)
+    monitor = None
+    new_peaks = []
+    processing_time = 0.0
+
+    for chunk in chunks:
+        chunk = np.atleast_2d(chunk)
+        if monitor is None:
+            if signal_type == 'ecg':
+                monitor = StreamingECG(sampling_rate, rr_window)
+            else:
+                monitor = StreamingEEG(sampling_rate, chunk.shape[0], psd_window)
+
+        position = 0
+        while position < chunk.shape[-1]:
+            # Process up to the next update boundary
+            take = min(update_samples - monitor.n_samples % update_samples, chunk.shape[-1] - position)
+            part = chunk[:, position:position + take]
+            position += take
+
+            start_time = time.perf_counter()
+            if signal_type == 'ecg':
+                new_peaks.extend(monitor.process(part[0]))
+            else:
+                monitor.process(part)
+            processing_time += time.perf_counter() - start_time
+
+            if monitor.n_samples % update_samples:
+                continue
+
+            update = {"type": signal_type, "time": monitor.n_samples / sampling_rate}
+            if signal_type == 'ecg':
+                update.update(monitor.summary())
+                update["r_peaks"] = [peak / sampling_rate for peak in new_peaks]
+                new_peaks = []
+            else:
+                powers = monitor.band_powers()
+                if powers is None:
+                    continue
+                update["bands"] = {name: float(np.mean(power)) for name, power in powers.items()}
+                if len(next(iter(powers.values()))) > 1:
+                    update["channels"] = {
+                        "names": channel_names,
+                        "bands": {name: power.tolist() for name, power in powers.items()}
+                    }
+            update["latency_ms"] = processing_time * 1000
+            processing_time = 0.0
+            emit(update)
+
+def main():
+    """Main function to stream signal data."""
+    args = parse_arguments()
+
+    sampling_rate = args.sampling_rate
+    channel_names = None
+    if args.source == 'csv':
+        if not args.file:
+            raise ValueError("--file is required with --source csv")
+        csv_info = sniff_csv(args.file, args.type)
+        sampling_rate = sampling_rate or csv_info["sampling_rate"]
+        channel_names = [str(col) for col in csv_info["signal_columns"]]
+    if not sampling_rate:
+        raise ValueError("--sampling_rate is required unless it can be inferred from a CSV Time column")
+
+    # Read about ten chunks per second so updates are not held back by buffering
+    n_rows = max(sampling_rate // 10, 1)
+    if args.source == 'csv':
+        chunks = iter_csv_chunks(args.file, args.type, sampling_rate, n_rows, args.realtime, args.speed)
+    else:
+        if args.source == 'socket':
+            if not args.socket:
+                raise ValueError("--socket is required with --source socket")
+            lines = open_socket_lines(args.socket)
+        else:
+            lines = sys.stdin
+        columns, lines = read_sample_header(lines, args.type)
+        channel_names = columns["names"]
+        chunks = parse_sample_lines(lines, n_rows, columns)
+
+    try:
+        run_stream(chunks, args.type, sampling_rate, args.update_interval, args.rr_window, args.psd_window,
+                   channel_names=channel_names)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()